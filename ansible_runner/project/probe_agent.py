@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Probe agent of the ANT-Tool, uploaded to and run on a source machine by agent_playbook.yml.
+
+Runs all probes of the machine concurrently and prints the results as one json document.
+The only argument is the path of a json file holding the list of probes, each probe being a
+dictionary
+    {'host': ..., 'n': ..., 'proto': 'tcp' | 'udp' | 'icmp', 'destination': ..., 'port': ...,
+     'timeout': ..., 'cmd': ...}
+Only the python standard library may be used here.
+"""
+
+import asyncio
+import datetime
+import ipaddress
+import json
+import random
+import socket
+import struct
+import sys
+
+# number of echo requests, like ping -c 4
+ICMP_COUNT = 4
+ICMP_INTERVAL = 0.2
+
+async def probe_tcp(probe):
+    """Opens a tcp connection, like nc -zv"""
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(probe['destination'], probe['port']), probe['timeout'])
+    except asyncio.TimeoutError:
+        return 1, [], [f"nc: connect to {probe['destination']} port {probe['port']} (tcp) "
+                       "timed out"]
+    except OSError as err:
+        return 1, [], [f"nc: connect to {probe['destination']} port {probe['port']} (tcp) "
+                       f"failed: {err.strerror}"]
+    writer.close()
+    return 0, [], [f"Connection to {probe['destination']} {probe['port']} port [tcp/*] "
+                   "succeeded!"]
+
+def dns_query():
+    """Returns a query for the name servers of the root zone, like dig without arguments"""
+    header = struct.pack('!HHHHHH', random.getrandbits(16), 0x0100, 1, 0, 0, 0)
+    return header + b'\x00' + struct.pack('!HH', 2, 1)
+
+class DatagramReply(asyncio.DatagramProtocol):
+    """Waits for the first datagram or error"""
+    def __init__(self, future):
+        self.future = future
+
+    def datagram_received(self, data, addr):
+        if not self.future.done():
+            self.future.set_result(data)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+async def probe_udp(probe):
+    """Sends a dns query and waits for any answer, like dig"""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    try:
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: DatagramReply(future), remote_addr=(probe['destination'], probe['port']))
+    except OSError as err:
+        return 9, [], [f";; {err.strerror}"]
+    try:
+        transport.sendto(dns_query())
+        reply = await asyncio.wait_for(future, probe['timeout'])
+    except asyncio.TimeoutError:
+        return 9, [";; connection timed out; no servers could be reached"], []
+    except OSError as err:
+        return 9, [f";; communications error to {probe['destination']}#{probe['port']}: "
+                   f"{err.strerror}"], []
+    finally:
+        transport.close()
+    return 0, [f";; Got answer of {len(reply)} bytes from {probe['destination']}#"
+               f"{probe['port']}"], []
+
+async def probe_icmp(probe):
+    """Sends echo requests, like ping -c 4"""
+    destination = ipaddress.ip_address(probe['destination'])
+    if destination.version == 4:
+        family, proto, request = socket.AF_INET, socket.IPPROTO_ICMP, 8
+    else:
+        family, proto, request = socket.AF_INET6, socket.IPPROTO_ICMPV6, 128
+    try:
+        sock = socket.socket(family, socket.SOCK_DGRAM, proto)
+    except PermissionError:
+        # unprivileged echo sockets are disabled, fall back to ping
+        return await probe_ping(probe)
+
+    loop = asyncio.get_running_loop()
+    sock.setblocking(False)
+    try:
+        await loop.sock_connect(sock, (probe['destination'], 0))
+        received = loop.create_task(loop.sock_recv(sock, 1024))
+        for seq in range(ICMP_COUNT):
+            await loop.sock_sendall(sock, struct.pack('!BBHHH', request, 0, 0, 0, seq) +
+                                    b'ant-probe')
+            done, _ = await asyncio.wait({received}, timeout=ICMP_INTERVAL)
+            if done:
+                break
+        await asyncio.wait_for(received, probe['timeout'])
+    except asyncio.TimeoutError:
+        return 1, [f"--- {probe['destination']} ping statistics ---",
+                   f"{ICMP_COUNT} packets transmitted, 0 received, 100% packet loss"], []
+    except OSError as err:
+        return 2, [], [f"ping: {probe['destination']}: {err.strerror}"]
+    finally:
+        sock.close()
+    return 0, [f"reply from {probe['destination']}"], []
+
+async def probe_ping(probe):
+    """Runs ping as a subprocess"""
+    process = await asyncio.create_subprocess_exec(
+        'ping', '-c', str(ICMP_COUNT), '-i', str(ICMP_INTERVAL), '-W', str(probe['timeout']),
+        probe['destination'], stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    stdout, stderr = await process.communicate()
+    return process.returncode, stdout.decode().splitlines(), stderr.decode().splitlines()
+
+PROBES = {'tcp': probe_tcp, 'udp': probe_udp, 'icmp': probe_icmp}
+
+async def run_probe(probe):
+    """Runs a single probe and returns its result"""
+    start = datetime.datetime.now()
+    try:
+        rc, stdout_lines, stderr_lines = await PROBES[probe['proto']](probe)
+    except Exception as err: # pylint: disable=broad-except
+        # a broken probe must not cost the results of all other probes
+        rc, stdout_lines, stderr_lines = 2, [], [f"{type(err).__name__}: {err}"]
+    end = datetime.datetime.now()
+    return {
+        'host': probe['host'],
+        'n': probe['n'],
+        'rc': rc,
+        'stdout_lines': stdout_lines,
+        'stderr_lines': stderr_lines,
+        'start': str(start),
+        'end': str(end),
+        'delta': str(end - start),
+        'cmd': probe['cmd'],
+        'msg': '' if rc == 0 else 'non-zero return code'
+    }
+
+async def main(probes):
+    """Runs all probes at once"""
+    return await asyncio.gather(*(run_probe(probe) for probe in probes))
+
+if __name__ == '__main__':
+    with open(sys.argv[1], 'r', encoding='utf-8') as probe_file:
+        PROBE_LIST = json.load(probe_file)
+    json.dump({'results': asyncio.run(main(PROBE_LIST))}, sys.stdout)
@@ -1,5 +1,41 @@
-from .valdiate_nft.validate_nft import validate_script
-from .read_testcases.read_testcases import Testcase ,TestcaseConfiguration
-from .read_testinfra.read_testinfra import Machine, NetworkConfiguration
-from .ansible_manager.ansible_manager import AnsibleManager
-from .logger import Logger
\ No newline at end of file
+import importlib
+
+# the module defining each name, imported on first access so that loading the package does not
+# import ansible_runner or the nftables binding
+_EXPORTS = {
+    'validate_script': 'valdiate_nft.validate_nft',
+    'validate_scripts': 'valdiate_nft.validate_nft',
+    'ValidationCache': 'valdiate_nft.validate_nft',
+    'Testcase': 'read_testcases.read_testcases',
+    'TestcaseConfiguration': 'read_testcases.read_testcases',
+    'Machine': 'read_testinfra.read_testinfra',
+    'NetworkConfiguration': 'read_testinfra.read_testinfra',
+    'DiskCache': 'disk_cache.disk_cache',
+    'ResultCache': 'result_cache.result_cache',
+    'ConfigCache': 'config_cache.config_cache',
+    'SetupCache': 'setup_cache.setup_cache',
+    'ProbeResult': 'results.results',
+    'ResultTable': 'results.results',
+    'AnsibleManager': 'ansible_manager.ansible_manager',
+    'Logger': 'logger',
+    'Simulator': 'simulator.simulator',
+    'Timer': 'timing.timing',
+    'LatencyStats': 'latency.latency',
+    'GradingDaemon': 'daemon.daemon',
+    'LabPool': 'lab_pool.lab_pool',
+    'Executor': 'executors.executors',
+    'ResultsStore': 'results_store.results_store',
+    'Watcher': 'watch.watch',
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
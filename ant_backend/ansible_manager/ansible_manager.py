@@ -1,55 +1,292 @@
 """Defines a management interface for ansible as used by ant_backend"""
 
+import contextlib
+import hashlib
 import ipaddress
+import json
 import shutil
 import os
+import time
 import yaml
 import ansible_runner
 from ant_backend import NetworkConfiguration, TestcaseConfiguration
+from ant_backend.deadlines import CONNECT_TIMEOUT, RETRY_BACKOFF, SETUP_DEADLINE, TIMED_OUT, \
+    host_budget, playbook_budget, probe_deadline
+from ant_backend.planner import ProbePlan
+from ant_backend.probes import COMMANDS, PROBE_TIMEOUTS, expand_probes, probe_command
+from ant_backend.result_cache import file_hash
+from ant_backend.results import ProbeResult, ResultTable
+from ant_backend.setup_cache import SetupCache
+from ant_backend.timing import Timer
+
+ITEM_EVENTS = ('runner_item_on_ok', 'runner_item_on_failed')
+AGENT_ACTIONS = ('ansible.builtin.script', 'script')
+
+def is_agent_event(event:dict):
+    '''
+    Checks whether an event holds the output of the probe agent
+    '''
+    return event['event'] in ('runner_on_ok', 'runner_on_failed') and \
+        event.get('event_data', {}).get('task_action') in AGENT_ACTIONS
+
+def agent_results(event:dict):
+    '''
+    Returns the results in the output of the probe agent, each naming its testcase host
+      and probe index
+    '''
+    try:
+        return json.loads(event['event_data']['res'].get('stdout', ''))['results']
+    except (KeyError, TypeError, ValueError):
+        return []
+
+def machine_group(name):
+    '''
+    Returns the inventory group holding the connection variables of the machine name
+    '''
+    return f"machine_{name}"
 
 class AnsibleManager(object):
     """
     A management Interface for ansible
     """
 
-    def __init__(self, conf_path:str):
+    def __init__(self, conf_path:str, private_data_dir:str="ansible_runner", single_pass=False,
+                 forks=None, agent=False, timer=None, protos=None, envvars=None, lab=None,
+                 dedup=True, setup_cache=None, executor=None, retries=0,
+                 backoff=RETRY_BACKOFF):
+        """
+        single_pass runs the probes of all protocols in one play, forks limits the number
+          of hosts ansible works on in parallel (ansible default if None), agent runs all
+          probes of a machine at once with the probe agent, timer is the Timer every
+          execution of a playbook is recorded in
+        protos is the already loaded configuration, conf_path is not read if it is given.
+        envvars are passed on to ansible, e.g. to keep ssh connections open between runs.
+        lab is the Lab leased for the run, its management addresses replace those of the
+          infra file in every inventory.
+        dedup runs a probe needed by several testcases only once, see ProbePlan.
+        setup_cache is the SetupCache of the rulesets active on the machines, rulesets that
+          are already active are not uploaded and loaded again.
+        executor is the Executor running the setup and the probes instead of ansible,
+          it runs the probes of the agent inventory.
+        retries is the number of times failed probes are run again after all probes ran,
+          the first retry after backoff seconds and every further one after twice as long
+          as the one before, see retry_failed.
+        """
+        self.private_data_dir = private_data_dir
+        self.single_pass = single_pass
+        self.forks = forks
+        self.agent = agent
+        self.timer = timer or Timer()
+        self.envvars = envvars
+        self.lab = lab
+        self.dedup = dedup
+        self.plan = None
+        self.setup_cache = setup_cache
+        self.executor = executor
+        self.retries = retries
+        self.backoff = backoff
+        # whether the probes of a testcase are expected to pass, by (machine, testcase)
+        self.allow = {}
+        # machines whose ruleset is set up by another machine on the same host
+        self.setup_aliases = {}
+        # the SetupCache key of every setup host
+        self.setup_keys = {}
+        # the inventory of every playbook, kept in memory and handed to ansible_runner
         self.inventory = {}
-        with open(conf_path,'r',encoding='utf-8') as conf_file:
-            self.protos:dict = yaml.safe_load(conf_file)
+        # maps the inventory hosts of the testcases to (machine name, testcase name)
+        self.hosts = {}
+        # the seconds every inventory host may take, by inventory group
+        self.budgets = {}
+        # the number of probes of every testcase host by inventory group, None for setup hosts
+        self.expected = {}
+        if protos is None:
+            with open(conf_path,'r',encoding='utf-8') as conf_file:
+                protos = yaml.safe_load(conf_file)
+        self.protos:dict = protos
 
         for proto in self.protos.keys():
             self.inventory.setdefault(proto, {})
             self.inventory[proto].setdefault('hosts', {})
 
-    def create_inventory(self, path:str, netconfig: NetworkConfiguration,
+    def create_inventory(self, path, netconfig: NetworkConfiguration,
                          testconfig: TestcaseConfiguration):
         """
-        Creates an ansible inventory based on the given network and testconfiguration
-          at the location specified by path
+        Creates an ansible inventory based on the given network and testconfiguration,
+          every testcase is a host of the group of its protocol and of the group of its
+          machine, which holds the connection variables once per machine
+        The inventory is kept in memory, if path is set it is written there as well.
         """
+        if self.agent or self.executor is not None:
+            self.create_agent_inventory(path, netconfig, testconfig)
+            return
+
+        self.plan = ProbePlan() if self.dedup else None
         for testcase in testconfig.testcases:
             machine = netconfig.machines[testcase.source]
-            hostdict = {
-                'ansible_host': machine.management_ip.exploded,
-                'ansible_user': machine.user,
-                'ansible_password': machine.password
-            }
-
-            try:
-                for key, value in self.protos[testcase.proto].items():
-                    if value == 'destination':
-                        hostdict[key] = self.parse_dest(testcase.destination, netconfig)
-                    else:
-                        hostdict[key] = testcase.__dict__[value]
+            hostdict = self.probe_vars(testcase, netconfig)
+            host = '-'.join((machine.name, str(testcase.name)))
+            self.hosts[host] = (machine.name, testcase.name)
+            self.allow[(machine.name, testcase.name)] = testcase.allow
+            probes = expand_probes(testcase.proto, self.parse_dest(testcase.destination,
+                                                                   netconfig),
+                                   testcase.d_port)
+            if self.plan is not None:
+                own = self.plan.add((machine.name, testcase.name), testcase.proto, probes)
+                if not own:
+                    # every probe is run for other testcases
+                    continue
+                if len(own) < len(probes):
+                    self.only_probes(hostdict, testcase, own)
+                probes = own
+            count = len(probes)
+            # every probe is stopped at its own deadline, so the host stays within its budget
+            hostdict['probe_deadline'] = probe_deadline(testcase.proto)
+            self.budgets.setdefault(testcase.proto, {})[host] = \
+                host_budget([hostdict['probe_deadline']] * count)
+            self.expected.setdefault(testcase.proto, {})[host] = count
+            self.add_host(testcase.proto, host, machine, hostdict)
+
+        self.write_inventory(path)
+
+    def add_host(self, group, host, machine, hostdict:dict):
+        '''
+        Adds host with the variables hostdict to the inventory group, it connects to machine
+          with the variables of the group of machine
+        '''
+        self.inventory.setdefault(machine_group(machine.name), {
+            'hosts': {},
+            'vars': self.connection_vars(machine)
+        })['hosts'][host] = None
+        self.inventory.setdefault(group, {}).setdefault('hosts', {})[host] = hostdict
 
-                self.inventory[testcase.proto]['hosts']['-'.join((machine.name,
-                                                                str(testcase.name)))] = hostdict
-            except KeyError as err:
-                raise ValueError(f"{testcase.proto} is not a valid proto") from err
+    def host_vars(self, group, host):
+        '''
+        Returns all variables of host in the inventory group, those of its machine included
+        '''
+        machine = self.test_key(host)[0]
+        return dict(self.inventory.get(machine_group(machine), {}).get('vars', {}),
+                    **self.inventory[group]['hosts'][host])
 
+    def write_inventory(self, path):
+        '''
+        Writes the inventory to path, e.g. to inspect it, nothing is written if path is empty
+        '''
+        if not path:
+            return
         with open(path, 'w', encoding='utf-8') as inventory_file:
             yaml.dump(self.inventory, inventory_file)
 
+    def only_probes(self, hostdict, testcase, probes:list):
+        '''
+        Limits the probes the host of a testcase runs to probes, a list of (destination, port)
+        '''
+        if testcase.proto == 'tcp':
+            # not every subset of destinations and ports is their product
+            hostdict['probes'] = [[destination, port] for destination, port in probes]
+            return
+        for key, value in self.protos[testcase.proto].items():
+            if value == 'destination':
+                hostdict[key] = [destination for destination, _ in probes]
+
+    def create_agent_inventory(self, path, netconfig: NetworkConfiguration,
+                               testconfig: TestcaseConfiguration):
+        """
+        Creates an inventory for the probe agent, with one host per source machine listing
+          the probes of all its testcases, written to path as well if it is set
+        """
+        hosts = {}
+        deadlines = {}
+        self.plan = ProbePlan() if self.dedup else None
+        for testcase in testconfig.testcases:
+            machine = netconfig.machines[testcase.source]
+            if testcase.proto not in COMMANDS:
+                raise ValueError(f"{testcase.proto} is not a valid proto")
+            if machine.name not in hosts:
+                hosts[machine.name] = {'probes': []}
+                self.add_host('agent', machine.name, machine, hosts[machine.name])
+            hostdict = hosts[machine.name]
+            destinations = self.parse_dest(testcase.destination, netconfig)
+            host = f"{machine.name}-{testcase.name}"
+            self.hosts[host] = (machine.name, testcase.name)
+            self.allow[(machine.name, testcase.name)] = testcase.allow
+            probes = expand_probes(testcase.proto, destinations, testcase.d_port)
+            if self.plan is not None:
+                probes = self.plan.add((machine.name, testcase.name), testcase.proto, probes)
+            self.expected.setdefault('agent', {})[host] = len(probes)
+            deadlines.setdefault(machine.name, []).extend(
+                [probe_deadline(testcase.proto)] * len(probes))
+            for n, (destination, port) in enumerate(probes):
+                hostdict['probes'].append({
+                    'host': host,
+                    'n': n,
+                    'proto': testcase.proto,
+                    'destination': destination,
+                    'port': port,
+                    'timeout': PROBE_TIMEOUTS[testcase.proto],
+                    'cmd': probe_command(testcase.proto, destination, port)
+                })
+
+        # the agent runs all probes of a machine at once
+        for name, hostdict in hosts.items():
+            self.budgets.setdefault('agent', {})[name] = host_budget(deadlines[name],
+                                                                     concurrent=True)
+            hostdict['host_deadline'] = self.budgets['agent'][name] - CONNECT_TIMEOUT
+        self.write_inventory(path)
+
+    def connection_vars(self, machine):
+        """
+        Returns the inventory variables ansible connects to machine with,
+          at its address in the leased lab if there is one
+        """
+        management_ip = machine.management_ip
+        if self.lab is not None:
+            management_ip = self.lab.address(machine)
+        return {
+            'ansible_host': management_ip.exploded,
+            'ansible_user': machine.user,
+            'ansible_password': machine.password,
+            'ansible_timeout': CONNECT_TIMEOUT
+        }
+
+    def probe_vars(self, testcase, netconfig:NetworkConfiguration):
+        """
+        Returns the inventory variables describing the probes of a testcase
+        """
+        hostvars = {}
+        try:
+            for key, value in self.protos[testcase.proto].items():
+                if value == 'destination':
+                    hostvars[key] = self.parse_dest(testcase.destination, netconfig)
+                else:
+                    hostvars[key] = getattr(testcase, value)
+        except (KeyError, AttributeError) as err:
+            raise ValueError(f"{testcase.proto} is not a valid proto") from err
+        return hostvars
+
+    def fingerprint(self, testcase, netconfig:NetworkConfiguration):
+        """
+        Returns a hash of everything the results of a testcase depend on:
+            - the NFTable scripts of all machines its probes pass
+            - the resolved destinations and ports
+            - the protocol mapping and playbook
+            - the testcase itself
+        """
+        machine = netconfig.machines[testcase.source]
+        hostvars = self.probe_vars(testcase, netconfig)
+        machines = {machine.name: machine}
+        for destination in netconfig.resolve(testcase.destination):
+            for hop, _ in netconfig.path(machine, ipaddress.ip_address(destination)):
+                machines[hop.name] = hop
+
+        data = {
+            'rulesets': {name: file_hash(hop.nftable) for name, hop in sorted(machines.items())},
+            'probes': hostvars,
+            'mapping': self.protos[testcase.proto],
+            'playbook': file_hash(f"{self.private_data_dir}/project/{testcase.proto}_playbook.yml"),
+            'testcase': repr(testcase)
+        }
+        return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
     def parse_dest(self, destination, netconfig:NetworkConfiguration):
         """
         Parses the Destination Value to a list of IP Address strings
@@ -61,165 +298,478 @@ class AnsibleManager(object):
         Returns:
             List of IP-Addresses
         """
-        destinations = []
+        # copy the memoized list, yaml.dump would turn shared lists into aliases
+        return list(netconfig.resolve(destination))
 
-        try:
-            ipaddress.ip_address(destination)
-        except ValueError:
-            pass
-        else:
-            return [ipaddress.ip_address(destination).exploded]
-
-        try:
-            ipaddress.ip_network(destination)
-        except ValueError:
-            pass
-        else:
-            network = ipaddress.ip_network(destination)
-            for machine in netconfig.machines.values():
-                for ip in machine.ip_addresses:
-                    if ip in network:
-                        destinations.append(ip.exploded)
-
-            if not destinations:
-                raise ValueError(f"No Machines in Network {destination}")
-
-        if destination in netconfig.machines:
-            for ip in netconfig.machines[destination].ip_addresses:
-                destinations.append(ip.exploded)
-
-        if destination in netconfig.networks:
-            for machine in netconfig.machines.values():
-                for ip in machine.ip_addresses:
-                    if ip in netconfig.networks[destination]:
-                        destinations.append(ip.exploded)
-
-        if not destinations:
-            raise ValueError(f"{destination} is not a Valid Destination")
-        return destinations
-
-    def create_nft_inventory(self, path:str, netconfig: NetworkConfiguration):
+    def create_nft_inventory(self, path, netconfig: NetworkConfiguration, machines=None):
         '''
-        Creates a inventory file to setup the nftable files
+        Creates the inventory group to setup the nftable files, written to path as well
+          if it is set, only for the machines named in machines if it is given
+        Machines sharing a management address and script are set up once.
         '''
-        inventory = {'setup':{'hosts':{}}}
+        self.inventory['setup'] = {'hosts': {}}
+        targets = {}
+        self.setup_aliases = {}
+        self.setup_keys = {}
         for _, machine in netconfig.machines.items():
-            if machine.nftable != '':
-                hostdict = {
-                    'ansible_host': machine.management_ip.exploded,
-                    'ansible_user': machine.user,
-                    'ansible_password': machine.password,
-                    'nft_file': os.path.abspath(machine.nftable),
-                    'filename': os.path.basename(machine.nftable)
-                }
-                inventory['setup']['hosts'][machine.name] = hostdict
-
-        with open(path, 'w', encoding='utf-8') as inventory_file:
-            yaml.dump(inventory, inventory_file)
-
-
-    def execute_playbook(self, playbook):
+            if machine.nftable != '' and (machines is None or machine.name in machines):
+                hostdict = {}
+                target = (self.connection_vars(machine)['ansible_host'],
+                          file_hash(machine.nftable))
+                if target in targets:
+                    self.setup_aliases[machine.name] = targets[target]
+                    continue
+                targets[target] = machine.name
+                self.setup_keys[machine.name] = SetupCache.key(*target)
+                active = self.setup_cache.get(self.setup_keys[machine.name]) \
+                    if self.setup_cache is not None else None
+                if active is not None:
+                    hostdict['active_checksum'] = active
+                hostdict['nft_file'] = os.path.abspath(machine.nftable)
+                hostdict['filename'] = os.path.basename(machine.nftable)
+                hostdict['setup_deadline'] = SETUP_DEADLINE
+                # uploading and loading the ruleset
+                self.budgets.setdefault('setup', {})[machine.name] = \
+                    host_budget([SETUP_DEADLINE, SETUP_DEADLINE])
+                self.expected.setdefault('setup', {})[machine.name] = None
+                self.add_host('setup', machine.name, machine, hostdict)
+
+        self.write_inventory(path)
+
+
+    def execute_playbook(self, playbook, stream=False, on_test=None, limit=None):
         '''
         Runs a specific playbook
+        If stream is set, events are parsed by an event handler as they arrive instead of
+          being read back from the artifacts after the run. If on_test is given as well,
+          it is called with (machine, testcase, results) as soon as all probes of a testcase
+          are done and those results are not kept in the returned table.
+        The playbook may take as long as the budgets of its hosts add up to. If it runs out
+          of time, the results collected so far are kept and the probes and setups that did not
+          finish are recorded as timed out.
+        limit is a list of the inventory hosts the playbook runs on, all hosts of its groups
+          if None.
+        Returns:
+            a ResultTable with the results of the playbook
         '''
         cnt = {}
-        return_dict = {}
-        runner = ansible_runner.run(private_data_dir="ansible_runner",
-                                        playbook=playbook, quiet=True, timeout=30)
-
-        if runner.status == 'timeout':
-            raise TimeoutError(f"Ansible playbook {playbook} Timed out")
-        #get data from ansible
-        for event in runner.events:
-            data = event.get('event_data', {})
-            res = data.get('res', {})
-            host = data.get('host')
-            if event['event'] == 'runner_item_on_ok' or event['event'] == 'runner_item_on_failed':
-                cnt.setdefault(host, 0)
-                return_dict[f"{host}-{cnt[host]}"] = {k: res.get(k) for k in ('stdout_lines',
-                                                                            'stderr_lines',
-                                                                            'rc',
-                                                                            'start',
-                                                                            'end',
-                                                                            'delta',
-                                                                            'msg')}
-                cmd = res.get('cmd')
-                return_dict[f"{host}-{cnt[host]}"]['cmd'] = " ".join(cmd) if \
-                    isinstance(cmd, list)  else cmd
-                return_dict[f"{host}-{cnt[host]}"]['unreachable'] =  res.get('unreachable', False)
-                cnt[host] += 1
-            elif playbook == 'setup.yml' and event['event'] == 'runner_on_ok':
-                key = f"setup-{host}"
-
-                if data.get('task_action') == "ansible.builtin.copy":
-                    return_dict.setdefault(key, {})
-                    return_dict[key].setdefault('path', res.get('path', ''))
-                    return_dict[key].setdefault('changed', res.get('changed', False))
-                    return_dict[key].setdefault('size', res.get('size', 0))
-                    return_dict[key].setdefault('upload_start', data.get('start', ''))
-                    return_dict[key].setdefault('upload_end', data.get('end', ''))
-                    return_dict[key].setdefault('checksum', res.get('checksum', ''))
-                    return_dict[key].setdefault('unreachable', False)
-
-                elif data.get('task_action') == "ansible.builtin.command":
-                    return_dict.setdefault(key, {})
-                    return_dict[key].setdefault("stdout", res.get('stdout', ''))
-                    return_dict[key].setdefault('stderr', res.get('stderr', ''))
-                    return_dict[key].setdefault('rc', res.get('rc', 1))
-                    return_dict[key].setdefault('msg', res.get('msg', ''))
-                    cmd = res.get('cmd', '')
-                    return_dict[key]['cmd'] = " ".join(cmd) if isinstance(cmd, list)  else cmd
-                    return_dict[key].setdefault('load_rules_start', res.get('start', ''))
-                    return_dict[key].setdefault('load_rules_end', res.get('end', ''))
-                    return_dict[key].setdefault('unreachable', False)
-
-            elif playbook == 'setup.yml' and event['event'] == 'runner_on_unreachable':
-                key = f"setup-{host}"
-                return_dict.setdefault(key, {})
-                return_dict[key].setdefault('start', data.get('start', ''))
-                return_dict[key].setdefault('end', data.get('end', ''))
-                return_dict[key].update(res)
-
-            elif playbook == 'setup.yml' and event['event'] == 'runner_on_failed':
-                key = f"setup-{host}"
-                return_dict.setdefault(key, {})
-                return_dict[key].setdefault('start', data.get('start', ''))
-                return_dict[key].setdefault('end', data.get('end', ''))
-                return_dict[key].setdefault('rc', data.get('rc', 1))
-                return_dict[key].setdefault('msg', res.get('msg', ''))
-                return_dict[key].setdefault('unreachable', False)
-
-
-        #clean artifacts
-        shutil.rmtree("ansible_runner/artifacts")
-
-        return return_dict
-
-    def run(self, verb=1):
-        '''
-        Runs all Playbooks
+        table = ResultTable()
+        pending = ResultTable()
+        finished = set()
+
+        def finish(machine, testcase):
+            finished.add((machine, testcase))
+            on_test(machine, testcase, pending.pop(machine, testcase))
+
+        def event_handler(event):
+            host = event.get('event_data', {}).get('host')
+            if on_test is not None and event['event'] in ITEM_EVENTS:
+                self._parse_event(playbook, event, cnt, pending)
+            elif on_test is not None and event['event'].startswith('runner_on_') \
+                    and self.test_key(host) in pending.rows:
+                finish(*self.test_key(host))
+            elif on_test is not None and is_agent_event(event):
+                self._parse_event(playbook, event, cnt, pending)
+                for key in list(pending.rows):
+                    finish(*key)
+            else:
+                self._parse_event(playbook, event, cnt, table)
+            # do not keep the event in memory or in the artifacts
+            return False
+
+        options = {'inventory': self.inventory}
+        if self.forks:
+            options['forks'] = self.forks
+        if self.envvars:
+            options['envvars'] = self.envvars
+        if limit is not None:
+            options['limit'] = ','.join(limit)
+        name = playbook if isinstance(playbook, str) else "combined playbook"
+        groups = self.playbook_groups(playbook)
+        timeout = playbook_budget([budget for group in groups
+                                   for host, budget in self.budgets.get(group, {}).items()
+                                   if limit is None or host in limit],
+                                  self.forks)
+        with self.timer.playbook(name):
+            if stream:
+                runner = ansible_runner.run(private_data_dir=self.private_data_dir,
+                                            playbook=playbook, quiet=True, timeout=timeout,
+                                            event_handler=event_handler, **options)
+            else:
+                runner = ansible_runner.run(private_data_dir=self.private_data_dir,
+                                            playbook=playbook, quiet=True, timeout=timeout,
+                                            **options)
+                #get data from ansible
+                for event in runner.events:
+                    self._parse_event(playbook, event, cnt, table)
+
+            if runner.status == 'timeout':
+                self.time_out(groups, pending if on_test is not None else table, finished,
+                              limit)
+            if on_test is not None:
+                for key in list(pending.rows):
+                    finish(*key)
+
+        if playbook == 'setup.yml':
+            self.finish_setup(table)
+
+        #clean artifacts and the inventory ansible_runner wrote for ansible
+        shutil.rmtree(f"{self.private_data_dir}/artifacts")
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(f"{self.private_data_dir}/inventory/hosts.json")
+
+        return table
+
+    def setup(self):
+        '''
+        Sets up the NFTable scripts of the setup inventory with setup.yml or the executor
+        Returns:
+            a ResultTable with the setup result of every machine
+        '''
+        if not self.inventory.get('setup', {}).get('hosts'):
+            # nothing to set up, e.g. only the testcases changed in watch mode
+            return ResultTable()
+        if self.executor is None:
+            return self.execute_playbook('setup.yml')
+        table = ResultTable()
+        with self.timer.playbook(f"setup ({self.executor.name})"):
+            hosts = self.inventory.get('setup', {}).get('hosts', {})
+            table.setup.update(self.executor.run_setup(
+                {host: self.host_vars('setup', host) for host in hosts}))
+        self.finish_setup(table)
+        return table
+
+    def execute_probes(self, on_test=None):
+        '''
+        Runs the probes of the agent inventory with the executor
+        If on_test is given, it is called with (machine, testcase, results) as soon as all
+          probes of a testcase are done and those results are not kept in the returned table.
         Returns:
-            a dictionary with data from every playbook run looking like the following:
-            {'hqfw-testcase_3': {
-                'stdout': '...',
-                'stderr': '',
-                'rc': 0,
-                'cmd': 'ping -c 4 172.16.0.10',
-                'start': '2025-06-04 21:45:03.450576',
-                'end': '2025-06-04 21:45:06.492123',
-                'delta': '0:00:03.041547',
-                'msg': '',
-                'unreachable': False
-                }
-            }
-        '''
-        return_dict = {}
-
-        for key in self.protos.keys():
+            a ResultTable with the results of the probes
+        '''
+        table = ResultTable()
+        pending = ResultTable()
+        expected = self.expected.get('agent', {})
+
+        def on_result(result):
+            key = self.test_key(result['host'])
+            probe = ProbeResult.from_res(*key, result['n'], result)
+            if on_test is None:
+                table.add(probe)
+                return
+            pending.add(probe)
+            if len(pending.get(*key)) >= expected.get(result['host'], 0):
+                on_test(*key, pending.pop(*key))
+
+        with self.timer.playbook(f"probes ({self.executor.name})"):
+            hosts = self.inventory.get('agent', {}).get('hosts', {})
+            self.executor.run_probes({host: self.host_vars('agent', host) for host in hosts},
+                                     on_result)
+        if on_test is not None:
+            for key in list(pending.rows):
+                on_test(*key, pending.pop(*key))
+        return table
+
+    def finish_setup(self, table:ResultTable):
+        '''
+        Records the rulesets now active in the SetupCache and hands the results of
+          setting up a host to the machines sharing it
+        '''
+        for host, result in table.setup.items():
+            if self.setup_cache is not None and host in self.setup_keys and \
+                    result.get('rc') == 0 and result.get('active_checksum'):
+                self.setup_cache.put(self.setup_keys[host], result['active_checksum'])
+        for machine, host in self.setup_aliases.items():
+            if host in table.setup:
+                table.setup[machine] = dict(table.setup[host], shared=host)
+
+    def playbook_groups(self, playbook):
+        '''
+        Returns the inventory groups a playbook runs on
+        '''
+        if not isinstance(playbook, str):
+            return [group for play in playbook for group in play['hosts'].split(':')]
+        if playbook == 'setup.yml':
+            return ['setup']
+        return [playbook[:-len('_playbook.yml')]]
 
-            if verb >= 1:
-                print(f"Starting {key} tests")
+    def time_out(self, groups, table:ResultTable, finished=(), limit=None):
+        '''
+        Records every probe and setup of the hosts in groups missing from table as timed out,
+          testcases in finished are complete, only hosts in limit if it is given
+        '''
+        for group in groups:
+            for host, count in self.expected.get(group, {}).items():
+                # the testcase hosts of the agent group are run by the host of their machine
+                if limit is not None and host not in limit and \
+                        self.test_key(host)[0] not in limit:
+                    continue
+                if group == 'setup':
+                    if 'rc' not in table.setup.get(host, {}):
+                        table.setup.setdefault(host, {}).update(
+                            {'rc': None, 'msg': TIMED_OUT, 'unreachable': False,
+                             'timed_out': True})
+                    continue
+                key = self.test_key(host)
+                if key in finished:
+                    continue
+                done = {result.index for result in table.get(*key)}
+                for n in range(count):
+                    if n not in done:
+                        table.add(ProbeResult(*key, n, msg=TIMED_OUT, timed_out=True))
+
+    def test_key(self, host):
+        '''
+        Returns (machine name, testcase name) of an inventory host of a testcase
+        '''
+        return self.hosts.get(host, (host, None))
 
-            return_dict.update(self.execute_playbook(f"{key}_playbook.yml"))
+    def _parse_event(self, playbook, event, cnt, table:ResultTable):
+        '''
+        Adds the data of a single ansible event to table
+        '''
+        data = event.get('event_data', {})
+        res = data.get('res', {})
+        host = data.get('host')
+        if event['event'] in ITEM_EVENTS:
+            cnt.setdefault(host, 0)
+            table.add(ProbeResult.from_res(*self.test_key(host), cnt[host], res))
+            cnt[host] += 1
+        elif is_agent_event(event):
+            for result in agent_results(event):
+                table.add(ProbeResult.from_res(*self.test_key(result['host']), result['n'],
+                                               result))
+        elif playbook == 'setup.yml' and event['event'] == 'runner_on_ok':
+            if data.get('task_action') == "ansible.builtin.copy":
+                table.setup.setdefault(host, {})
+                table.setup[host].setdefault('path', res.get('path', ''))
+                table.setup[host].setdefault('changed', res.get('changed', False))
+                table.setup[host].setdefault('size', res.get('size', 0))
+                table.setup[host].setdefault('upload_start', data.get('start', ''))
+                table.setup[host].setdefault('upload_end', data.get('end', ''))
+                table.setup[host].setdefault('checksum', res.get('checksum', ''))
+                table.setup[host].setdefault('unreachable', False)
+
+            elif data.get('task_action') == "ansible.builtin.shell":
+                # the last check of the active ruleset is the one after loading it
+                table.setup.setdefault(host, {})['active_checksum'] = \
+                    (res.get('stdout') or '').split(' ')[0]
+
+            elif data.get('task_action') == "ansible.builtin.command":
+                table.setup.setdefault(host, {})
+                table.setup[host].setdefault("stdout", res.get('stdout', ''))
+                table.setup[host].setdefault('stderr', res.get('stderr', ''))
+                table.setup[host].setdefault('rc', res.get('rc', 1))
+                table.setup[host].setdefault('msg', res.get('msg', ''))
+                cmd = res.get('cmd', '')
+                table.setup[host]['cmd'] = " ".join(cmd) if isinstance(cmd, list)  else cmd
+                table.setup[host].setdefault('load_rules_start', res.get('start', ''))
+                table.setup[host].setdefault('load_rules_end', res.get('end', ''))
+                table.setup[host].setdefault('unreachable', False)
+
+        elif playbook == 'setup.yml' and event['event'] == 'runner_on_skipped':
+            if data.get('task_action') == "ansible.builtin.command":
+                # the ruleset is active already
+                table.setup.setdefault(host, {}).update({'rc': 0, 'msg': 'ruleset unchanged',
+                                                         'unchanged': True,
+                                                         'unreachable': False})
+
+        elif playbook == 'setup.yml' and event['event'] == 'runner_on_unreachable':
+            table.setup.setdefault(host, {})
+            table.setup[host].setdefault('start', data.get('start', ''))
+            table.setup[host].setdefault('end', data.get('end', ''))
+            table.setup[host].update(res)
+
+        elif playbook == 'setup.yml' and event['event'] == 'runner_on_failed':
+            table.setup.setdefault(host, {})
+            table.setup[host].setdefault('start', data.get('start', ''))
+            table.setup[host].setdefault('end', data.get('end', ''))
+            table.setup[host].setdefault('rc', data.get('rc', 1))
+            table.setup[host].setdefault('msg', res.get('msg', ''))
+            table.setup[host].setdefault('unreachable', False)
+
+    def run(self, verb=1, stream=False, on_test=None):
+        '''
+        Runs all Playbooks, stream and on_test are passed on to execute_playbook
+        In single pass mode all protocols run as one combined play instead,
+          in agent mode the probe agent runs all probes of a machine and with an executor
+          the executor runs all probes instead, see execute_probes.
+        The results of probes run once for several testcases are handed to all of them.
+        Failed probes are retried afterwards if retries is set, while streaming the testcases
+          with failed probes are handed to on_test once they are retried, testcases sharing
+          their probes that were handed on already keep their results.
+        Returns:
+            a ResultTable with the results of every playbook run
+        '''
+        table = ResultTable()
+        deferred = ResultTable()
+        emit = on_test
+        if on_test is not None and self.retries:
+            def emit(machine, testcase, results):
+                if any(self.needs_retry(result) for result in results):
+                    deferred.extend(results)
+                else:
+                    on_test(machine, testcase, results)
+
+        protos = [key for key in self.protos.keys() if self.inventory.get(key, {}).get('hosts')]
+        if self.executor is not None:
+            # the executor runs the probes of all machines without ansible
+            playbooks = []
+        elif self.agent:
+            playbooks = [("probe agents", "agent_playbook.yml")]
+        elif self.single_pass and protos:
+            playbooks = [(', '.join(protos), self.combined_playbook(protos))]
+        else:
+            playbooks = [(key, f"{key}_playbook.yml") for key in protos]
+
+        collect = emit
+        if on_test is not None and self.plan is not None:
+            def collect(machine, testcase, results):
+                if (machine, testcase) not in self.plan.probes:
+                    emit(machine, testcase, results)
+                    return
+                for key, shared in self.plan.collect((machine, testcase), results):
+                    emit(*key, shared)
+
+        if verb >= 1 and self.plan is not None and self.plan.saved():
+            print(f"{self.plan.saved()} probes shared between testcases")
+        if self.executor is not None:
+            if verb >= 1:
+                print(f"Starting tests with the {self.executor.name} executor")
+            table.update(self.execute_probes(collect))
+        for name, playbook in playbooks:
+            if verb >= 1:
+                print(f"Starting {name}" if self.agent else f"Starting {name} tests")
+            table.update(self.execute_playbook(playbook, stream, collect))
+
+        if self.plan is not None:
+            if on_test is not None:
+                for key, shared in self.plan.flush():
+                    emit(*key, shared)
+            table = self.plan.fan_out(table)
+        if self.retries and on_test is not None:
+            for key, results in self.retry_failed(deferred, verb).rows.items():
+                on_test(*key, results)
+        elif self.retries:
+            table = self.retry_failed(table, verb)
+        return table
+
+    def needs_retry(self, result:ProbeResult):
+        '''
+        Checks whether a probe failed: its machine was unreachable, it timed out or it did not
+          pass although its testcase expects it to
+        '''
+        return result.unreachable or result.timed_out or \
+            (result.rc != 0 and self.allow.get((result.machine, result.testcase), True))
 
-        return return_dict
+    def retry_failed(self, table:ResultTable, verb=1):
+        '''
+        Runs the failed probes of table again up to retries times, waiting backoff seconds
+          before the first retry and twice as long before every further one
+        Every new result replaces the one in table and keeps the earlier ones as its attempts.
+        Returns:
+            table with the results of the last attempt of every probe
+        '''
+        for attempt in range(self.retries):
+            failed = {}
+            for result in table:
+                if self.needs_retry(result):
+                    failed.setdefault((result.machine, result.testcase), set()).add(result.index)
+            if not failed:
+                break
+            delay = self.backoff * 2 ** attempt
+            if verb >= 1:
+                print(f"Retrying {sum(len(probes) for probes in failed.values())} failed probes "
+                      f"of {len(failed)} testcases in {delay:g}s "
+                      f"(attempt {attempt + 1} of {self.retries})")
+            time.sleep(delay)
+            retried = self.retry(failed)
+
+            merged = ResultTable()
+            merged.setup = table.setup
+            for result in table:
+                new = {probe.index: probe for probe in retried.get(result.machine,
+                                                                   result.testcase)}
+                merged.add(result.retried(new[result.index]) if result.index in new else result)
+            table = merged
+        return table
+
+    def retry(self, failed:dict):
+        '''
+        Runs the probes in failed again, (machine name, testcase name) -> the indexes of its
+          probes, only on the hosts that ran them: the testcase hosts with the host limit of
+          ansible_runner, with the probe agent or the executor only the failed probes
+        Returns:
+            a ResultTable with the new results of the probes in failed, handed to all
+              testcases sharing them
+        '''
+        # the testcases that ran the failed probes and the indexes of those probes in their runs
+        runs = {}
+        for key, indexes in failed.items():
+            for index in indexes:
+                if self.plan is None:
+                    runs.setdefault(key, set()).add(index)
+                elif key in self.plan.probes and index < len(self.plan.probes[key]):
+                    probe = self.plan.probes[key][index]
+                    runner = self.plan.runner[probe]
+                    runs.setdefault(runner, set()).add(self.plan.runs[runner].index(probe))
+
+        table = ResultTable()
+        if self.agent or self.executor is not None:
+            agent = self.inventory.get('agent', {'hosts': {}})
+            hosts = {}
+            for name, hostdict in agent['hosts'].items():
+                probes = [probe for probe in hostdict['probes']
+                          if probe['n'] in runs.get(self.test_key(probe['host']), ())]
+                if probes:
+                    hosts[name] = dict(hostdict, probes=probes)
+            self.inventory['agent'] = {'hosts': hosts}
+            try:
+                if self.executor is not None:
+                    table.update(self.execute_probes())
+                else:
+                    table.update(self.execute_playbook('agent_playbook.yml', limit=list(hosts)))
+            finally:
+                self.inventory['agent'] = agent
+        else:
+            names = {key: host for host, key in self.hosts.items()}
+            for proto in self.protos:
+                hosts = [names[key] for key in runs
+                         if names.get(key) in self.inventory.get(proto, {}).get('hosts', {})]
+                if hosts:
+                    table.update(self.execute_playbook(f"{proto}_playbook.yml", limit=hosts))
+
+        retried = ResultTable()
+        retried.extend(result for result in table
+                       if result.index in runs.get((result.machine, result.testcase), ()))
+        return self.plan.fan_out(retried) if self.plan is not None else retried
+
+    def combined_playbook(self, protos:list):
+        '''
+        Combines the tasks of the playbooks of protos into a single play using the free strategy,
+          every task only runs on the hosts of its own protocol
+        Returns:
+            the play as a list as accepted by ansible_runner
+        '''
+        tasks = []
+        for proto in protos:
+            with open(f"{self.private_data_dir}/project/{proto}_playbook.yml", 'r',
+                      encoding='utf-8') as playbook_file:
+                plays = yaml.safe_load(playbook_file)
+            for play in plays:
+                for task in play.get('tasks', []):
+                    task = dict(task)
+                    condition = [f"'{proto}' in group_names"]
+                    if 'when' in task:
+                        condition += task['when'] if isinstance(task['when'], list) \
+                            else [task['when']]
+                    task['when'] = condition
+                    tasks.append(task)
+
+        return [{
+            'name': 'Run all protocol tests',
+            'hosts': ':'.join(protos),
+            'gather_facts': False,
+            'strategy': 'free',
+            'tasks': tasks
+        }]
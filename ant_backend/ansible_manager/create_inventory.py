@@ -26,6 +26,6 @@ if __name__ == '__main__':
     print(return_dict)
     shutil.rmtree("ansible_runner/artifacts")'''
 
-    manager.create_nft_inventory('ansible_runner/inventory/setup.yml', netconfig)
+    manager.create_nft_inventory(None, netconfig)
 
     manager.execute_playbook('setup.yml')
@@ -0,0 +1,3 @@
+from .generators import generate, infra_data, testcase_data
+from .fake_runner import FakeRunner
+from .bench import SCALES, Benchmark, compare, run_benchmarks
@@ -0,0 +1,49 @@
+"""
+Runs the benchmark suite:
+    python -m ant_backend.benchmarks [-s small|medium|large] [-m machines] [-n testcases]
+                                     [-o report.json] [--compare old.json]
+"""
+
+import json
+import sys
+from argparse import ArgumentParser
+from ant_backend.benchmarks.bench import SCALES, compare, load_report, run_benchmarks
+
+if __name__ == '__main__':
+    parser = ArgumentParser(prog="python -m ant_backend.benchmarks",
+                            description="Measures the overhead of the ANT grading pipeline")
+    parser.add_argument('-s', '--scale', choices=SCALES, default='small',
+                        help='number of machines and testcases to generate')
+    parser.add_argument('-m', '--machines', type=int, help='overrides the machines of --scale')
+    parser.add_argument('-n', '--testcases', type=int,
+                        help='overrides the testcases of --scale')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='runs per stage, the fastest is reported')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generators')
+    parser.add_argument('-o', '--output', help='file to write the json report to')
+    parser.add_argument('--compare', help='report of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='slowdown at which a stage counts as a regression')
+    args = parser.parse_args()
+
+    machines, testcases = SCALES[args.scale]
+    report = run_benchmarks(args.machines or machines, args.testcases or testcases,
+                            args.repeat, args.seed)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, indent=2)
+
+    print(f"{report['scale']['machines']} machines, {report['scale']['testcases']} testcases")
+    for stage, timing in report['stages'].items():
+        print(f"{stage:<26}{timing['seconds']:>10.4f}s")
+
+    if args.compare:
+        regressions = 0
+        print(f"\nCompared with {args.compare}:")
+        for stage, before, after, ratio, regressed in compare(load_report(args.compare), report,
+                                                              args.threshold):
+            regressions += regressed
+            print(f"{stage:<26}{before:>10.4f}s{after:>10.4f}s{ratio:>8.2f}x"
+                  f"{'  REGRESSION' if regressed else ''}")
+        sys.exit(1 if regressions else 0)
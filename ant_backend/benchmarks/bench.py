@@ -0,0 +1,172 @@
+"""
+Module: bench.py
+
+Timed scenarios for the stages of the grading pipeline, run on generated infra and testcase
+files with FakeRunner in place of ansible_runner.run. Every stage is run repeat times, the
+fastest run is reported. Results are written as json and can be compared with the results
+of another commit by compare.
+"""
+
+import gc
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from unittest import mock
+from ant_backend import AnsibleManager, Logger, NetworkConfiguration, TestcaseConfiguration
+from ant_backend.grading import score_results, tool_dir
+from ant_backend.benchmarks.generators import generate
+from ant_backend.benchmarks.fake_runner import FakeRunner
+
+SCALES = {
+    'small': (10, 100),
+    'medium': (1000, 10000),
+    'large': (10000, 100000)
+}
+
+class Benchmark(object):
+    """
+    Runs the stages of the pipeline on one generated infra and testcase file
+    """
+    def __init__(self, directory, machines, testcases, repeat=3, seed=0):
+        self.directory = directory
+        self.repeat = repeat
+        self.scale = {'machines': machines, 'testcases': testcases, 'seed': seed}
+        self.infra_path, self.testcases_path = generate(os.path.join(directory, 'input'),
+                                                        machines, testcases, seed)
+        self.runner_dir = os.path.join(directory, 'ansible_runner')
+        shutil.copytree(os.path.join(tool_dir(), 'ansible_runner', 'project'),
+                        os.path.join(self.runner_dir, 'project'))
+        self.results = {}
+
+    def time(self, name, stage, setup=None):
+        """
+        Runs stage repeat times, each after calling setup, and records the fastest run
+        Returns:
+            the return value of the last run
+        """
+        runs = []
+        value = None
+        for _ in range(self.repeat):
+            args = setup() if setup is not None else ()
+            gc.collect()
+            start = time.perf_counter()
+            value = stage(*args)
+            runs.append(time.perf_counter() - start)
+        self.results[name] = {'seconds': min(runs), 'runs': runs}
+        return value
+
+    def manager(self, **options):
+        """
+        Returns an AnsibleManager working on the runner directory of the benchmark
+        """
+        return AnsibleManager(os.path.join(tool_dir(), 'mapping.yml'), self.runner_dir, **options)
+
+    def run(self):
+        """
+        Runs all stages
+        Returns:
+            the timings as {stage: {'seconds': fastest run, 'runs': [all runs]}}
+        """
+        def load_infra():
+            net_config = NetworkConfiguration()
+            net_config.load_from_yaml(self.infra_path)
+            return net_config
+
+        def load_testcases():
+            testcase_config = TestcaseConfiguration()
+            testcase_config.load_from_yaml(self.testcases_path)
+            return testcase_config
+
+        net_config = self.time('load_infra', load_infra)
+        testcase_config = self.time('load_testcases', load_testcases)
+
+        def parse_dest(manager):
+            for testcase in testcase_config.testcases:
+                manager.parse_dest(testcase.destination, net_config)
+
+        def fresh_index():
+            # drop the memoized destinations
+            net_config.build_index()
+            return (self.manager(),)
+
+        self.time('parse_dest', parse_dest, fresh_index)
+
+        manager = self.time('create_inventory',
+                            lambda manager: manager.create_inventory(None, net_config,
+                                                                     testcase_config) or manager,
+                            fresh_index)
+        manager.create_nft_inventory(None, net_config)
+
+        runner = FakeRunner()
+        with mock.patch('ansible_runner.run', side_effect=runner.run):
+            results = self.time('execute_playbook', lambda: manager.run(verb=0))
+            self.time('execute_playbook_stream',
+                      lambda: manager.run(verb=0, stream=True, on_test=lambda *_: None))
+            self.time('execute_setup', lambda: manager.execute_playbook('setup.yml'))
+
+        logger = self.time('scoring', lambda logger: score_results(
+            results, net_config, testcase_config, logger) or logger, lambda: (Logger(),))
+
+        output = os.path.join(self.directory, 'output')
+        os.makedirs(output, exist_ok=True)
+        for fmt in ('yaml', 'json', 'jsonl'):
+            self.time(f"logger_write_{fmt}", lambda fmt=fmt: logger.write(output, fmt=fmt))
+            for name in os.listdir(output):
+                os.remove(os.path.join(output, name))
+
+        return self.results
+
+def commit():
+    """
+    Returns the commit of the working tree or None outside of a git repository
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=tool_dir(), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(machines, testcases, repeat=3, seed=0):
+    """
+    Runs all stages on generated files in a temporary directory
+    Returns:
+        the report as written by main
+    """
+    with tempfile.TemporaryDirectory(prefix='ant-bench-') as directory:
+        benchmark = Benchmark(directory, machines, testcases, repeat, seed)
+        stages = benchmark.run()
+    return {
+        'commit': commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': benchmark.scale,
+        'repeat': repeat,
+        'stages': stages
+    }
+
+def compare(old:dict, new:dict, threshold=1.2):
+    """
+    Compares two reports stage by stage
+    Returns:
+        list of (stage, old seconds, new seconds, ratio, regressed) for stages in both reports,
+        a stage regressed if it takes more than threshold times as long as before
+    """
+    rows = []
+    for stage, timing in new['stages'].items():
+        if stage not in old['stages']:
+            continue
+        before = old['stages'][stage]['seconds']
+        ratio = timing['seconds'] / before if before else float('inf')
+        rows.append((stage, before, timing['seconds'], ratio, ratio > threshold))
+    return rows
+
+def load_report(path):
+    """
+    Loads a report written by main
+    """
+    with open(path, 'r', encoding='utf-8') as report_file:
+        return json.load(report_file)
@@ -0,0 +1,226 @@
+"""
+Module: fake_runner.py
+
+A stand-in for ansible_runner.run that replays the event stream ansible would produce for
+the inventory of a run, without connecting to any machine. The events carry the same
+payloads as the events of a live run: the result of every loop item with its output lines
+and timestamps, the summary of every loop task and the debug task of the probe playbooks.
+"""
+
+import datetime
+import glob
+import json
+import os
+import zlib
+import yaml
+from ant_backend.probes import expand_probes, probe_command
+
+STARTED = datetime.datetime(2025, 6, 4, 21, 45, 3)
+PROBE_TIME = datetime.timedelta(milliseconds=40)
+
+class FakeResult(object):
+    """
+    The parts of ansible_runner.Runner used by AnsibleManager
+    """
+    def __init__(self, events, status='successful'):
+        self.events = events
+        self.status = status
+        self.rc = 0 if status == 'successful' else 1
+
+class FakeRunner(object):
+    """
+    Replays synthetic events, use run in place of ansible_runner.run
+    success is the share of probes that succeed, which ones is decided by a hash of the
+      probe, so repeated runs produce the same events
+    """
+    def __init__(self, success=0.7):
+        self.success = success
+
+    def run(self, private_data_dir, playbook, event_handler=None, inventory=None, limit=None,
+            **_):
+        """
+        Produces the events of running playbook on inventory or, like ansible_runner,
+          on the inventory files in private_data_dir, only on the hosts of limit, a comma
+          separated list of hosts, if it is given
+        """
+        if inventory is None:
+            inventory = {}
+            for path in sorted(glob.glob(os.path.join(private_data_dir, 'inventory', '*.yml'))):
+                with open(path, 'r', encoding='utf-8') as inventory_file:
+                    inventory.update(yaml.load(inventory_file, Loader=getattr(
+                        yaml, 'CSafeLoader', yaml.SafeLoader)) or {})
+        inventory = self.hosts(inventory)
+
+        if isinstance(playbook, list):
+            groups = [group for play in playbook for group in play['hosts'].split(':')]
+        else:
+            groups = [playbook.split('_')[0] if playbook != 'setup.yml' else 'setup']
+
+        events = self.events(groups, inventory, limit.split(',') if limit else None)
+        os.makedirs(os.path.join(private_data_dir, 'artifacts'), exist_ok=True)
+        if event_handler is not None:
+            for event in events:
+                event_handler(event)
+            return FakeResult([])
+        return FakeResult(list(events))
+
+    @staticmethod
+    def hosts(inventory):
+        """
+        Returns the hosts of every group of inventory with all their variables, those of the
+          groups they are in and their own
+        """
+        group_vars = {}
+        for data in inventory.values():
+            for host in (data or {}).get('hosts') or {}:
+                group_vars.setdefault(host, {}).update((data or {}).get('vars') or {})
+        return {group: {host: dict(group_vars[host], **(hostvars or {}))
+                        for host, hostvars in ((data or {}).get('hosts') or {}).items()}
+                for group, data in inventory.items()}
+
+    def events(self, groups, inventory, limit=None):
+        """
+        Yields the events of all hosts of groups, those in limit if it is given
+        """
+        counter = 0
+        for group in groups:
+            for host, hostvars in inventory.get(group, {}).items():
+                if limit is not None and host not in limit:
+                    continue
+                if group == 'setup':
+                    events = self.setup_events(host, hostvars)
+                elif group == 'agent':
+                    events = self.agent_events(host, hostvars)
+                else:
+                    events = self.probe_events(group, host, hostvars)
+                for event, data in events:
+                    counter += 1
+                    data['host'] = host
+                    yield {'event': event, 'counter': counter, 'uuid': f"{counter:032x}",
+                           'event_data': data}
+
+    def outcome(self, proto, destination, port):
+        """
+        Returns rc, stdout_lines, stderr_lines of a probe
+        """
+        digest = zlib.crc32(f"{proto} {destination} {port}".encode()) / 0xffffffff
+        if proto == 'tcp':
+            if digest < self.success:
+                return 0, [], [f"Connection to {destination} {port} port [tcp/*] succeeded!"]
+            return 1, [], [f"nc: connect to {destination} port {port} (tcp) timed out: "
+                           "Operation now in progress"]
+        if proto == 'udp':
+            if digest < self.success:
+                return 0, ["", "; <<>> DiG 9.18.28 <<>> @" + destination + " port=53",
+                           ";; global options: +cmd", ";; Got answer:",
+                           ";; ->>HEADER<<- opcode: QUERY, status: NOERROR, id: 4711",
+                           ";; flags: qr rd ra; QUERY: 1, ANSWER: 13, AUTHORITY: 0",
+                           ";; Query time: 3 msec", f";; SERVER: {destination}#53({destination})",
+                           ";; MSG SIZE  rcvd: 239"], []
+            return 9, ["", f"; <<>> DiG 9.18.28 <<>> @{destination} port=53",
+                       ";; global options: +cmd",
+                       ";; connection timed out; no servers could be reached"], []
+        if digest < self.success:
+            return 0, [f"PING {destination} ({destination}) 56(84) bytes of data."] + \
+                [f"64 bytes from {destination}: icmp_seq={seq} ttl=63 time=0.{seq}3 ms"
+                 for seq in range(1, 5)] + \
+                ["", f"--- {destination} ping statistics ---",
+                 "4 packets transmitted, 4 received, 0% packet loss, time 3004ms",
+                 "rtt min/avg/max/mdev = 0.130/0.330/0.430/0.112 ms"], []
+        return 1, [f"PING {destination} ({destination}) 56(84) bytes of data.", "",
+                   f"--- {destination} ping statistics ---",
+                   "4 packets transmitted, 0 received, 100% packet loss, time 3062ms"], []
+
+    def probe_result(self, proto, destination, port, number):
+        """
+        Returns the res of a single probe as ansible reports it
+        """
+        rc, stdout_lines, stderr_lines = self.outcome(proto, destination, port)
+        start = STARTED + number * PROBE_TIME
+        end = start + PROBE_TIME
+        cmd = probe_command(proto, destination, port)
+        return {
+            'changed': True,
+            'cmd': cmd.split(),
+            'rc': rc,
+            'stdout': "\n".join(stdout_lines),
+            'stdout_lines': stdout_lines,
+            'stderr': "\n".join(stderr_lines),
+            'stderr_lines': stderr_lines,
+            'start': str(start),
+            'end': str(end),
+            'delta': str(end - start),
+            'msg': '' if rc == 0 else 'non-zero return code',
+            'failed': rc != 0,
+            'invocation': {'module_args': {'_raw_params': cmd, '_uses_shell': False,
+                                           'expand_argument_vars': True, 'stdin_add_newline': True,
+                                           'strip_empty_ends': True}},
+            'ansible_loop_var': 'item',
+            'item': [destination, port] if proto == 'tcp' else destination
+        }
+
+    def probe_events(self, proto, host, hostvars):
+        """
+        Yields the events of a protocol playbook on a single host
+        """
+        action = 'ansible.builtin.command'
+        yield 'runner_on_start', {'task_action': action}
+        results = []
+        # a host sharing some of its probes with other testcases lists the rest
+        probes = [tuple(probe) for probe in hostvars['probes']] if 'probes' in hostvars else \
+            expand_probes(proto, hostvars.get('destination', []), hostvars.get('dport', []))
+        for number, (destination, port) in enumerate(probes):
+            res = self.probe_result(proto, destination, port, number)
+            results.append(res)
+            yield ('runner_item_on_ok' if res['rc'] == 0 else 'runner_item_on_failed',
+                   {'task_action': action, 'res': res, 'start': res['start'],
+                    'end': res['end']})
+        # the loop summary repeats all item results, as it does in a live run
+        yield 'runner_on_ok', {'task_action': action, 'res': {'changed': True,
+                                                              'results': results}}
+        yield 'runner_on_start', {'task_action': 'debug'}
+        yield 'runner_on_ok', {'task_action': 'debug', 'res': {'nc_tcp_result.results': results}}
+
+    def agent_events(self, host, hostvars):
+        """
+        Yields the events of the probe agent playbook on a single host
+        """
+        results = []
+        for probe in hostvars.get('probes', []):
+            res = self.probe_result(probe['proto'], probe['destination'], probe['port'],
+                                    len(results))
+            results.append({'host': probe['host'], 'n': probe['n'], 'rc': res['rc'],
+                            'stdout_lines': res['stdout_lines'],
+                            'stderr_lines': res['stderr_lines'], 'start': res['start'],
+                            'end': res['end'], 'delta': res['delta'], 'cmd': probe['cmd'],
+                            'msg': res['msg']})
+        stdout = json.dumps({'results': results})
+        yield 'runner_on_start', {'task_action': 'ansible.builtin.script'}
+        yield 'runner_on_ok', {'task_action': 'ansible.builtin.script',
+                               'res': {'changed': True, 'rc': 0, 'stdout': stdout,
+                                       'stdout_lines': [stdout], 'stderr': ''}}
+
+    def setup_events(self, host, hostvars):
+        """
+        Yields the events of the setup playbook on a single host, the ruleset of a script is
+          the same every time it is loaded
+        """
+        start = str(STARTED)
+        checksum = f"{zlib.crc32(hostvars['nft_file'].encode()):064x}"
+        active = {'changed': False, 'rc': 0, 'stdout': f"{checksum}  -"}
+        if hostvars.get('active_checksum') == checksum:
+            yield 'runner_on_ok', {'task_action': 'ansible.builtin.shell', 'res': active}
+            yield 'runner_on_skipped', {'task_action': 'ansible.builtin.copy', 'res': {}}
+            yield 'runner_on_skipped', {'task_action': 'ansible.builtin.command', 'res': {}}
+            yield 'runner_on_ok', {'task_action': 'ansible.builtin.shell', 'res': active}
+            return
+        yield 'runner_on_ok', {'task_action': 'ansible.builtin.copy', 'start': start,
+                               'end': start, 'res': {
+                                   'changed': True, 'checksum': '0' * 40, 'size': 1024,
+                                   'path': f"/home/{hostvars['ansible_user']}/"
+                                           f"{hostvars['filename']}"}}
+        yield 'runner_on_ok', {'task_action': 'ansible.builtin.command', 'res': {
+            'changed': True, 'rc': 0, 'stdout': '', 'stderr': '', 'msg': '', 'start': start,
+            'end': start, 'cmd': ['sudo', 'nft', '-f',
+                                  f"/home/{hostvars['ansible_user']}/{hostvars['filename']}"]}}
+        yield 'runner_on_ok', {'task_action': 'ansible.builtin.shell', 'res': active}
@@ -0,0 +1,113 @@
+"""
+Module: generators.py
+
+Generates synthetic infra and testcase files at any scale. Machines are placed in /24
+networks, the first machine of every network is its firewall, with an NFTable script and an
+address in a core network shared by all firewalls.
+"""
+
+import ipaddress
+import os
+import random
+import yaml
+
+MACHINES_PER_NETWORK = 250
+LAN_BASE = ipaddress.ip_address('172.16.0.0')
+CORE_BASE = ipaddress.ip_address('10.128.0.0')
+MANAGEMENT_BASE = ipaddress.ip_address('10.0.0.0')
+PROTO_WEIGHTS = {'tcp': 6, 'udp': 2, 'icmp': 2}
+PORTS = (22, 25, 53, 80, 123, 443, 3306, 5432, 8080)
+
+NFT_SCRIPT = """table inet filter {
+    chain forward {
+        type filter hook forward priority 0; policy drop;
+        ct state established,related accept
+        tcp dport { 22, 80, 443 } accept
+        icmp type echo-request accept
+    }
+}
+"""
+
+def infra_data(machines:int, nftable:str, machines_per_network=MACHINES_PER_NETWORK):
+    """
+    Returns the content of an infra file with machines machines
+    """
+    networks = {}
+    hosts = {}
+    network_count = (machines + machines_per_network - 1) // machines_per_network
+    networks['core'] = {'Netmask': 16, 'Netaddress': CORE_BASE.exploded}
+    for net in range(network_count):
+        networks[f"net{net}"] = {'Netmask': 24, 'Netaddress': (LAN_BASE + net * 256).exploded}
+
+    for index in range(machines):
+        net, position = divmod(index, machines_per_network)
+        host = {
+            'IP': [(LAN_BASE + net * 256 + position + 1).exploded],
+            'Management': (MANAGEMENT_BASE + index + 1).exploded,
+            'User': 'toor',
+            'Password': 'toor123'
+        }
+        if position == 0:
+            host['IP'].append((CORE_BASE + net + 1).exploded)
+            host['NFTable'] = nftable
+            hosts[f"fw{net}"] = host
+        else:
+            hosts[f"m{index}"] = host
+    return {'Networks': networks, 'Machines': hosts}
+
+def testcase_data(infra:dict, testcases:int, seed=0):
+    """
+    Returns the content of a testcase file with testcases testcases between the machines of infra
+    Destinations are machine names, network names or single addresses.
+    """
+    rng = random.Random(seed)
+    machines = list(infra['Machines'].items())
+    networks = [name for name in infra['Networks'] if name != 'core']
+    protos = list(PROTO_WEIGHTS)
+    weights = list(PROTO_WEIGHTS.values())
+
+    data = []
+    for index in range(testcases):
+        source = rng.choice(machines)[0]
+        kind = rng.random()
+        if kind < 0.6:
+            destination = rng.choice(machines)[0]
+        elif kind < 0.9:
+            destination = rng.choice(machines)[1]['IP'][0]
+        else:
+            # a whole network expands to all of its machines, keep those rare
+            destination = rng.choice(networks)
+        entry = {
+            'Name': f"tc{index}",
+            'Source': source,
+            'Destination': destination,
+            'Proto': rng.choices(protos, weights)[0],
+            'D_port': rng.sample(PORTS, rng.randint(1, 2)),
+            'Points': rng.randint(1, 3)
+        }
+        if rng.random() < 0.3:
+            entry['Allow'] = False
+        data.append(entry)
+    return data
+
+def generate(directory:str, machines:int, testcases:int, seed=0):
+    """
+    Writes an infra file, a testcase file and the NFTable script of the firewalls to directory
+    Returns:
+        the paths of the infra and the testcase file
+    """
+    os.makedirs(directory, exist_ok=True)
+    nftable = os.path.join(directory, 'fw.nft')
+    with open(nftable, 'w', encoding='utf-8') as nft_file:
+        nft_file.write(NFT_SCRIPT)
+
+    infra = infra_data(machines, nftable)
+    infra_path = os.path.join(directory, 'infra.yml')
+    with open(infra_path, 'w', encoding='utf-8') as infra_file:
+        yaml.dump(infra, infra_file, Dumper=getattr(yaml, 'CDumper', yaml.Dumper))
+
+    testcases_path = os.path.join(directory, 'tests.yml')
+    with open(testcases_path, 'w', encoding='utf-8') as testcases_file:
+        yaml.dump(testcase_data(infra, testcases, seed), testcases_file,
+                  Dumper=getattr(yaml, 'CDumper', yaml.Dumper))
+    return infra_path, testcases_path
@@ -0,0 +1 @@
+from .config_cache import ConfigCache
@@ -0,0 +1,70 @@
+"""
+Module: config_cache.py
+
+Snapshot cache of loaded configurations. A NetworkConfiguration or TestcaseConfiguration
+is pickled after it was loaded and validated, later runs on a file with the same content
+load the snapshot instead of parsing the file again.
+"""
+
+import hashlib
+import pickle
+import sys
+from ant_backend.disk_cache import DiskCache
+from ant_backend.result_cache import file_hash
+
+class ConfigCache(DiskCache):
+    """
+    On-disk store of configuration snapshots keyed by the content hash of the loaded file
+      and of the module defining the configuration class, so changes to the parser
+      invalidate old snapshots
+    """
+    name = 'config'
+    suffix = '.pickle'
+
+    def __init__(self, path=None):
+        super().__init__(path)
+        self.code_hashes = {}
+
+    def key(self, file_name, config):
+        """
+        Returns the cache key for loading file_name into config or None if it can not be read
+        """
+        try:
+            with open(file_name, 'rb') as config_file:
+                digest = hashlib.sha256(config_file.read())
+        except OSError:
+            return None
+        cls = type(config)
+        if cls not in self.code_hashes:
+            self.code_hashes[cls] = file_hash(sys.modules[cls.__module__].__file__)
+        digest.update(f"{cls.__qualname__}:{self.code_hashes[cls]}".encode())
+        return digest.hexdigest()
+
+    def get(self, file_name, config):
+        """
+        Returns the snapshot of file_name loaded into an object like config or None
+        """
+        key = self.key(file_name, config)
+        if key is None:
+            return None
+        snapshot = self.load(key)
+        return snapshot if isinstance(snapshot, type(config)) else None
+
+    def put(self, file_name, config):
+        """
+        Stores a snapshot of config, as loaded from file_name
+        """
+        key = self.key(file_name, config)
+        if key is None:
+            return
+        self.store(key, config)
+
+    def encode(self, value):
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, data):
+        try:
+            return pickle.loads(data)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, TypeError,
+                ValueError):
+            return None
@@ -0,0 +1 @@
+from .daemon import DaemonHandler, GradingDaemon, Job, make_server, serve
@@ -0,0 +1,337 @@
+"""
+Module: daemon.py
+
+A long-running grading service. Ansible, libnftables and the configuration are loaded once
+and ssh connections to the lab machines are kept open between jobs, instead of every
+grading run paying for them in a fresh process.
+
+Jobs are submitted and watched over a small HTTP API, on a tcp port or a Unix socket:
+    POST /jobs                {"infra": ..., "testcases": ..., "scripts": {machine: path},
+                               "name": ...}, scripts and name are optional
+    GET  /jobs                the state of all jobs
+    GET  /jobs/<id>           the state of a job, with the results once it is done
+    GET  /jobs/<id>/stream    the state of a job as JSON Lines, a line per change until done
+"""
+
+import json
+import os
+import socketserver
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import yaml
+from ant_backend import Logger, Timer
+from ant_backend.grading import grade, leased, private_runner
+from ant_backend.logger import file_extension
+
+# ssh connections are kept open this many seconds after their last use
+PERSIST = 600
+# finished jobs kept for clients to fetch their results
+KEEP = 1000
+
+class Job(object):
+    """
+    A grading job, the scripts of a submission tested against an infra and testcase file
+    """
+    def __init__(self, infra, testcases, scripts=None, name=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name or self.id
+        self.infra = infra
+        self.testcases = testcases
+        self.scripts = scripts
+        self.status = 'queued'
+        self.rc = None
+        self.results = None
+        self.submitted = time.time()
+        self.started = None
+        self.lab = None
+        self.finished = None
+        # counts the changes of the state, clients streaming the state wait for it to change
+        self.version = 0
+
+    def state(self, results=True):
+        """
+        Returns the state of the job as sent to clients
+        """
+        state = {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'rc': self.rc,
+            'submitted': self.submitted,
+            'started': self.started,
+            'lab': self.lab,
+            'finished': self.finished
+        }
+        if results and self.results is not None:
+            state['results'] = self.results
+        return state
+
+    @property
+    def done(self):
+        return self.status in ('done', 'failed')
+
+
+class GradingDaemon(object):
+    """
+    Grades the jobs submitted to it on a pool of workers sharing warm resources
+    Every job runs in its own runner directory like a submission in batch mode, its report
+      and protocol are written to output_dir as ant-results-<id> and ant-protocol-<id>.
+    With a LabPool labs, every job runs on a lab leased from it and workers defaults to
+      the number of labs.
+    With a ResultsStore store, every job is stored as a run named after the job.
+    """
+    def __init__(self, config, workers=None, output_dir='.', cache=None, config_cache=None,
+                 manager_options=None, fmt=None, slowest=10, stream=False, simulate=False,
+                 persist=PERSIST, labs=None, store=None):
+        self.config = config
+        self.output_dir = output_dir
+        self.cache = cache
+        self.config_cache = config_cache
+        self.manager_options = manager_options or {}
+        self.fmt = fmt
+        self.slowest = slowest
+        self.stream = stream
+        self.simulate = simulate
+        # ansible reuses an open ssh connection to a host instead of logging in again
+        self.envvars = {'ANSIBLE_SSH_ARGS': f"-C -o ControlMaster=auto "
+                                            f"-o ControlPersist={persist}s"}
+        with open(config, 'r', encoding='utf-8') as conf_file:
+            self.protos = yaml.safe_load(conf_file)
+        self.jobs = {}
+        self.changed = threading.Condition()
+        self.labs = labs
+        self.store = store
+        self.pool = ThreadPoolExecutor(
+            max_workers=workers or (len(labs) if labs is not None else 1))
+
+    def warm(self):
+        """
+        Imports ansible and initializes libnftables before the first job needs them
+        """
+        from ant_backend import AnsibleManager # pylint: disable=unused-import
+        from ant_backend.valdiate_nft import validate_nft
+        try:
+            with validate_nft.NFT_LOCK:
+                validate_nft._nft() # pylint: disable=protected-access
+        except (ImportError, OSError):
+            # reported by the first job validating a script
+            pass
+
+    def submit(self, infra, testcases, scripts=None, name=None):
+        """
+        Queues a job
+        Returns:
+            the Job
+        Raises:
+            ValueError if a file of the job does not exist
+        """
+        for path in (infra, testcases, *(scripts or {}).values()):
+            if not isinstance(path, str) or not os.path.isfile(path):
+                raise ValueError(f"File {path} does not exist")
+        job = Job(infra, testcases, scripts, name)
+        with self.changed:
+            self.jobs[job.id] = job
+            self._forget()
+        self.pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        """
+        Returns the job job_id or None
+        """
+        with self.changed:
+            return self.jobs.get(job_id)
+
+    def wait(self, job, version, timeout=None):
+        """
+        Waits until the state of job is newer than version
+        Returns:
+            the state of the job and its version
+        """
+        with self.changed:
+            self.changed.wait_for(lambda: job.version > version, timeout)
+            return job.state(), job.version
+
+    def shutdown(self, wait=True):
+        """
+        Stops taking jobs, waits for the running ones if wait is set
+        """
+        self.pool.shutdown(wait=wait)
+
+    def _update(self, job, **state):
+        with self.changed:
+            for key, value in state.items():
+                setattr(job, key, value)
+            job.version += 1
+            self.changed.notify_all()
+
+    def _forget(self):
+        finished = [job for job in self.jobs.values() if job.done]
+        for job in finished[:max(len(finished) - KEEP, 0)]:
+            del self.jobs[job.id]
+
+    def _run(self, job):
+        from ant_backend import AnsibleManager
+
+        report = os.path.join(self.output_dir,
+                              f"ant-results-{job.id}.{file_extension(self.fmt, report=True)}")
+        protocol = os.path.join(self.output_dir,
+                                f"ant-protocol-{job.id}.{file_extension(self.fmt)}")
+        try:
+            timer = Timer()
+            run = self.store.begin_run(job.name, job.infra, job.testcases) \
+                if self.store is not None else None
+            logger = Logger(protocol, self.fmt, timer, run)
+            try:
+                with private_runner(job.id) as job_dir, \
+                        leased(None if self.simulate else self.labs) as lab:
+                    # a job waiting for a lab is still queued
+                    self._update(job, status='running', started=time.time(),
+                                 lab=lab.name if lab is not None else None)
+                    manager = AnsibleManager(self.config, job_dir, timer=timer,
+                                             protos=self.protos, envvars=self.envvars, lab=lab,
+                                             **self.manager_options)
+                    rc = grade(manager, job.infra, job.testcases, logger, stream=self.stream,
+                               scripts=job.scripts, verb=0, cache=self.cache,
+                               simulate=self.simulate, config_cache=self.config_cache,
+                               slowest=self.slowest)
+            except Exception as e: # pylint: disable=broad-except
+                # a broken job must not take down the daemon
+                logger.add_error({'err': repr(e), 'list': [f"Job failed: {e}"],
+                                  'tag': 'Daemon'})
+                rc = 1
+            logger.write(self.output_dir, report, protocol, self.fmt)
+            results = dict(logger.results)
+            results['Report'] = report
+            results['Protocol'] = protocol
+            self._update(job, status='done' if rc == 0 else 'failed', rc=rc, results=results,
+                         finished=time.time())
+        finally:
+            # e.g. the results store or the report could not be written, clients waiting
+            # for the job must still see it finish
+            if not job.done:
+                self._update(job, status='failed', rc=1, finished=time.time())
+
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    """
+    Serves the HTTP API of the GradingDaemon of its server
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        daemon = self.server.grading
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+        if parts == ['jobs']:
+            with daemon.changed:
+                states = [job.state(results=False) for job in daemon.jobs.values()]
+            self.send_json(200, states)
+            return
+        if len(parts) not in (2, 3) or parts[0] != 'jobs' or \
+                (len(parts) == 3 and parts[2] != 'stream'):
+            self.send_json(404, {'error': f"No such resource {self.path}"})
+            return
+        job = daemon.get(parts[1])
+        if job is None:
+            self.send_json(404, {'error': f"No such job {parts[1]}"})
+            return
+        if len(parts) == 2:
+            with daemon.changed:
+                state = job.state()
+            self.send_json(200, state)
+            return
+
+        # the state is streamed until the job is done, the end of the stream closes it
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        version = -1
+        while True:
+            state, version = daemon.wait(job, version, timeout=30)
+            self.wfile.write(json.dumps(state, default=str).encode() + b'\n')
+            self.wfile.flush()
+            if state['status'] in ('done', 'failed'):
+                break
+
+    def do_POST(self):
+        daemon = self.server.grading
+        if self.path.rstrip('/') != '/jobs':
+            self.send_json(404, {'error': f"No such resource {self.path}"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            job = daemon.submit(body['infra'], body['testcases'], body.get('scripts'),
+                                body.get('name'))
+        except (KeyError, TypeError, ValueError) as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        self.send_json(202, job.state())
+
+    def send_json(self, code, data):
+        """
+        Sends data as a json response
+        """
+        body = json.dumps(data, default=str).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # clients of a Unix socket have no address
+        return str(self.client_address[0]) if self.client_address else 'unix'
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    A HTTP server on a Unix socket
+    """
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+def make_server(daemon, address, verbose=False):
+    """
+    Creates the server of daemon listening on address, either host:port or the path of
+      a Unix socket
+    """
+    if '/' in address:
+        server = UnixHTTPServer(address, DaemonHandler)
+    else:
+        host, _, port = address.rpartition(':')
+        server = ThreadingHTTPServer((host or '127.0.0.1', int(port)), DaemonHandler)
+    server.grading = daemon
+    server.verbose = verbose
+    return server
+
+
+def serve(daemon, address, verbose=False):
+    """
+    Warms up daemon and serves its API on address until interrupted
+    """
+    daemon.warm()
+    server = make_server(daemon, address, verbose)
+    print(f"Serving on {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.shutdown()
@@ -0,0 +1,2 @@
+from .deadlines import CONNECT_TIMEOUT, RETRY_BACKOFF, SETUP_DEADLINE, TIMED_OUT, host_budget, \
+    playbook_budget, probe_deadline
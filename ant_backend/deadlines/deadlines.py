@@ -0,0 +1,54 @@
+"""
+Module: deadlines.py
+
+Deadlines of a run, derived from the probes every host runs instead of a fixed timeout
+for a whole playbook. Every probe gets its timeout plus some slack, every host the sum of
+the deadlines of its probes plus the time to connect, and a playbook as long as its hosts
+take in waves of forks hosts at a time.
+"""
+
+import math
+from ant_backend.probes import PROBE_TIMEOUTS
+
+# seconds ansible may take to connect to a host, ansible_timeout
+CONNECT_TIMEOUT = 10
+# seconds a probe may take on top of its own timeout, starting the command and reporting back
+SLACK = 3
+# seconds uploading and loading a ruleset may take
+SETUP_DEADLINE = 30
+# ansible's default number of forks
+FORKS = 5
+# seconds a playbook may take if none of its hosts is known, e.g. for a hand written inventory
+DEFAULT_BUDGET = 30
+# the msg of probes and setups that missed their deadline
+TIMED_OUT = 'timed out'
+# seconds before the first retry of failed probes, doubled for every further retry
+RETRY_BACKOFF = 1
+
+def probe_deadline(proto:str):
+    """
+    Returns the seconds a single probe of proto may take
+    """
+    return PROBE_TIMEOUTS.get(proto, max(PROBE_TIMEOUTS.values())) + SLACK
+
+def host_budget(deadlines:list, concurrent=False):
+    """
+    Returns the seconds a host may take for probes with the given deadlines,
+      run one after the other or, by the probe agent, all at once
+    """
+    if not deadlines:
+        return CONNECT_TIMEOUT
+    return CONNECT_TIMEOUT + (max(deadlines) + SLACK if concurrent else sum(deadlines))
+
+def playbook_budget(budgets:list, forks=None):
+    """
+    Returns the seconds a playbook may take for hosts with the given budgets,
+      at most forks hosts are worked on at a time
+    """
+    if not budgets:
+        return DEFAULT_BUDGET
+    forks = forks or FORKS
+    budgets = sorted(budgets, reverse=True)
+    waves = math.ceil(len(budgets) / forks)
+    # the slowest hosts in one wave, the next slowest in the next and so on
+    return sum(budgets[wave * forks] for wave in range(waves))
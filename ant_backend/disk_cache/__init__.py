@@ -0,0 +1 @@
+from .disk_cache import DiskCache, atomic_write, cache_dir
@@ -0,0 +1,94 @@
+"""
+Module: disk_cache.py
+
+The on-disk storage shared by the caches of ant. Every cache keeps one file per entry,
+named after the hash it is keyed by, in a directory of its own under the XDG cache home.
+Entries are written atomically, so runs sharing a cache never read a partly written one.
+"""
+
+import json
+import os
+import tempfile
+
+def cache_dir(name):
+    """
+    Returns the directory of the cache name, ~/.cache/ant/<name> unless XDG_CACHE_HOME is set
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    return os.path.join(cache_home, 'ant', name)
+
+def atomic_write(path, data, mode=None):
+    """
+    Writes data, str or bytes, to path through a temporary file in the same directory, so
+      path is either replaced as a whole or left as it was
+    mode sets the permissions of the file, readable by the owner only by default
+    """
+    handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                        suffix='.tmp')
+    try:
+        if isinstance(data, bytes):
+            with os.fdopen(handle, 'wb') as tmp_file:
+                tmp_file.write(data)
+        else:
+            with os.fdopen(handle, 'w', encoding='utf-8') as tmp_file:
+                tmp_file.write(data)
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+class DiskCache(object):
+    """
+    On-disk store of entries keyed by a hash, in path or the directory name of the cache home
+    Entries are stored as json by default, subclasses storing something else override
+      suffix, encode and decode.
+    """
+    name = None
+    suffix = '.json'
+
+    def __init__(self, path=None):
+        self.path = path if path is not None else cache_dir(self.name)
+
+    def entry_path(self, key):
+        """
+        Returns the path of the file of the entry key
+        """
+        return os.path.join(self.path, f"{key}{self.suffix}")
+
+    def load(self, key):
+        """
+        Returns the entry key or None if it is missing or can not be read
+        """
+        try:
+            with open(self.entry_path(key), 'rb') as entry:
+                data = entry.read()
+        except OSError:
+            return None
+        return self.decode(data)
+
+    def store(self, key, value):
+        """
+        Stores value as the entry key
+        """
+        os.makedirs(self.path, exist_ok=True)
+        atomic_write(self.entry_path(key), self.encode(value))
+
+    def encode(self, value):
+        """
+        Returns the content of the file of an entry holding value
+        """
+        return json.dumps(value, default=str)
+
+    def decode(self, data):
+        """
+        Returns the value held by the content of the file of an entry, None if it is broken
+        """
+        try:
+            return json.loads(data)
+        except ValueError:
+            return None
@@ -0,0 +1 @@
+from .executors import EXECUTORS, Executor, LocalExecutor, SSHExecutor
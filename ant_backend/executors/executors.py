@@ -0,0 +1,359 @@
+"""
+Module: executors.py
+
+Executors run the setup and the probes of a run on the lab machines without Ansible.
+Instead of a forked Ansible worker and a python interpreter on the target per probe, every
+probe is a single command on a connection opened once per machine and shared by all its
+probes, at most concurrency probes run at a time.
+
+The probes are taken from the inventory of the probe agent, the results have the same format
+as those of the probe agent, the setup mirrors setup.yml.
+"""
+
+import abc
+import asyncio
+import datetime
+import hashlib
+import importlib.util
+import os
+import shutil
+import signal
+import tempfile
+from contextlib import contextmanager
+from ant_backend.deadlines import CONNECT_TIMEOUT, SETUP_DEADLINE, TIMED_OUT, probe_deadline
+
+# the commands of setup.yml
+ACTIVE_RULESET = "sudo nft -s list ruleset | sha256sum"
+LOAD_RULESET = "sudo nft -f {path}"
+# probes running at once over all connections
+CONCURRENCY = 64
+# sessions open at once on a single ssh connection, the MaxSessions default of sshd
+CHANNELS = 10
+
+def connection_key(hostvars:dict):
+    """
+    Returns the key of the connection to the machine of hostvars, machines sharing a
+      management address and login share a connection
+    """
+    return (hostvars['ansible_host'], hostvars.get('ansible_user'),
+            hostvars.get('ansible_password'))
+
+def probe_result(probe:dict, start, rc=None, stdout='', stderr='', msg=None, **flags):
+    """
+    Returns the result of a probe in the format of the probe agent
+    """
+    end = datetime.datetime.now()
+    result = {
+        'host': probe['host'],
+        'n': probe['n'],
+        'rc': rc,
+        'stdout_lines': stdout.splitlines(),
+        'stderr_lines': stderr.splitlines(),
+        'start': str(start),
+        'end': str(end),
+        'delta': str(end - start),
+        'cmd': probe['cmd'],
+        'msg': msg if msg is not None else '' if rc == 0 else 'non-zero return code'
+    }
+    result.update(flags)
+    return result
+
+class Executor(abc.ABC):
+    """
+    Runs the setup and the probes of a run, subclasses connect to a machine, run a command
+      on a connection and upload a file to it
+    The connection methods raise ConnectionError if the machine can not be reached and
+      other OSErrors if a command or upload fails.
+    """
+    name = None
+    active_ruleset = ACTIVE_RULESET
+    load_ruleset = LOAD_RULESET
+
+    def __init__(self, concurrency=CONCURRENCY, channels=CHANNELS):
+        self.concurrency = concurrency or CONCURRENCY
+        self.channels = channels
+
+    @abc.abstractmethod
+    async def connect(self, hostvars:dict):
+        """
+        Returns a connection to the machine of hostvars
+        """
+
+    @abc.abstractmethod
+    async def run_command(self, conn, cmd:str, timeout):
+        """
+        Runs cmd on conn
+        Returns:
+            rc, stdout and stderr of the command
+        Raises:
+            asyncio.TimeoutError if it takes longer than timeout seconds
+        """
+
+    @abc.abstractmethod
+    async def upload(self, conn, local:str, remote:str):
+        """
+        Copies the file local to remote on conn
+        """
+
+    async def close(self, conn):
+        """
+        Closes conn
+        """
+
+    @contextmanager
+    def upload_dir(self):
+        """
+        Yields the directory the NFTable scripts of a setup are uploaded to, None for the home
+          directory of the login on every machine
+        """
+        yield None
+
+    def remote_path(self, hostvars:dict, directory=None):
+        """
+        Returns where the NFTable script of a setup host is uploaded to in directory
+        """
+        directory = directory or f"/home/{hostvars['ansible_user']}"
+        return f"{directory}/{hostvars['filename']}"
+
+    def run_probes(self, hosts:dict, on_result):
+        """
+        Runs the probes of hosts, machine name -> the variables of the agent inventory,
+          on_result is called with every result as soon as its probe is done
+        """
+        asyncio.run(self._run_probes(hosts, on_result))
+
+    def run_setup(self, hosts:dict):
+        """
+        Sets up hosts, machine name -> the variables of the setup inventory, like setup.yml
+        Returns:
+            the setup result of every host
+        """
+        with self.upload_dir() as directory:
+            return asyncio.run(self._run_setup(hosts, directory))
+
+    async def _connect(self, hostvars):
+        return await asyncio.wait_for(self.connect(hostvars),
+                                      hostvars.get('ansible_timeout', CONNECT_TIMEOUT))
+
+    async def _run_probes(self, hosts, on_result):
+        limit = asyncio.Semaphore(self.concurrency)
+        machines = {}
+        for hostvars in hosts.values():
+            machines.setdefault(connection_key(hostvars), []).append(hostvars)
+        await asyncio.gather(*(self._probe_machine(group, limit, on_result)
+                               for group in machines.values()))
+
+    async def _probe_machine(self, group, limit, on_result):
+        probes = [probe for hostvars in group for probe in hostvars.get('probes', [])]
+        start = datetime.datetime.now()
+        try:
+            conn = await self._connect(group[0])
+        except asyncio.TimeoutError:
+            for probe in probes:
+                on_result(probe_result(probe, start, msg="timed out connecting",
+                                       unreachable=True))
+            return
+        except OSError as err:
+            for probe in probes:
+                on_result(probe_result(probe, start, msg=str(err), unreachable=True))
+            return
+
+        # a slot of the connection first, waiting for it must not hold a slot of the run
+        channels = asyncio.Semaphore(self.channels or len(probes) or 1)
+        async def run(probe):
+            async with channels, limit:
+                on_result(await self._probe(conn, probe))
+        try:
+            await asyncio.gather(*(run(probe) for probe in probes))
+        finally:
+            await self.close(conn)
+
+    async def _probe(self, conn, probe):
+        start = datetime.datetime.now()
+        try:
+            rc, stdout, stderr = await self.run_command(conn, probe['cmd'],
+                                                        probe_deadline(probe['proto']))
+        except asyncio.TimeoutError:
+            return probe_result(probe, start, msg=TIMED_OUT, timed_out=True)
+        except ConnectionError as err:
+            return probe_result(probe, start, msg=str(err), unreachable=True)
+        except OSError as err:
+            return probe_result(probe, start, msg=str(err))
+        return probe_result(probe, start, rc, stdout, stderr)
+
+    async def _run_setup(self, hosts, directory):
+        results = await asyncio.gather(*(self._setup_host(hostvars, directory)
+                                         for hostvars in hosts.values()))
+        return dict(zip(hosts, results))
+
+    async def _setup_host(self, hostvars, directory):
+        deadline = hostvars.get('setup_deadline', SETUP_DEADLINE)
+        start = str(datetime.datetime.now())
+        try:
+            conn = await self._connect(hostvars)
+        except asyncio.TimeoutError:
+            return {'start': start, 'msg': "timed out connecting", 'unreachable': True}
+        except OSError as err:
+            return {'start': start, 'msg': str(err), 'unreachable': True}
+        try:
+            return await self._setup(conn, hostvars, deadline, directory)
+        except asyncio.TimeoutError:
+            return {'rc': None, 'msg': TIMED_OUT, 'unreachable': False, 'timed_out': True}
+        except ConnectionError as err:
+            return {'start': start, 'msg': str(err), 'unreachable': True}
+        except OSError as err:
+            return {'start': start, 'rc': 1, 'msg': str(err), 'unreachable': False}
+        finally:
+            await self.close(conn)
+
+    async def _setup(self, conn, hostvars, deadline, directory):
+        if 'active_checksum' in hostvars:
+            rc, stdout, _ = await self.run_command(conn, self.active_ruleset, deadline)
+            if rc == 0 and stdout.split()[:1] == [hostvars['active_checksum']]:
+                return {'rc': 0, 'msg': 'ruleset unchanged', 'unchanged': True,
+                        'unreachable': False, 'active_checksum': hostvars['active_checksum']}
+
+        path = self.remote_path(hostvars, directory)
+        upload_start = datetime.datetime.now()
+        await asyncio.wait_for(self.upload(conn, hostvars['nft_file'], path), deadline)
+        with open(hostvars['nft_file'], 'rb') as nft_file:
+            content = nft_file.read()
+        result = {
+            'path': path,
+            'changed': True,
+            'size': len(content),
+            'upload_start': str(upload_start),
+            'upload_end': str(datetime.datetime.now()),
+            # sha1 like the checksum of ansible's copy module
+            'checksum': hashlib.sha1(content).hexdigest(),
+            'unreachable': False
+        }
+
+        cmd = self.load_ruleset.format(path=path)
+        load_start = datetime.datetime.now()
+        rc, stdout, stderr = await self.run_command(conn, cmd, deadline)
+        result.update({
+            'stdout': stdout.rstrip('\n'),
+            'stderr': stderr.rstrip('\n'),
+            'rc': rc,
+            'msg': '' if rc == 0 else 'non-zero return code',
+            'cmd': cmd,
+            'load_rules_start': str(load_start),
+            'load_rules_end': str(datetime.datetime.now())
+        })
+        if rc == 0:
+            rc, stdout, _ = await self.run_command(conn, self.active_ruleset, deadline)
+            if rc == 0:
+                result['active_checksum'] = stdout.split(' ')[0]
+        return result
+
+
+class SSHExecutor(Executor):
+    """
+    Runs every command in its own session of one ssh connection per machine with asyncssh,
+      host keys are not checked, like ansible is told to
+    """
+    name = 'ssh'
+
+    def __init__(self, concurrency=CONCURRENCY, channels=CHANNELS):
+        if importlib.util.find_spec('asyncssh') is None:
+            raise ImportError("The ssh executor needs asyncssh, install it with "
+                              "pip install asyncssh")
+        super().__init__(concurrency, channels)
+
+    async def connect(self, hostvars):
+        import asyncssh
+        try:
+            return await asyncssh.connect(hostvars['ansible_host'],
+                                          username=hostvars.get('ansible_user'),
+                                          password=hostvars.get('ansible_password'),
+                                          known_hosts=None)
+        except asyncssh.Error as err:
+            raise ConnectionError(str(err)) from err
+
+    async def run_command(self, conn, cmd, timeout):
+        import asyncssh
+        try:
+            process = await conn.create_process(cmd)
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+            except asyncio.TimeoutError:
+                # the command is stopped on the machine as well, not only waited for
+                try:
+                    process.kill()
+                except OSError:
+                    pass
+                process.close()
+                raise
+        except asyncssh.DisconnectError as err:
+            raise ConnectionError(str(err)) from err
+        except asyncssh.Error as err:
+            raise OSError(str(err)) from err
+        return process.exit_status, stdout or '', stderr or ''
+
+    async def upload(self, conn, local, remote):
+        import asyncssh
+        try:
+            await asyncssh.scp(local, (conn, remote))
+        except asyncssh.DisconnectError as err:
+            raise ConnectionError(str(err)) from err
+        except asyncssh.Error as err:
+            raise OSError(str(err)) from err
+
+    async def close(self, conn):
+        conn.close()
+        await conn.wait_closed()
+
+
+class LocalExecutor(Executor):
+    """
+    Runs every command on this machine in a subprocess, whichever machine it is meant for,
+      and uploads into the directory root, by default a temporary directory removed after
+      every setup
+    Only meant for tests, its setup loads the scripts into the ruleset of this machine with
+      sudo nft, so it can not be chosen on the command line
+    """
+    name = 'local'
+
+    def __init__(self, concurrency=CONCURRENCY, channels=None, root=None):
+        super().__init__(concurrency, channels)
+        self.root = root
+
+    async def connect(self, hostvars):
+        return hostvars['ansible_host']
+
+    async def run_command(self, conn, cmd, timeout):
+        # in a session of its own, the children of the shell are stopped along with it
+        process = await asyncio.create_subprocess_shell(cmd, stdout=asyncio.subprocess.PIPE,
+                                                        stderr=asyncio.subprocess.PIPE,
+                                                        start_new_session=True)
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            os.killpg(process.pid, signal.SIGKILL)
+            await process.wait()
+            raise
+        return process.returncode, stdout.decode(errors='replace'), \
+            stderr.decode(errors='replace')
+
+    async def upload(self, conn, local, remote):
+        os.makedirs(os.path.dirname(remote), exist_ok=True)
+        shutil.copyfile(local, remote)
+
+    @contextmanager
+    def upload_dir(self):
+        if self.root is not None:
+            yield self.root
+            return
+        # the scripts are only needed until they are loaded, jobs sharing the executor
+        # each get a directory of their own
+        with tempfile.TemporaryDirectory(prefix='ant-local-') as root:
+            yield root
+
+    def remote_path(self, hostvars, directory=None):
+        return os.path.join(directory or self.root, hostvars['ansible_host'],
+                            hostvars['filename'])
+
+
+# the executors that can be chosen on the command line besides ansible
+EXECUTORS = {executor.name: executor for executor in (SSHExecutor,)}
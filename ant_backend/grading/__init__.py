@@ -0,0 +1,2 @@
+from .grading import check, grade, leased, lookup_cached, private_runner, score_results, \
+    score_testcase, tool_dir
@@ -0,0 +1,330 @@
+"""
+Module: grading.py
+
+The grading pipeline shared by the command line, batch and watch mode and the grading
+daemon: check loads the infra and testcase files and validates the NFTable scripts, grade
+sets up the firewalls, runs the probes and scores their results.
+"""
+
+from contextlib import contextmanager
+import os
+import shutil
+import sys
+import tempfile
+import yaml
+from ant_backend import Logger, NetworkConfiguration, TestcaseConfiguration, ResultCache, \
+    validate_scripts, ProbeResult, ResultTable, Timer, LatencyStats
+
+@contextmanager
+def leased(labs):
+    """
+    Yields a Lab leased from the LabPool labs for the duration of a job,
+      None if there is no pool
+    """
+    if labs is None:
+        yield None
+        return
+    with labs.lease() as lab:
+        yield lab
+
+
+@contextmanager
+def private_runner(name):
+    """
+    Yields a private runner directory for the job name, so jobs run at once do not share
+      inventories or artifacts, the directory is removed afterwards
+    """
+    with tempfile.TemporaryDirectory(prefix=f"ant-{name}-") as job_dir:
+        shutil.copytree(f"{tool_dir()}/ansible_runner/project", f"{job_dir}/project")
+        yield job_dir
+
+
+def tool_dir():
+    """Returns the directory ant is installed in"""
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return f"{os.path.dirname(__file__)}/../.."
+
+
+def check(net_config_path, testcases_path, logger:Logger, verbose=False, scripts=None, verb=1,
+          cache=None, config_cache=None, timer=None):
+    """
+    Loads the infra and testcase files and validates the NFTable scripts of all machines
+    scripts optionally maps machine names to scripts replacing those of the infra file,
+      cache is the ValidationCache used to validate the scripts,
+      config_cache the ConfigCache used to load the infra and testcase files.
+    The phases are timed by timer if given.
+    Returns:
+        (network configuration, testcase configuration) or None if any of them is invalid,
+        the errors are added to logger
+    """
+    net_config = NetworkConfiguration()
+    testcase_config = TestcaseConfiguration()
+    timer = timer or Timer()
+
+    def out(msg):
+        if verb >= 1:
+            print(msg)
+
+    out("Loading Network configuration...")
+    try:
+        with timer.phase('load_infra'):
+            net_config.load_from_yaml(net_config_path, config_cache)
+    except (AttributeError, ValueError, yaml.YAMLError) as e:
+        msg = f"Error parsing network configuration {net_config_path}"
+        out(msg)
+        logger.add_error({'err': e, 'list': [msg], 'tag':'Netconfig'})
+        if verbose:
+            print(e)
+        return None
+    except FileNotFoundError as e:
+        msg = f"File {net_config_path} does not exist"
+        out(msg)
+        logger.add_error({'err': e, 'list': [msg], 'tag':'Netconfig'})
+        if verbose:
+            print(e)
+        return None
+
+    for name, script in (scripts or {}).items():
+        if name not in net_config.machines:
+            msg = f"Machine {name} does not exist"
+            out(msg)
+            logger.add_error({'err': script, 'list': [msg], 'tag':'Netconfig'})
+            return None
+        net_config.machines[name].nftable = script
+
+    out("Done.")
+
+    out("Checking NFTable configuration files...")
+    nftables_files = [machine.nftable for machine in net_config.machines.values()
+                      if machine.nftable != '']
+    invalid = False
+    with timer.phase('validate'):
+        validated = validate_scripts(nftables_files, cache)
+    for script, (errors, error) in validated.items():
+        if errors:
+            out(f"The script {script} has invalid syntax.")
+            logger.add_error({'err': error, 'list': errors, 'tag':f"NFTables {script}"})
+            if verbose:
+                print(errors)
+            invalid = True
+    if invalid:
+        return None
+
+    out("Done.")
+
+    out("Loading Testcases...")
+    try:
+        with timer.phase('load_testcases'):
+            testcase_config.load_from_yaml(testcases_path, config_cache)
+    except (AttributeError, yaml.YAMLError) as e:
+        msg = "Error parsing testcases"
+        logger.add_error({'err': e, 'list': [msg], 'tag':'Testcases'})
+        if verbose:
+            print(e)
+        return None
+    except FileNotFoundError as e:
+        msg = f"File {testcases_path} does not exist"
+        out(msg)
+        logger.add_error({'err': e, 'list': [msg], 'tag':'Netconfig'})
+        if verbose:
+            print(e)
+        return None
+    out("Done.")
+
+    return net_config, testcase_config
+
+
+def grade(manager, net_config_path, testcases_path, logger:Logger, verbose=False,
+          stream=False, scripts=None, verb=1, cache=None, simulate=False, result_cache=None,
+          config_cache=None, slowest=10, setup_only=None):
+    """
+    Runs the validate, setup, test and score pipeline for one set of NFTable scripts
+      on the lab machines managed by the AnsibleManager manager
+    scripts, cache and config_cache are passed on to check.
+    If simulate is set, the testcases are evaluated against the scripts by the Simulator
+      instead of being run on the lab machines.
+    If a result_cache is given, only testcases whose fingerprint changed since they were last
+      run are run, the results of all others are taken from the cache.
+    The phases are timed by the Timer of manager, the durations of the probes are added to
+      the report as the Latency section with the slowest probes listed.
+    If setup_only is given, only the rulesets of the machines named in it are set up.
+    Returns:
+        the return code of the run, 0 on success and 1 on a fatal error
+    """
+    def out(msg):
+        if verb >= 1:
+            print(msg)
+
+    timer = manager.timer
+    configs = check(net_config_path, testcases_path, logger, verbose, scripts, verb, cache,
+                    config_cache, timer)
+    if configs is None:
+        return 1
+    net_config, testcase_config = configs
+
+    if simulate:
+        from ant_backend import Simulator
+        out("Simulating tests...")
+        try:
+            with timer.phase('simulate'):
+                results = Simulator(net_config).run(testcase_config, net_config.resolve)
+        except (OSError, ValueError) as e:
+            msg = "Error while simulating tests"
+            out(msg)
+            logger.add_error({'err':e, 'list':[msg], 'tag':'Simulation'})
+            return 1
+        out("Done.")
+        with timer.phase('scoring'):
+            score_results(results, net_config, testcase_config, logger)
+        return 0
+
+    latency = LatencyStats(net_config, slowest)
+    out("Setting up firewalls...")
+    with timer.phase('setup'):
+        manager.create_nft_inventory(None, net_config, setup_only)
+        results = manager.setup()
+
+    for name, result in results.setup.items():
+        logger.store_setup(name, result)
+        if result.get('timed_out'):
+            logger.add_error({'err':result, 'list':[f"Fatal: setting up {name} timed out"],
+                              'tag':f"setup-{name}"})
+            return 1
+
+        if result['unreachable']:
+            logger.add_error({'err':result, 'list':[f"Fatal: {name} unreachable"],
+                               'tag':f"setup-{name}"})
+            return 1
+
+        if result['rc'] != 0:
+            logger.add_error({'err':result, 'list':[f"Fatal failure setting up {name}"],
+                              'tag':f"setup-{name}"})
+            return 1
+
+        logger.add_event([result], f"setup-{name}")
+        latency.add_setup(name, result)
+
+    out("Setting up tests...")
+    to_run = testcase_config
+    cached = {}
+    fingerprints = {}
+    if result_cache is not None:
+        with timer.phase('result_cache'):
+            to_run, cached, fingerprints = lookup_cached(manager, net_config, testcase_config,
+                                                         result_cache)
+        out(f"{len(cached)} testcases unchanged, {len(to_run.testcases)} testcases to run.")
+
+    try:
+        with timer.phase('create_inventory'):
+            manager.create_inventory(None, net_config, to_run)
+    except ValueError as e:
+        msg = "Error while creating tests"
+        out(msg)
+        logger.add_error({'err':e, 'list':[msg], 'tag':'Testsetup'})
+
+    out("Running tests...")
+    if stream:
+        pending = {(net_config.machines[testcase.source].name, testcase.name): testcase
+                   for testcase in testcase_config.testcases}
+        for key, probe_results in cached.items():
+            testcase = pending.pop(key)
+            logger.add_test_event(probe_results, score_testcase(testcase, probe_results),
+                                  testcase)
+
+        def on_test(machine, name, probe_results):
+            testcase = pending.pop((machine, name), None)
+            if testcase is not None:
+                if result_cache is not None and fingerprints[(machine, name)] and \
+                        not any(result.timed_out for result in probe_results):
+                    result_cache.put(fingerprints[(machine, name)],
+                                     [result.record() for result in probe_results])
+                logger.add_test_event(probe_results, score_testcase(testcase, probe_results),
+                                      testcase)
+                latency.add(testcase, probe_results)
+
+        with timer.phase('tests'):
+            manager.run(verb, stream=True, on_test=on_test)
+        # testcases without any result, e.g. because the machine was unreachable
+        for testcase in pending.values():
+            logger.add_test_event([], 0, testcase)
+        out("Done.")
+        logger.add_section('Latency', latency.section())
+        return 0
+
+    with timer.phase('tests'):
+        results = manager.run(verb)
+    out("Done.")
+
+    if result_cache is not None:
+        for testcase in to_run.testcases:
+            key = (net_config.machines[testcase.source].name, testcase.name)
+            # timed out probes are run again next time
+            if fingerprints[key] and not any(result.timed_out for result in results.get(*key)):
+                result_cache.put(fingerprints[key],
+                                 [result.record() for result in results.get(*key)])
+        for probe_results in cached.values():
+            results.extend(probe_results)
+
+    with timer.phase('scoring'):
+        score_results(results, net_config, testcase_config, logger, latency)
+    logger.add_section('Latency', latency.section())
+    return 0
+
+
+def lookup_cached(manager, net_config:NetworkConfiguration,
+                  testcase_config:TestcaseConfiguration, result_cache:ResultCache):
+    """
+    Looks up the results of every testcase in result_cache by its fingerprint, a testcase
+      that can not be fingerprinted is a cache miss and run
+    Returns:
+        the TestcaseConfiguration of the testcases to run, the cached ProbeResults and the
+        fingerprint of every testcase by (machine name, testcase name)
+    """
+    to_run = TestcaseConfiguration()
+    cached = {}
+    fingerprints = {}
+    for testcase in testcase_config.testcases:
+        key = (net_config.machines[testcase.source].name, testcase.name)
+        try:
+            fingerprints[key] = manager.fingerprint(testcase, net_config)
+        except (OSError, ValueError):
+            # errors of the testcase itself are reported by create_inventory
+            fingerprints[key] = None
+        records = result_cache.get(fingerprints[key]) if fingerprints[key] else None
+        if records is None:
+            to_run.testcases.append(testcase)
+        else:
+            cached[key] = [ProbeResult.from_res(*key, n, record, cached=True)
+                           for n, record in enumerate(records)]
+    return to_run, cached, fingerprints
+
+
+def score_results(results:ResultTable, net_config:NetworkConfiguration,
+                  testcase_config:TestcaseConfiguration, logger:Logger, latency=None):
+    """
+    Scores the results of a run and adds them to the logger, testcase by testcase
+    The durations of the probes are added to latency if given.
+    """
+    for testcase in testcase_config.testcases:
+        probe_results = results.get(net_config.machines[testcase.source].name, testcase.name)
+        logger.add_test_event(probe_results, score_testcase(testcase, probe_results), testcase)
+        if latency is not None:
+            latency.add(testcase, probe_results)
+
+
+def score_testcase(testcase, probe_results):
+    """
+    Scores the ProbeResults belonging to a testcase
+    Returns:
+        the points reached
+    """
+    if not probe_results:
+        return 0
+
+    #count the successful probes, every probe succeeds if the testcase expects it to fail
+    if testcase.allow:
+        points = sum(1 for result in probe_results if result.rc == 0)
+    else:
+        points = len(probe_results)
+    return (points/len(probe_results)) * testcase.points
@@ -0,0 +1 @@
+from .lab_pool import Lab, LabPool
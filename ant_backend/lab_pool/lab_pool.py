@@ -0,0 +1,104 @@
+"""
+Module: lab_pool.py
+
+A pool of identical lab environments that only differ in the management addresses of their
+machines. Every grading job leases a free lab for its whole run, so jobs on different labs
+never overwrite each other's rulesets and run at the same time.
+
+A pool file maps every lab to the management addresses of its machines:
+    lab1:
+        hqfw: 10.1.0.2
+        hqclient: 10.1.0.3
+    lab2:
+        hqfw: 10.2.0.2
+        hqclient: 10.2.0.3
+Machines missing from a lab keep the management address of the infra file.
+"""
+
+import ipaddress
+import threading
+from contextlib import contextmanager
+import yaml
+
+class Lab(object):
+    """
+    A lab environment, name and the management address of every machine
+    """
+    __slots__ = ('name', 'addresses')
+
+    def __init__(self, name, addresses:dict):
+        self.name = name
+        try:
+            self.addresses = {machine.lower(): ipaddress.ip_address(address)
+                              for machine, address in (addresses or {}).items()}
+        except (AttributeError, ValueError) as err:
+            raise ValueError(f"Lab {name}: {err}") from err
+
+    def address(self, machine):
+        """
+        Returns the management address of machine in this lab
+        """
+        return self.addresses.get(machine.name, machine.management_ip)
+
+    def __repr__(self):
+        return f"Lab({self.name!r})"
+
+
+class LabPool(object):
+    """
+    Leases the labs of the pool to grading jobs, one job per lab at a time
+    """
+    def __init__(self, labs:list):
+        if not labs:
+            raise ValueError("The lab pool is empty")
+        self.labs = list(labs)
+        self.free = list(labs)
+        self.changed = threading.Condition()
+
+    @classmethod
+    def load_from_yaml(cls, file_name):
+        """
+        Loads a pool file
+        Raises:
+            ValueError if the file does not describe a pool
+        """
+        with open(file_name, 'r', encoding='utf-8') as pool_file:
+            data = yaml.safe_load(pool_file)
+        if not isinstance(data, dict):
+            raise ValueError(f"{file_name} does not map lab names to machines")
+        return cls([Lab(str(name), addresses) for name, addresses in data.items()])
+
+    def acquire(self, timeout=None):
+        """
+        Waits for a free lab and takes it
+        Returns:
+            the Lab
+        Raises:
+            TimeoutError if no lab became free within timeout seconds
+        """
+        with self.changed:
+            if not self.changed.wait_for(lambda: self.free, timeout):
+                raise TimeoutError("No lab became free")
+            return self.free.pop(0)
+
+    def release(self, lab:Lab):
+        """
+        Returns a lab to the pool
+        """
+        with self.changed:
+            self.free.append(lab)
+            self.changed.notify()
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """
+        Holds a free lab for the duration of the block, even if the block fails
+        """
+        lab = self.acquire(timeout)
+        try:
+            yield lab
+        finally:
+            self.release(lab)
+
+    def __len__(self):
+        return len(self.labs)
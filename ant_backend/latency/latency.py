@@ -0,0 +1,115 @@
+"""
+Module: latency.py
+
+Latency analytics of a run. The durations of the probes are grouped by protocol, source
+machine and destination address, probes that took close to their timeout and the slowest
+probes are listed, as they are where the time of a run goes.
+"""
+
+import heapq
+import math
+from ant_backend.probes import PROBE_TIMEOUTS, expand_probes
+from ant_backend.results import parse_duration
+
+# share of its timeout after which a probe counts as near the timeout
+NEAR_TIMEOUT = 0.8
+
+def distribution(durations:list):
+    """
+    Returns count, min, median, p95, max and total of a list of durations in seconds
+    """
+    values = sorted(durations)
+    count = len(values)
+    if count == 0:
+        return {'count': 0}
+    middle = count // 2
+    median = values[middle] if count % 2 else (values[middle - 1] + values[middle]) / 2
+    return {
+        'count': count,
+        'min': round(values[0], 6),
+        'median': round(median, 6),
+        'p95': round(values[max(math.ceil(0.95 * count) - 1, 0)], 6),
+        'max': round(values[-1], 6),
+        'total': round(sum(values), 6)
+    }
+
+class LatencyStats(object):
+    """
+    Collects the durations of probes testcase by testcase, so it works on streamed results
+      as well. Only numbers are kept, not the results themselves.
+    """
+    def __init__(self, netconfig, slowest=10):
+        self.netconfig = netconfig
+        self.slowest = slowest
+        self.by_proto = {}
+        self.by_source = {}
+        self.by_destination = {}
+        self.near_timeout = []
+        # heap of the slowest probes as (seconds, order, probe)
+        self.top = []
+        self.count = 0
+        self.setup = {}
+
+    def add(self, testcase, probe_results:list):
+        """
+        Adds the ProbeResults of a testcase, cached and simulated results took no time in
+          this run and are left out
+        """
+        try:
+            probes = expand_probes(testcase.proto, self.netconfig.resolve(testcase.destination),
+                                   testcase.d_port)
+        except ValueError:
+            return
+        timeout = PROBE_TIMEOUTS.get(testcase.proto)
+        for result in probe_results:
+            seconds = result.duration
+            # cached and shared results were not run for this testcase
+            if result.cached or result.shared is not None or seconds is None or \
+                    result.index >= len(probes):
+                continue
+            destination, port = probes[result.index]
+            self.by_proto.setdefault(testcase.proto, []).append(seconds)
+            self.by_source.setdefault(testcase.source, []).append(seconds)
+            self.by_destination.setdefault(destination, []).append(seconds)
+
+            probe = {'testcase': testcase.name, 'source': testcase.source,
+                     'destination': destination, 'port': port, 'proto': testcase.proto,
+                     'seconds': round(seconds, 6), 'timeout': timeout, 'rc': result.rc}
+            if timeout is not None and seconds >= NEAR_TIMEOUT * timeout:
+                self.near_timeout.append(probe)
+            self.count += 1
+            entry = (seconds, self.count, probe)
+            if len(self.top) < self.slowest:
+                heapq.heappush(self.top, entry)
+            elif self.slowest > 0:
+                heapq.heappushpop(self.top, entry)
+
+    def add_setup(self, machine, result:dict):
+        """
+        Adds the result of setting up the NFTable script of machine, machines set up by
+          another machine on the same host add nothing
+        """
+        if result.get('shared'):
+            return
+        upload = parse_duration(None, result.get('upload_start'), result.get('upload_end'))
+        load = parse_duration(None, result.get('load_rules_start'), result.get('load_rules_end'))
+        if upload is not None or load is not None:
+            self.setup[machine] = {'upload': upload, 'load_rules': load}
+
+    def section(self):
+        """
+        Returns the Latency section of the results
+        """
+        return {
+            'Probes': distribution([seconds for durations in self.by_proto.values()
+                                    for seconds in durations]),
+            'By protocol': {proto: distribution(durations)
+                            for proto, durations in sorted(self.by_proto.items())},
+            'By source': {source: distribution(durations)
+                          for source, durations in sorted(self.by_source.items())},
+            'By destination': {destination: distribution(durations)
+                               for destination, durations in sorted(self.by_destination.items())},
+            'Near timeout': sorted(self.near_timeout, key=lambda probe: -probe['seconds']),
+            'Slowest': [probe for _, _, probe in sorted(self.top, key=lambda entry: -entry[0])],
+            'Setup': self.setup
+        }
@@ -1 +1,2 @@
-from .logger import Logger
\ No newline at end of file
+from .logger import Logger
+from .writers import FORMATS, file_extension, output_format, output_paths
@@ -1,9 +1,18 @@
-import datetime
-import yaml
+from ant_backend.timing import Timer
+from .writers import JsonLinesWriter, dump, output_format, output_paths
 class Logger:
 
-    def __init__(self):
+    def __init__(self, path_proto=None, fmt=None, timer=None, run=None):
+        # a JSON Lines protocol is written while logging instead of being kept in memory
         self.protocol = {}
+        # the timings of the Timer are added to the results as the Timing section
+        self.timer = timer
+        self.stream = None
+        # the results are added to a StoredRun of a ResultsStore as well, if given
+        self.run = run
+        self.streamed_errors = set()
+        if path_proto is not None and output_format(path_proto, fmt) == 'jsonl':
+            self.stream = JsonLinesWriter(path_proto)
         self.results = {
             'General': {
                 'Tests': 0,
@@ -18,22 +27,33 @@ class Logger:
 
     def add_error(self, errors):
         self.results['General']['Errors'].extend(errors['list'])
-        self.protocol.setdefault(errors['tag'],errors['err'])
+        if self.stream is None:
+            self.protocol.setdefault(errors['tag'],errors['err'])
+        elif errors['tag'] not in self.streamed_errors:
+            self.streamed_errors.add(errors['tag'])
+            self.stream.write(errors['tag'], errors['err'])
 
     def add_event(self, events:list, name):
 
         for event in events:
+            self.log(name, event)
+
+    def log(self, name, event):
+        if self.stream is not None:
+            self.stream.write(name, event)
+        else:
             self.protocol.setdefault(name, [])
             self.protocol[name].append(event)
 
-    def add_test_event(self, events:list, points, testcase):
-        
-        #update Protocol
-        for event in events:
-            event.setdefault('Executing Machine', testcase.source)
-            event['TestNr'] = event['TestNr'] + self.results['General']['Tests']
-            self.protocol.setdefault(testcase.name, [])
-            self.protocol[testcase.name].append(event)
+    def add_test_event(self, results:list, points, testcase):
+        #update Protocol, results are the ProbeResults of the testcase in probe order
+        for testnr, result in enumerate(results, self.results['General']['Tests']):
+            event = {'TestNr': testnr}
+            event.update(result.record())
+            event['Executing Machine'] = testcase.source
+            self.log(testcase.name, event)
+        if self.run is not None:
+            self.run.add_testcase(testcase, points, results)
 
         #update Criteria category
         self.results['Criteria'].append({testcase.name:{
@@ -43,22 +63,41 @@ class Logger:
 
         # update general category
         self.results['General']['Points reached'] += points
-        self.results['General']['Failed'] += len(events) - ((points/testcase.points) * len(events))
-        self.results['General']['Successful'] += (points/testcase.points) * len(events)
+        self.results['General']['Failed'] += len(results) - ((points/testcase.points) * len(results))
+        self.results['General']['Successful'] += (points/testcase.points) * len(results)
         self.results['General']['Points possible'] += testcase.points
-        self.results['General']['Tests'] += len(events)
+        self.results['General']['Tests'] += len(results)
+
+    def store_setup(self, machine, result:dict):
+        # the setup of machine, failed or not, only goes to the store, the protocol gets an
+        # event or an error for it
+        if self.run is not None:
+            self.run.add_setup(machine, result)
+
+    def add_section(self, name, section:dict):
+        # further sections of the report, e.g. the Latency of the probes
+        self.results[name] = section
 
-    def write(self, path_dir=None, path_res=None, path_proto=None):
-        timestamp = datetime.datetime.now().strftime("%d-%m-%Y-%H-%M-%S")
-        if path_proto is None:
-            path_proto = f"{path_dir}/ant-protocol-{timestamp}.yml"
-        if path_res is None:
-            path_res = f"{path_dir}/ant-results-{timestamp}.yml"
+    def write(self, path_dir=None, path_res=None, path_proto=None, fmt=None):
+        if self.stream is not None:
+            path_proto = self.stream.path
+        path_res, path_proto = output_paths(path_dir, path_res, path_proto, fmt)
 
-        with open(path_res, 'w', encoding='utf-8') as results_file:
-            yaml.dump(self.results, results_file)
+        # the protocol is written first, so the report includes the time it took
+        timer = self.timer or Timer()
+        with timer.phase('write_protocol'):
+            if self.stream is not None:
+                self.stream.close()
+            else:
+                dump(self.protocol, path_proto, output_format(path_proto, fmt))
+        if self.timer is not None:
+            self.timer.finish()
+            self.results['Timing'] = self.timer.section()
 
-        with open(path_proto, 'w', encoding='utf-8') as protocol_file:
-            yaml.dump(self.protocol, protocol_file)
+        report_format = output_format(path_res, fmt)
+        dump(self.results, path_res, 'json' if report_format == 'jsonl' else report_format)
+        if self.run is not None:
+            self.run.finish(self.results, path_res, path_proto)
+            self.run.close()
 
         return self.results['General']
@@ -0,0 +1,85 @@
+"""
+Module: writers.py
+
+Output backends of the Logger. Reports and protocols are written as json or yaml,
+  protocols may also be streamed as JSON Lines, one event per line as it is logged.
+"""
+
+import datetime
+import json
+import os
+import yaml
+
+FORMATS = ('json', 'jsonl', 'yaml')
+EXTENSIONS = {'.json': 'json', '.jsonl': 'jsonl', '.yml': 'yaml', '.yaml': 'yaml'}
+
+# the libyaml emitter is much faster than the pure python one, if pyyaml was built with it
+DUMPER = getattr(yaml, 'CDumper', yaml.Dumper)
+
+def output_format(path, fmt=None):
+    """
+    Returns the format to write path in, fmt if given and otherwise taken from the extension,
+      yaml for unknown extensions
+    """
+    if fmt is not None:
+        return fmt
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'yaml')
+
+def file_extension(fmt=None, report=False):
+    """
+    Returns the extension of output files in fmt, reports are never written as JSON Lines
+    """
+    if fmt == 'jsonl' and report:
+        fmt = 'json'
+    return {None: 'yml', 'yaml': 'yml'}.get(fmt, fmt)
+
+def output_paths(path_dir=None, path_res=None, path_proto=None, fmt=None):
+    """
+    Returns the paths of the report and the protocol, files not given are placed in path_dir
+    """
+    timestamp = datetime.datetime.now().strftime("%d-%m-%Y-%H-%M-%S")
+    if path_res is None:
+        path_res = f"{path_dir}/ant-results-{timestamp}.{file_extension(fmt, report=True)}"
+    if path_proto is None:
+        path_proto = f"{path_dir}/ant-protocol-{timestamp}.{file_extension(fmt)}"
+    return path_res, path_proto
+
+def dump(data, path, fmt):
+    """
+    Writes data to path as json, yaml or, for a protocol, as JSON Lines
+    """
+    if fmt == 'jsonl':
+        writer = JsonLinesWriter(path)
+        for name, events in data.items():
+            for event in events if isinstance(events, list) else [events]:
+                writer.write(name, event)
+        writer.close()
+        return
+
+    with open(path, 'w', encoding='utf-8') as output_file:
+        if fmt == 'json':
+            json.dump(data, output_file, indent=2, default=str)
+        else:
+            yaml.dump(data, output_file, Dumper=DUMPER)
+
+class JsonLinesWriter(object):
+    """
+    Appends protocol events to a file as they are logged, one json object per line:
+        {"name": <testcase or tag>, "event": {...}}
+    """
+    def __init__(self, path):
+        self.path = path
+        # line buffered, so the protocol can be followed while the run is going on
+        self.file = open(path, 'w', encoding='utf-8', buffering=1)
+
+    def write(self, name, event):
+        """
+        Appends a single event
+        """
+        self.file.write(json.dumps({'name': name, 'event': event}, default=str) + "\n")
+
+    def close(self):
+        """
+        Closes the file
+        """
+        self.file.close()
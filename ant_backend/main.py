@@ -1,7 +1,19 @@
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+import cProfile
 import sys
 import os
-from ant_backend import AnsibleManager, Logger, NetworkConfiguration, TestcaseConfiguration, validate_script
+import tempfile
+import yaml
+from ant_backend import Logger, NetworkConfiguration, ResultCache, ValidationCache, ConfigCache, \
+    Timer, LabPool, SetupCache, ResultsStore
+from ant_backend.grading import check, grade, leased, private_runner
+from ant_backend.deadlines import RETRY_BACKOFF
+from ant_backend.executors import EXECUTORS
+from ant_backend.results_store import DEFAULT_STORE
+from ant_backend.timing import write_prometheus
+from ant_backend.logger import FORMATS, file_extension, output_paths
 
 BANNER = """
 ================================================================
@@ -17,155 +29,282 @@ BANNER = """
                     Automated NFTables Tester
 """
 
-def ant_main(config, net_config_path, testcases_path, verbose, dir, report, protocol):
+def ant_main(config, net_config_path, testcases_path, verbose, dir, report, protocol,
+             stream=False, cache=None, simulate=False, result_cache=None, manager_options=None,
+             fmt=None, config_cache=None, metrics=None, profile=False, slowest=10, labs=None,
+             store=None):
 
-    net_config = NetworkConfiguration()
-    testcase_config = TestcaseConfiguration()
-    logger = Logger()
+    from ant_backend import AnsibleManager
+    report, protocol = output_paths(dir, report, protocol, fmt)
+    timer = Timer()
+    run = store.begin_run(os.path.splitext(os.path.basename(report))[0], net_config_path,
+                          testcases_path) if store is not None else None
+    logger = Logger(protocol, fmt, timer, run)
+
+    # a run of its own, other runs from the same checkout do not touch its artifacts
+    with private_runner('run') as runner_dir, leased(None if simulate else labs) as lab:
+        try:
+            manager = AnsibleManager(config, runner_dir, timer=timer, lab=lab,
+                                     **(manager_options or {}))
+        except FileNotFoundError as e:
+            msg = f"File {config} does not exist"
+            print(msg)
+            logger.add_error({'err': e, 'list': [msg], 'tag':'Netconfig'})
+            if verbose:
+                print(e)
+            finalize(logger, 1, dir, report, protocol, fmt, metrics)
+
+        print(BANNER)
 
+        with profiled(report if profile else None):
+            rc = grade(manager, net_config_path, testcases_path, logger, verbose, stream,
+                       cache=cache, simulate=simulate, result_cache=result_cache,
+                       config_cache=config_cache, slowest=slowest)
+    finalize(logger, rc, dir, report, protocol, fmt, metrics)
+
+
+@contextmanager
+def profiled(report):
+    """
+    Runs the body under cProfile and saves the stats next to report,
+      does nothing if report is None
+    """
+    if report is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
     try:
-        manager = AnsibleManager(config)
-    except FileNotFoundError as e:
-        msg = f"File {net_config_path} does not exist"
-        print(msg)
-        logger.add_error({'err': e, 'list': [msg], 'tag':'Netconfig'})
-        if verbose:
-            print(e)
-        finalize(logger, 1, dir, report, protocol)
-
-    if getattr(sys, 'frozen', False):
-        tool_dir = os.path.dirname(sys.executable)
-    else:
-        tool_dir = f"{os.path.dirname(__file__)}/.."
-    inventory_dir = f"{tool_dir}/ansible_runner/inventory"
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(f"{os.path.splitext(report)[0]}.prof")
+
 
+def ant_batch(config, net_config_path, testcases_path, submissions_path, workers, verbose, dir,
+              cache=None, simulate=False, result_cache=None, manager_options=None, fmt=None,
+              config_cache=None, metrics=None, profile=False, slowest=10, labs=None, store=None):
+    """
+    Grades every submission found at submissions_path on a pool of workers.
+    Each submission gets its own runner directory as well as its own report and protocol
+    in dir, written in fmt, and its own profile if profile is set.
+    With a LabPool labs, every submission is graded on a lab leased from it and workers
+    defaults to the number of labs.
+    The timings of all submissions are written to metrics if given.
+    With a ResultsStore store, every submission is stored as a run named after it.
+    """
+    from ant_backend import AnsibleManager
+    submissions = load_submissions(submissions_path)
+    workers = workers or (len(labs) if labs is not None else 1)
     print(BANNER)
+    print(f"Grading {len(submissions)} submissions with {workers} workers...")
 
-    print("Loading Network configuration...")
-    try:
-        net_config.load_from_yaml(net_config_path)
-    except (AttributeError, ValueError) as e:
-        msg = f"Error parsing network configuration {net_config_path}"
-        print(msg)
-        logger.add_error({'err': e, 'list': [msg], 'tag':'Netconfig'})
-        if verbose:
-            print(e)
-        finalize(logger, 1, dir, report, protocol)
-    except FileNotFoundError as e:
-        msg = f"File {net_config_path} does not exist"
-        print(msg)
-        logger.add_error({'err': e, 'list': [msg], 'tag':'Netconfig'})
-        if verbose:
-            print(e)
-        finalize(logger, 1, dir, report, protocol)
-
-    print("Done.")
-
-    print("Checking NFTable configuration files...")
-    for _, machine in net_config.machines.items():
-        if machine.nftable != '':
-            errors, error = validate_script(machine.nftable)
-            if errors:
-                print(f"The script {machine.nftable} has invalid syntax.")
-                logger.add_error({'err': error, 'list': errors, 'tag':'NFTables'})
-                if verbose:
-                    print(errors)
-                finalize(logger, 1, dir, report, protocol)
-
-    print("Done.")
-
-    print("Loading Testcases...")
-    try:
-        testcase_config.load_from_yaml(testcases_path)
-    except AttributeError as e:
-        msg = "Error parsing testcases"
-        logger.add_error({'err': e, 'list': [msg], 'tag':'Testcases'})
-        if verbose:
-            print(e)
-        finalize(logger, 1, dir, report, protocol)
-    except FileNotFoundError as e:
-        msg = f"File {testcases_path} does not exist"
-        print(msg)
-        logger.add_error({'err': e, 'list': [msg], 'tag':'Netconfig'})
-        if verbose:
-            print(e)
-        finalize(logger, 1, dir, report, protocol)
-    print("Done.")
+    def grade_submission(name, scripts):
+        report = f"{dir}/ant-results-{name}.{file_extension(fmt, report=True)}"
+        protocol = f"{dir}/ant-protocol-{name}.{file_extension(fmt)}"
+        timer = Timer()
+        timers[name] = timer
+        logger = None
+        try:
+            run = store.begin_run(name, net_config_path, testcases_path) \
+                if store is not None else None
+            logger = Logger(protocol, fmt, timer, run)
+            with private_runner(name) as job_dir, leased(None if simulate else labs) as lab:
+                try:
+                    manager = AnsibleManager(config, job_dir, timer=timer, lab=lab,
+                                             **(manager_options or {}))
+                except FileNotFoundError as e:
+                    logger.add_error({'err': e, 'list': [f"File {config} does not exist"],
+                                      'tag':'Netconfig'})
+                    rc = 1
+                else:
+                    # the profiler only sees the thread it was enabled in, this job
+                    with profiled(report if profile else None):
+                        rc = grade(manager, net_config_path, testcases_path, logger, verbose,
+                                   scripts=scripts, verb=0, cache=cache,
+                                   simulate=simulate, result_cache=result_cache,
+                                   config_cache=config_cache, slowest=slowest)
+        except Exception as e: # pylint: disable=broad-except
+            # a broken submission must not take down the batch
+            if logger is None:
+                logger = Logger(protocol, fmt, timer)
+            logger.add_error({'err': repr(e), 'list': [f"Grading {name} failed: {e}"],
+                              'tag': 'Batch'})
+            rc = 1
+        output = logger.write(dir, report, protocol, fmt)
+        return rc, output
 
+    failed = 0
+    timers = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        jobs = {pool.submit(grade_submission, name, scripts): name
+                for name, scripts in submissions.items()}
+        for job in as_completed(jobs):
+            try:
+                rc, output = job.result()
+            except Exception as e: # pylint: disable=broad-except
+                # e.g. the report of the submission could not be written
+                failed += 1
+                print(f"{jobs[job]}: failed, {e}")
+                continue
+            failed += rc != 0
+            status = "failed" if rc != 0 else "done"
+            print(f"{jobs[job]}: {status}, {output['Points reached']}/{output['Points possible']}"
+                  " points")
+
+    print(f"Graded {len(submissions)} submissions, {failed} failed.")
+    if metrics is not None:
+        write_prometheus(metrics, [({'submission': name}, timers[name])
+                                   for name in submissions if name in timers])
+    sys.exit(1 if failed else 0)
+
+
+def ant_watch(config, net_config_path, testcases_path, verbose, dir, report, protocol,
+              cache=None, simulate=False, result_cache=None, manager_options=None, fmt=None,
+              config_cache=None, slowest=10, labs=None, store=None, watcher=None):
+    """
+    Grades the infra file, the testcase file and the NFTable scripts and grades them again
+      whenever any of them changes, until interrupted.
+    After a change only the changed scripts are validated, only the machines using them are
+      set up and only the testcases whose probes pass those machines are run, the results of
+      all other testcases are taken from result_cache, a temporary ResultCache by default.
+    The score of every testcase that was run is printed as soon as it is scored, the report
+      and protocol are written after every run.
+    watcher is the Watcher of the files, a new one by default.
+    """
+    from ant_backend import AnsibleManager, Watcher
+    from ant_backend.watch import WatchLogger
+    report, protocol = output_paths(dir, report, protocol, fmt)
+    with open(config, 'r', encoding='utf-8') as conf_file:
+        protos = yaml.safe_load(conf_file)
+    print(BANNER)
+
+    rc = 0
+    with tempfile.TemporaryDirectory(prefix='ant-watch-') as cache_dir, \
+            private_runner('watch') as runner_dir, \
+            leased(None if simulate else labs) as lab, \
+            (watcher or Watcher()) as watcher:
+        result_cache = result_cache or ResultCache(cache_dir)
+        scripts = watched_scripts(net_config_path, config_cache)
+        # machines set up in the next run, all if None, kept until a run succeeds
+        setup_only = None
+        previous = {}
+        try:
+            while True:
+                timer = Timer()
+                run = store.begin_run(os.path.splitext(os.path.basename(report))[0],
+                                      net_config_path, testcases_path) \
+                    if store is not None else None
+                logger = WatchLogger(protocol, fmt, timer, run, previous)
+                manager = AnsibleManager(config, runner_dir, timer=timer, protos=protos, lab=lab,
+                                         **(manager_options or {}))
+                rc = grade(manager, net_config_path, testcases_path, logger, verbose,
+                           stream=True, cache=cache, simulate=simulate, result_cache=result_cache,
+                           config_cache=config_cache, slowest=slowest, setup_only=setup_only)
+                output = logger.write(dir, report, protocol, fmt)
+                if rc == 0:
+                    setup_only = set()
+                    previous = logger.points()
+                for error in output['Errors']:
+                    print(error)
+                print(f"Points: {output['Points reached']:g}/{output['Points possible']:g}")
+
+                watcher.watch([net_config_path, testcases_path, *scripts.values()])
+                print(f"Watching {len(watcher.hashes)} files for changes ({watcher.mode}), "
+                      "press Ctrl+C to stop...")
+                changed = watcher.wait()
+                print(f"\nChanged: {', '.join(os.path.relpath(path) for path in changed)}")
+                if os.path.abspath(net_config_path) in changed:
+                    scripts = watched_scripts(net_config_path, config_cache, scripts)
+                    setup_only = None
+                elif setup_only is not None:
+                    setup_only |= {name for name, script in scripts.items()
+                                   if script in changed}
+        except KeyboardInterrupt:
+            print("\nStopped watching.")
+    sys.exit(rc)
+
+
+def watched_scripts(net_config_path, config_cache=None, scripts=None):
+    """
+    Returns the absolute path of the NFTable script of every machine of the infra file,
+      scripts if the infra file can not be loaded
+    """
+    net_config = NetworkConfiguration()
     try:
-        print("Setting up firewalls...")
-        manager.create_nft_inventory(f"{inventory_dir}/setup.yml", net_config)
-        results = manager.execute_playbook("setup.yml")
-    except TimeoutError as e:
-        msg = "Error while setting up firewalls"
-        logger.add_error({'err':e, 'list':[msg], 'tag':'Firewall setup'})
-        print(msg)
-        finalize(logger, 1, dir, report, protocol)
-
-    for host, result in results.items():
-        if result['unreachable']:
-            logger.add_error({'err':result, 'list':[f"Fatal: {host.split('-')[1]} unreachable"],
-                               'tag':host})
-            finalize(logger, 1, dir, report, protocol)
-
-        if result['rc'] != 0:
-            logger.add_error({'err':result, 'list':["Fatal failure setting up " +
-                                                    f"{host.split('-')[1]}"], 'tag':host})
-            finalize(logger, 1, dir, report, protocol)
-
-        logger.add_event([result], host)
-
-    print("Setting up tests...")
-    try:
-        manager.create_inventory(f"{inventory_dir}/inventory.yml", net_config, testcase_config)
-    except ValueError as e:
-        msg = "Error while creating tests"
-        print(msg)
-        logger.add_error({'err':e, 'list':[msg], 'tag':'Testsetup'})
-
-    print("Running tests...")
-    results = manager.run()
-    print("Done.")
-
-    event_list = []
-    points = 0
-
-    for testcase in testcase_config.testcases:
-        testnr = 0
-        hostname = net_config.machines[testcase.source].name
-
-        # get all events belonging to the testcase
-        while True:
-            event = f"{hostname}-{str(testcase.name)}-{testnr}"
-            result = results.get(event, None)
-            #check if all events have been handled
-            if result is None:
-                if len(event_list) == 0:
-                    points = 0
-                    break
-                points = (points/len(event_list)) * testcase.points
-                break
-
-            event_list.append({'TestNr': testnr})
-            event_list[testnr].update(result)
-
-            #if event was successful increment points
-            if result['rc'] == 0 and testcase.allow:
-                points += 1
-            elif not testcase.allow:
-                points += 1
-
-            testnr += 1
-
-        logger.add_test_event(event_list, points, testcase)
-        points = 0
-        event_list = []
-
-    finalize(logger, 0, dir, report, protocol)
-
-
-def finalize(logger:Logger, rc, dir, report, protocol):
-    output:dict = logger.write(dir, report, protocol)
+        net_config.load_from_yaml(net_config_path, config_cache)
+    except (AttributeError, ValueError, OSError, yaml.YAMLError):
+        return scripts or {}
+    return {name: os.path.abspath(machine.nftable)
+            for name, machine in net_config.machines.items() if machine.nftable != ''}
+
+
+def ant_check(net_config_path, testcases_path, verbose, cache=None, config_cache=None):
+    """
+    Checks the infra and testcase files and the NFTable scripts without running any tests,
+      exits with 0 if everything is valid and 1 otherwise.
+    Neither Ansible nor the lab machines are needed.
+    """
+    logger = Logger()
+    configs = check(net_config_path, testcases_path, logger, verbose, cache=cache,
+                    config_cache=config_cache)
+    if configs is not None:
+        net_config, testcase_config = configs
+        for testcase in testcase_config.testcases:
+            if testcase.source not in net_config.machines:
+                logger.add_error({'err': testcase.source, 'list':
+                                  [f"Testcase {testcase.name}: Machine {testcase.source} "
+                                   "does not exist"], 'tag': 'Testcases'})
+                continue
+            try:
+                net_config.resolve(testcase.destination)
+            except ValueError as e:
+                logger.add_error({'err': e, 'list': [f"Testcase {testcase.name}: {e}"],
+                                  'tag': 'Testcases'})
+
+    errors = logger.results['General']['Errors']
+    for error in errors:
+        print(error.rstrip())
+    if errors:
+        print("Check failed.")
+        sys.exit(1)
+    print(f"Check passed, {len(configs[1].testcases)} testcases.")
+    sys.exit(0)
+
+
+def load_submissions(path):
+    """
+    Loads the submissions to grade from a directory or a manifest file
+    A directory contains one subdirectory per submission holding a script per machine
+      named <machine> or <machine>.nft.
+    A manifest is a yaml file mapping submission names to {machine: script path}, relative
+      paths are resolved from the location of the manifest.
+    Returns:
+        a dictionary {submission: {machine: script path}}
+    """
+    submissions = {}
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            sub_dir = os.path.join(path, name)
+            if not os.path.isdir(sub_dir):
+                continue
+            submissions[name] = {os.path.splitext(script)[0].lower(): os.path.join(sub_dir, script)
+                                 for script in sorted(os.listdir(sub_dir))
+                                 if os.path.isfile(os.path.join(sub_dir, script))}
+        return submissions
+
+    with open(path, 'r', encoding='utf-8') as manifest_file:
+        data = yaml.safe_load(manifest_file)
+    for name, scripts in data.items():
+        submissions[str(name)] = {machine.lower(): os.path.join(os.path.dirname(path), script)
+                                  for machine, script in scripts.items()}
+    return submissions
+
+
+def finalize(logger:Logger, rc, dir, report, protocol, fmt=None, metrics=None):
+    output:dict = logger.write(dir, report, protocol, fmt)
+    if metrics is not None and logger.timer is not None:
+        write_prometheus(metrics, [({}, logger.timer)])
     if rc == 0:
         print("Testing finished:")
     else:
@@ -182,15 +321,110 @@ if __name__ == '__main__':
     )
 
     parser.add_argument('-i', '--infrafile',
-                        help='The path to the infrastructure configuration file', required=True)
+                        help='The path to the infrastructure configuration file')
     parser.add_argument('-t', '--testcases',
-                        help='The path to the testcase configuration file', required=True)
+                        help='The path to the testcase configuration file')
     parser.add_argument('-c', '--config', default='mapping.yml',
                         help='path to the configuration file')
     parser.add_argument('-r', '--report', help='report file, overrides --dir option')
     parser.add_argument('-p', '--protocol', help='protocol file, overrides --dir option')
     parser.add_argument('-d', '--dir', default='.', help='output directory')
+    parser.add_argument('--format', choices=FORMATS,
+                        help='format of the report and protocol, by default taken from the '
+                        'file extensions, yaml otherwise. jsonl writes the protocol while the '
+                        'tests are running')
     parser.add_argument('-v', '--verbose', action='store_const', const=True, default=False)
+    parser.add_argument('-b', '--batch',
+                        help='directory or manifest of submissions to grade, see load_submissions')
+    parser.add_argument('-w', '--workers', type=int,
+                        help='number of submissions graded at once in batch mode, '
+                        'submissions graded at once must not share lab machines, '
+                        'by default 1 or the number of labs in --labs')
+    parser.add_argument('--labs',
+                        help='lab pool file, every job is graded on a free lab of the pool')
+    parser.add_argument('--no-cache', action='store_const', const=True, default=False,
+                        help='validate every NFTable script, parse every configuration file '
+                        'and load every ruleset even if it has not changed')
+    parser.add_argument('--simulate', action='store_const', const=True, default=False,
+                        help='predict the results from the NFTable scripts without running tests')
+    parser.add_argument('--incremental', action='store_const', const=True, default=False,
+                        help='only run testcases that changed since their last run')
+    parser.add_argument('--single-pass', action='store_const', const=True, default=False,
+                        help='run the tests of all protocols in a single ansible play')
+    parser.add_argument('-f', '--forks', type=int,
+                        help='number of hosts ansible works on in parallel')
+    parser.add_argument('--agent', action='store_const', const=True, default=False,
+                        help='run all probes of a machine at once with the probe agent')
+    parser.add_argument('--executor', choices=('ansible', *EXECUTORS), default='ansible',
+                        help='run the setup and the probes with ansible or over one ssh '
+                        'connection per machine (needs asyncssh)')
+    parser.add_argument('--concurrency', type=int,
+                        help='number of probes the ssh executor runs at once')
+    parser.add_argument('--retries', type=int, default=0,
+                        help='number of times probes that failed or whose machine was '
+                        'unreachable are run again on their hosts only, every attempt is '
+                        'recorded in the protocol')
+    parser.add_argument('--retry-backoff', type=float, default=RETRY_BACKOFF, metavar='SECONDS',
+                        help='seconds before the first retry, doubled for every further one')
+    parser.add_argument('-s', '--stream', action='store_const', const=True, default=False,
+                        help='process and score results while the tests are running')
+    parser.add_argument('--metrics',
+                        help='write the timings of the run to this Prometheus textfile')
+    parser.add_argument('--profile', action='store_const', const=True, default=False,
+                        help='profile the run with cProfile, the stats are saved next to the '
+                        'report as .prof')
+    parser.add_argument('--check', action='store_const', const=True, default=False,
+                        help='only check the infra and testcase files and the NFTable scripts')
+    parser.add_argument('--slowest', type=int, default=10,
+                        help='number of slowest probes listed in the Latency section of the report')
+    parser.add_argument('--store', nargs='?', const=DEFAULT_STORE, metavar='PATH',
+                        help='add the results of every run to a SQLite results store, '
+                        f'{DEFAULT_STORE} by default, query it with python -m '
+                        'ant_backend.results_store')
+    parser.add_argument('--watch', action='store_const', const=True, default=False,
+                        help='grade again whenever the infra file, the testcase file or an '
+                        'NFTable script changes, only what the change affects is run again')
+    parser.add_argument('--serve', metavar='ADDRESS',
+                        help='run as a grading daemon taking jobs over HTTP on host:port or the '
+                        'path of a Unix socket, -w jobs are graded at once')
 
     args = parser.parse_args()
-    ant_main(args.config, args.infrafile, args.testcases, args.verbose, args.dir, args.report, args.protocol)
+    validation_cache = None if args.no_cache else ValidationCache()
+    config_cache = None if args.no_cache else ConfigCache()
+    testcase_cache = ResultCache() if args.incremental else None
+    options = {'single_pass': args.single_pass, 'forks': args.forks, 'agent': args.agent,
+               'setup_cache': None if args.no_cache else SetupCache(),
+               'retries': args.retries, 'backoff': args.retry_backoff}
+    if args.executor != 'ansible':
+        try:
+            options['executor'] = EXECUTORS[args.executor](concurrency=args.concurrency)
+        except ImportError as err:
+            parser.error(str(err))
+    try:
+        labs = LabPool.load_from_yaml(args.labs) if args.labs else None
+    except (ValueError, OSError, yaml.YAMLError) as err:
+        parser.error(f"--labs: {err}")
+    store = ResultsStore(args.store) if args.store else None
+    if args.serve:
+        from ant_backend.daemon import GradingDaemon, serve
+        serve(GradingDaemon(args.config, args.workers, args.dir, validation_cache, config_cache,
+                            options, args.format, args.slowest, args.stream, args.simulate,
+                            labs=labs, store=store),
+              args.serve, args.verbose)
+        sys.exit(0)
+    if not args.infrafile or not args.testcases:
+        parser.error("the following arguments are required: -i/--infrafile, -t/--testcases")
+    if args.check:
+        ant_check(args.infrafile, args.testcases, args.verbose, validation_cache, config_cache)
+    if args.watch:
+        ant_watch(args.config, args.infrafile, args.testcases, args.verbose, args.dir,
+                  args.report, args.protocol, validation_cache, args.simulate, testcase_cache,
+                  options, args.format, config_cache, args.slowest, labs, store)
+    if args.batch:
+        ant_batch(args.config, args.infrafile, args.testcases, args.batch, args.workers,
+                  args.verbose, args.dir, validation_cache, args.simulate, testcase_cache,
+                  options, args.format, config_cache, args.metrics, args.profile, args.slowest,
+                  labs, store)
+    ant_main(args.config, args.infrafile, args.testcases, args.verbose, args.dir, args.report, args.protocol,
+             args.stream, validation_cache, args.simulate, testcase_cache, options, args.format,
+             config_cache, args.metrics, args.profile, args.slowest, labs, store)
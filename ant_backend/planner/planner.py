@@ -0,0 +1,114 @@
+"""
+Module: planner.py
+
+Plans the probes of a run so every distinct probe runs once. Testcases often expand to the
+same probes, the same port of the same address tested from the same machine. Each probe is
+identified by (source machine, protocol, destination, port), run for the first testcase
+that needs it and its result is shared with all other testcases that need it as well.
+"""
+
+from ant_backend.results import ResultTable
+
+class ProbePlan(object):
+    """
+    The probes of every testcase, keyed by (machine name, testcase name), and the probes
+      every testcase runs itself
+    """
+    def __init__(self):
+        # probe -> the testcase that runs it
+        self.runner = {}
+        # testcase -> its probes in probe order
+        self.probes = {}
+        # testcase -> the probes it runs itself, in the order it runs them
+        self.runs = {}
+        # testcase -> the testcases whose probes it needs
+        self.needs = {}
+        # testcase -> the testcases needing its probes
+        self.waiting = {}
+        # results of finished testcases by probe, while streaming
+        self.results = {}
+        self.finished = set()
+        self.emitted = set()
+
+    def add(self, key, proto, probes:list):
+        """
+        Plans the probes of the testcase key, a list of (destination, port)
+        Returns:
+            the probes the testcase runs itself, those not run by an earlier testcase
+        """
+        machine = key[0]
+        own = []
+        needs = self.needs.setdefault(key, set())
+        self.probes[key] = []
+        for destination, port in probes:
+            probe = (machine, proto, destination, port)
+            self.probes[key].append(probe)
+            if probe not in self.runner:
+                self.runner[probe] = key
+                own.append((destination, port))
+            needs.add(self.runner[probe])
+            self.waiting.setdefault(self.runner[probe], set()).add(key)
+        self.runs[key] = [(machine, proto, destination, port) for destination, port in own]
+        return own
+
+    def saved(self):
+        """
+        Returns the number of probes not run thanks to sharing
+        """
+        return sum(len(probes) for probes in self.probes.values()) - len(self.runner)
+
+    def fan_out(self, table):
+        """
+        Returns the results of table for every planned testcase, results of shared probes
+          are copied to every testcase that needs them
+        """
+        by_probe = {}
+        for key, probes in self.runs.items():
+            for result in table.get(*key):
+                if result.index < len(probes):
+                    by_probe[probes[result.index]] = result
+
+        fanned = ResultTable()
+        fanned.setup = table.setup
+        for key, row in table.rows.items():
+            if key not in self.probes:
+                fanned.extend(row)
+        for key, probes in self.probes.items():
+            fanned.extend(by_probe[probe].share(key[1], n) for n, probe in enumerate(probes)
+                          if probe in by_probe)
+        return fanned
+
+    def collect(self, key, results:list):
+        """
+        Takes the results of a finished testcase while streaming
+        Returns:
+            a list of (testcase, results) of all testcases whose probes are all done now
+        """
+        probes = self.runs.get(key, [])
+        for result in results:
+            if result.index < len(probes):
+                self.results[probes[result.index]] = result
+        self.finished.add(key)
+        ready = []
+        for waiting in sorted(self.waiting.get(key, set()) | {key}):
+            if waiting not in self.emitted and waiting in self.probes and \
+                    self.needs[waiting] <= self.finished:
+                ready.append((waiting, self._share(waiting)))
+        return ready
+
+    def flush(self):
+        """
+        Returns (testcase, results) of every testcase that got some but not all of its
+          results while streaming, e.g. because a testcase it shares probes with timed out
+        """
+        ready = []
+        for key in self.probes:
+            results = self._share(key) if key not in self.emitted else []
+            if results:
+                ready.append((key, results))
+        return ready
+
+    def _share(self, key):
+        self.emitted.add(key)
+        return [self.results[probe].share(key[1], n)
+                for n, probe in enumerate(self.probes[key]) if probe in self.results]
@@ -0,0 +1 @@
+from .probes import COMMANDS, PROBE_TIMEOUTS, expand_probes, probe_command
@@ -0,0 +1,41 @@
+"""
+Module: probes.py
+
+Describes the single probes a testcase expands to, in the same order and with the same
+commands as the protocol playbooks in ansible_runner/project run them.
+"""
+
+# the commands the playbooks run for a single probe
+COMMANDS = {
+    'tcp': "nc -zv -w5 {destination} {port}",
+    'udp': "dig @{destination} port={port}",
+    'icmp': "ping -c 4 {destination}"
+}
+
+# dig always queries the dns port, regardless of the testcase
+UDP_PORT = 53
+
+# seconds a single probe may take, nc -w5, the dig timeout and ping -c 4
+PROBE_TIMEOUTS = {
+    'tcp': 5,
+    'udp': 5,
+    'icmp': 4
+}
+
+def expand_probes(proto:str, destinations:list, d_port:list):
+    """
+    Expands the destinations and ports of a testcase to single probes
+    Returns:
+        List of (destination, port) tuples, port is None for icmp
+    """
+    if proto == 'tcp':
+        return [(destination, port) for destination in destinations for port in d_port]
+    if proto == 'udp':
+        return [(destination, UDP_PORT) for destination in destinations]
+    return [(destination, None) for destination in destinations]
+
+def probe_command(proto:str, destination:str, port):
+    """
+    Returns the command a playbook runs for a single probe
+    """
+    return COMMANDS[proto].format(destination=destination, port=port)
@@ -16,10 +16,16 @@ Exceptions:
 
 import yaml
 
+# the libyaml parser is much faster than the pure python one, if pyyaml was built with it
+LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 class Testcase:
     """
     Represents a single network test case with relevant parameters.
     """
+    __slots__ = ('name', 'source', 'destination', 'proto', 's_port', 'd_port', 'points', 'allow',
+                 'special')
+
     def __init__(self, name, source, destination, proto, s_port=None,
                  d_port=None, points=0, allow=True, special = None):
         self.name = name
@@ -54,12 +60,24 @@ class TestcaseConfiguration:
         self.testcases.append(Testcase(name, source, destination, proto, s_port, d_port, points,
                                        allow, special))
 
-    def load_from_yaml(self, file_name):
+    def load_from_yaml(self, file_name, cache=None):
         """
         Loads test cases from a YAML file and adds them to the configuration.
+        If a ConfigCache is given, a snapshot of a file loaded before is used instead.
         """
+        if cache is not None:
+            snapshot = cache.get(file_name, self)
+            if snapshot is not None:
+                self.testcases.extend(snapshot.testcases)
+                return
+            self._load(file_name)
+            cache.put(file_name, self)
+            return
+        self._load(file_name)
+
+    def _load(self, file_name):
         with open(file_name, 'r', encoding='utf-8') as testcases_file:
-            data = yaml.safe_load(testcases_file)
+            data = yaml.load(testcases_file, Loader=LOADER)
 
         for index, entry in enumerate(data):
             # Use default name if not explicitly provided
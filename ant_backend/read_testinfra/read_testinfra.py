@@ -10,33 +10,33 @@ Exceptions:
     - AttributeError: Raised when required attributes are missing in the YAML file.
 """
 
+import bisect
 import ipaddress
 import os
 import yaml
 
+# the libyaml parser is much faster than the pure python one, if pyyaml was built with it
+LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 class Machine(object):
     """
     Class representing a machine
     """
+    __slots__ = ('name', 'ip_addresses', 'management_ip', 'user', 'password', 'nftable')
+
     def __init__(self, name:str, ip_addresses:list, management_ip:str, username:str, password:str, nftable:str):
         self.name = name
-        self.ip_addresses = []
-        ipv6 = False
-        if ipaddress.ip_address(ip_addresses[0]).version == 6:
-            ipv6 = True
-        for ip_address in ip_addresses:
-            ip = ipaddress.ip_address(ip_address)
-            if ipv6 and ip.version == 4:
-                raise AttributeError("Ipv4 and IPv6 Addresses mixed")
-            elif not ipv6 and ip.version == 6:
-                raise AttributeError("Ipv4 and IPv6 Addresses mixed")
-            self.ip_addresses.append(ip)
+        self.ip_addresses = [ipaddress.ip_address(ip_address) for ip_address in ip_addresses]
+        if len({ip.version for ip in self.ip_addresses}) > 1:
+            raise AttributeError("Ipv4 and IPv6 Addresses mixed")
         self.management_ip = ipaddress.ip_address(management_ip)
         self.user = username
         self.password = password
         self.nftable = nftable
 
     def __eq__(self, other):
+        if not isinstance(other, Machine):
+            return NotImplemented
         return self.name == other.name and self.ip_addresses == other.ip_addresses and \
             self.management_ip == other.management_ip
 
@@ -51,6 +51,12 @@ class NetworkConfiguration(object):
     def __init__(self):
         self.networks = {}
         self.machines = {}
+        # address index, built by build_index
+        self.machine_addresses = None
+        self.network_members = {}
+        self._intervals = {}
+        self._resolved = {}
+        self._owners = {}
 
     def __eq__(self, other):
         return self.networks == other.networks and self.machines == other.machines
@@ -60,25 +66,40 @@ class NetworkConfiguration(object):
         Methode for adding a new Network Object for the Network Configuration
         """
         self.networks[name] = ipaddress.ip_network((netaddress, netmask))
+        self.machine_addresses = None
 
-    def add_machine(self, name, ip_address, management_ip, username, password, nftable):
+    def add_machine(self, name, ip_address, management_ip, username, password, nftable=''):
         """
         Methode for adding a new Machine Object for the Network Configuration
         """
         self.machines[name] = Machine(name, ip_address, management_ip, username, password, nftable)
+        self.machine_addresses = None
 
     def __repr__(self):
         return f"NetworkConfiguration(networks={self.networks}, machine={self.machines})"
 
 
-    def load_from_yaml(self, file_name):
+    def load_from_yaml(self, file_name, cache=None):
         """
         Methode for loading a .yml-file and creating new networks and machine classes from the 
         loaded .yml-file
+        If a ConfigCache is given, a snapshot of a file loaded before is used instead.
         """
-        nftable_exists = False
+        if cache is not None:
+            snapshot = cache.get(file_name, self)
+            if snapshot is not None:
+                # the scripts are not part of the snapshot, they may have been removed since
+                self.check_nftables(snapshot.machines.values())
+                self.__dict__.update(snapshot.__dict__)
+                return
+            self._load(file_name)
+            cache.put(file_name, self)
+            return
+        self._load(file_name)
+
+    def _load(self, file_name):
         with open(file_name, 'r', encoding='utf-8') as infrastructur_file:
-            data = yaml.safe_load(infrastructur_file)
+            data = yaml.load(infrastructur_file, Loader=LOADER)
 
         for net_name, net_info in data.get("Networks", {}).items():
             self.add_networks(net_name.lower(), net_info["Netmask"], net_info["Netaddress"])
@@ -87,8 +108,6 @@ class NetworkConfiguration(object):
             self.add_machine(machine_name.lower(), machine_info["IP"], machine_info["Management"],
                              machine_info["User"], machine_info["Password"],
                              machine_info.get('NFTable', ''))
-            if machine_info.get('NFTable', '') != '' and os.path.isfile(machine_info.get('NFTable')):
-                nftable_exists = True
 
         if not self.networks:
             raise AttributeError(f"{file_name} missing Networks attribute")
@@ -96,5 +115,120 @@ class NetworkConfiguration(object):
         if not self.machines:
             raise AttributeError(f"{file_name} missing Machines attribute")
         
-        if not nftable_exists:
+        self.check_nftables(self.machines.values())
+
+        self.build_index()
+
+    @staticmethod
+    def check_nftables(machines):
+        """
+        Checks that at least one of machines has an existing NFTable script
+        """
+        if not any(machine.nftable != '' and os.path.isfile(machine.nftable)
+                   for machine in machines):
             raise AttributeError("Missing at least one NFTable configuration file")
+
+    def build_index(self):
+        """
+        Builds the lookup structures used by resolve:
+            - machine name to addresses
+            - network name to the addresses of its members
+            - per IP version a sorted list of all machine addresses as integers,
+              a network is looked up as the interval between its first and last address
+        """
+        self.machine_addresses = {}
+        self._intervals = {4: ([], []), 6: ([], [])}
+        self._resolved = {}
+        entries = {4: [], 6: []}
+
+        for machine in self.machines.values():
+            self.machine_addresses[machine.name] = [ip.exploded for ip in machine.ip_addresses]
+            for ip in machine.ip_addresses:
+                # the position keeps the order of machines and addresses for lookups
+                entries[ip.version].append((int(ip), len(entries[ip.version]), ip.exploded))
+
+        for version, version_entries in entries.items():
+            version_entries.sort()
+            self._intervals[version] = ([entry[0] for entry in version_entries], version_entries)
+
+        self.network_members = {name: self._addresses_in(network)
+                                for name, network in self.networks.items()}
+        self._owners = {ip: machine for machine in self.machines.values()
+                        for ip in machine.ip_addresses}
+
+    def _addresses_in(self, network):
+        keys, entries = self._intervals[network.version]
+        start = bisect.bisect_left(keys, int(network.network_address))
+        end = bisect.bisect_right(keys, int(network.broadcast_address))
+        return [entry[2] for entry in sorted(entries[start:end], key=lambda entry: entry[1])]
+
+    def path(self, source:Machine, daddr):
+        """
+        Returns the (machine, hook) pairs a packet from source to the address daddr passes:
+            - the output hook of the source machine
+            - the forward hook of every other machine with an NFTable script that shares a
+              network with the source and the destination (or with the source only, if the
+              destination is outside of all known networks)
+            - the input hook of the machine owning the destination address
+        """
+        if self.machine_addresses is None:
+            self.build_index()
+        target = self._owners.get(daddr)
+        source_nets = [net for net in self.networks.values()
+                       if any(ip in net for ip in source.ip_addresses)]
+        dest_nets = [net for net in self.networks.values() if daddr in net]
+
+        hops = [(source, 'output')]
+        for machine in self.machines.values():
+            if machine is source or machine is target or machine.nftable == '':
+                continue
+            if not any(ip in net for ip in machine.ip_addresses for net in source_nets):
+                continue
+            if dest_nets and not any(ip in net for ip in machine.ip_addresses
+                                     for net in dest_nets):
+                continue
+            hops.append((machine, 'forward'))
+        if target is not None:
+            hops.append((target, 'input'))
+        return hops
+
+    def resolve(self, destination):
+        """
+        Resolves a destination to a list of IP Address strings
+        Destination may be:
+            - the name of a Machine
+            - the name of a Network
+            - an IP-Address
+            - an IP-Network
+        Results are memoized, the returned list must not be modified.
+        Raises:
+            ValueError if the destination does not resolve to any address
+        """
+        if self.machine_addresses is None:
+            self.build_index()
+        if destination not in self._resolved:
+            self._resolved[destination] = self._resolve(destination)
+        return self._resolved[destination]
+
+    def _resolve(self, destination):
+        try:
+            return [ipaddress.ip_address(destination).exploded]
+        except ValueError:
+            pass
+
+        destinations = []
+        try:
+            network = ipaddress.ip_network(destination)
+        except ValueError:
+            pass
+        else:
+            destinations = self._addresses_in(network)
+            if not destinations:
+                raise ValueError(f"No Machines in Network {destination}")
+
+        destinations = destinations + self.machine_addresses.get(destination, []) + \
+            self.network_members.get(destination, [])
+
+        if not destinations:
+            raise ValueError(f"{destination} is not a Valid Destination")
+        return destinations
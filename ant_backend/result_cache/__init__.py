@@ -0,0 +1 @@
+from .result_cache import ResultCache, file_hash
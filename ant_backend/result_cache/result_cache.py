@@ -0,0 +1,40 @@
+"""
+Module: result_cache.py
+
+Persistent cache of testcase results for incremental runs. Results are stored per testcase
+under a fingerprint of everything the outcome of its probes depends on,
+see AnsibleManager.fingerprint.
+"""
+
+import hashlib
+from ant_backend.disk_cache import DiskCache
+
+def file_hash(path:str):
+    """
+    Returns the sha256 of a file or an empty string if it can not be read
+    """
+    try:
+        with open(path, 'rb') as hashed_file:
+            return hashlib.sha256(hashed_file.read()).hexdigest()
+    except OSError:
+        return ''
+
+class ResultCache(DiskCache):
+    """
+    On-disk store of the probe results of testcases keyed by their fingerprint
+    """
+    name = 'results'
+
+    def get(self, fingerprint):
+        """
+        Returns the cached probe results for fingerprint or None
+        """
+        return self.load(fingerprint)
+
+    def put(self, fingerprint, records:list):
+        """
+        Stores the probe results of a testcase, results of unreachable machines are not stored
+        """
+        if not records or any(record.get('unreachable') for record in records):
+            return
+        self.store(fingerprint, records)
@@ -0,0 +1 @@
+from .results import ProbeResult, ResultTable, parse_duration
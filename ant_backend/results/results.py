@@ -0,0 +1,182 @@
+"""
+Module: results.py
+
+The results of a run, one ProbeResult per probe, grouped by machine and testcase
+in a ResultTable.
+"""
+
+import datetime
+import re
+
+# the values of a probe shown in the protocol
+FIELDS = ('stdout_lines', 'stderr_lines', 'rc', 'start', 'end', 'delta', 'msg', 'cmd',
+          'unreachable')
+
+# older ansible versions stop a task at its timeout with this message, newer ones add timedout
+TASK_TIMEOUT = "in the expected time frame"
+
+DELTA = re.compile(r"(?:(\d+) days?, )?(\d+):(\d+):(\d+(?:\.\d+)?)$")
+
+def parse_duration(delta, start=None, end=None):
+    """
+    Returns the seconds a probe took from its delta as ansible reports it, '0:00:03.041547',
+      or from its start and end timestamps, None if neither can be parsed
+    """
+    match = DELTA.match(str(delta).strip()) if delta else None
+    if match is not None:
+        days, hours, minutes, seconds = match.groups()
+        return int(days or 0) * 86400 + int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    try:
+        return (datetime.datetime.fromisoformat(str(end)) -
+                datetime.datetime.fromisoformat(str(start))).total_seconds()
+    except (TypeError, ValueError):
+        return None
+
+class ProbeResult(object):
+    """
+    The result of a single probe, the index-th probe of testcase run on machine
+    """
+    __slots__ = ('machine', 'testcase', 'index') + FIELDS + ('cached', 'timed_out', 'shared',
+                                                            'attempts')
+
+    def __init__(self, machine, testcase, index, rc=None, stdout_lines=(), stderr_lines=(),
+                 start=None, end=None, delta=None, msg=None, cmd=None, unreachable=False,
+                 cached=False, timed_out=False):
+        self.machine = machine
+        self.testcase = testcase
+        self.index = index
+        self.rc = rc
+        self.stdout_lines = tuple(stdout_lines or ())
+        self.stderr_lines = tuple(stderr_lines or ())
+        self.start = start
+        self.end = end
+        self.delta = delta
+        self.msg = msg
+        self.cmd = cmd
+        self.unreachable = unreachable
+        self.cached = cached
+        self.timed_out = timed_out
+        # the testcase that ran the probe if it was run once for several testcases
+        self.shared = None
+        # the earlier results of the probe if it was retried, the first one first
+        self.attempts = ()
+
+    @classmethod
+    def from_res(cls, machine, testcase, index, res:dict, cached=False):
+        """
+        Creates a result from the res of an ansible event, the output of the probe agent
+          or a record as returned by record
+        """
+        cmd = res.get('cmd')
+        return cls(machine, testcase, index, rc=res.get('rc'),
+                   stdout_lines=res.get('stdout_lines'), stderr_lines=res.get('stderr_lines'),
+                   start=res.get('start'), end=res.get('end'), delta=res.get('delta'),
+                   msg=res.get('msg'), cmd=" ".join(cmd) if isinstance(cmd, list) else cmd,
+                   unreachable=res.get('unreachable', False), cached=cached,
+                   timed_out=res.get('timed_out', bool(res.get('timedout')) or
+                                     TASK_TIMEOUT in str(res.get('msg', ''))))
+
+    def share(self, testcase, index):
+        """
+        Returns a copy of the result as the index-th probe of another testcase on the
+          same machine that needs the same probe
+        """
+        result = ProbeResult(self.machine, testcase, index,
+                             **{field: getattr(self, field) for field in FIELDS},
+                             cached=self.cached, timed_out=self.timed_out)
+        if testcase != self.testcase:
+            result.shared = self.shared or self.testcase
+        result.attempts = self.attempts
+        return result
+
+    def retried(self, result:'ProbeResult'):
+        """
+        Returns result, the result of running the probe again, with this result and its
+          earlier attempts as its attempts
+        """
+        previous = self.share(self.testcase, self.index)
+        previous.shared = self.shared
+        previous.attempts = ()
+        result.attempts = self.attempts + (previous,)
+        return result
+
+    @property
+    def duration(self):
+        """
+        The seconds the probe took or None if unknown
+        """
+        return parse_duration(self.delta, self.start, self.end)
+
+    def record(self):
+        """
+        Returns the result as a dictionary as written to the protocol
+        """
+        record = {field: getattr(self, field) for field in FIELDS}
+        record['duration'] = self.duration
+        record['stdout_lines'] = list(self.stdout_lines)
+        record['stderr_lines'] = list(self.stderr_lines)
+        if self.cached:
+            record['cached'] = True
+        if self.timed_out:
+            record['timed_out'] = True
+        if self.shared is not None:
+            record['shared'] = self.shared
+        if self.attempts:
+            record['attempts'] = [attempt.record() for attempt in self.attempts]
+        return record
+
+    def __repr__(self):
+        return f"ProbeResult({self.machine!r}, {self.testcase!r}, {self.index}, rc={self.rc})"
+
+
+class ResultTable(object):
+    """
+    The probe results of a run indexed by (machine, testcase), each in probe order,
+      and the results of setting up the firewalls indexed by machine
+    """
+    def __init__(self):
+        self.rows = {}
+        self.setup = {}
+
+    def add(self, result:ProbeResult):
+        """
+        Adds the result of a single probe
+        """
+        row = self.rows.setdefault((result.machine, result.testcase), [])
+        row.append(result)
+        if len(row) > 1 and row[-2].index > result.index:
+            row.sort(key=lambda probe: probe.index)
+
+    def extend(self, results):
+        """
+        Adds the results of several probes
+        """
+        for result in results:
+            self.add(result)
+
+    def update(self, other:'ResultTable'):
+        """
+        Adds all results of another table
+        """
+        for row in other.rows.values():
+            self.extend(row)
+        self.setup.update(other.setup)
+
+    def get(self, machine, testcase):
+        """
+        Returns the results of a testcase run on machine in probe order
+        """
+        return self.rows.get((machine, testcase), [])
+
+    def pop(self, machine, testcase):
+        """
+        Removes and returns the results of a testcase run on machine
+        """
+        return self.rows.pop((machine, testcase), [])
+
+    def __iter__(self):
+        for row in self.rows.values():
+            yield from row
+
+    def __len__(self):
+        return sum(len(row) for row in self.rows.values())
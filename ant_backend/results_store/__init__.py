@@ -0,0 +1 @@
+from .results_store import DEFAULT_STORE, ResultsStore, StoredRun
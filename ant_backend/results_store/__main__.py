@@ -0,0 +1,62 @@
+"""
+Queries the results store:
+    python -m ant_backend.results_store [--db results.sqlite] runs [-n name] [--last N]
+    python -m ant_backend.results_store [--db results.sqlite] failures [-n name] [--last N]
+    python -m ant_backend.results_store [--db results.sqlite] slowest [--limit N] [--proto tcp]
+    python -m ant_backend.results_store [--db results.sqlite] sql "SELECT ..."
+"""
+
+import json
+from argparse import ArgumentParser
+from ant_backend.results_store.results_store import DEFAULT_STORE, ResultsStore
+
+def print_rows(rows, columns):
+    widths = [max([len(column)] + [len(format_value(row[column])) for row in rows])
+              for column in columns]
+    for values in [columns] + [[format_value(row[column]) for column in columns] for row in rows]:
+        print("  ".join(value.ljust(width) for value, width in zip(values, widths)).rstrip())
+
+def format_value(value):
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return "" if value is None else str(value)
+
+if __name__ == '__main__':
+    parser = ArgumentParser(prog="python -m ant_backend.results_store",
+                            description="Queries the results of the runs stored with --store")
+    parser.add_argument('--db', default=DEFAULT_STORE, help='path of the results store')
+    parser.add_argument('--json', action='store_const', const=True, default=False,
+                        help='print the rows as json')
+    queries = parser.add_subparsers(dest='query', required=True)
+    runs = queries.add_parser('runs', help='the latest runs')
+    failures = queries.add_parser('failures',
+                                  help='the testcases not passed in the latest runs')
+    for query in (runs, failures):
+        query.add_argument('-n', '--name',
+                           help='only runs of this submission, % and _ are wildcards')
+        query.add_argument('--last', type=int, default=10, help='number of runs')
+    slowest = queries.add_parser('slowest', help='the probes with the highest mean duration')
+    slowest.add_argument('--limit', type=int, default=10, help='number of probes')
+    slowest.add_argument('--proto', help='only probes of this protocol')
+    sql = queries.add_parser('sql', help='any SQL query')
+    sql.add_argument('statement')
+    args = parser.parse_args()
+
+    store = ResultsStore(args.db)
+    if args.query == 'runs':
+        rows = store.runs(args.name, args.last)
+        columns = ['id', 'name', 'tests', 'points_reached', 'points_possible', 'report']
+    elif args.query == 'failures':
+        rows = store.failures(args.name, args.last)
+        columns = ['testcase', 'machine', 'protocol', 'runs', 'failed', 'partial']
+    elif args.query == 'slowest':
+        rows = store.slowest(args.limit, args.proto)
+        columns = ['machine', 'protocol', 'cmd', 'runs', 'mean', 'max']
+    else:
+        rows = store.query(args.statement)
+        columns = list(rows[0]) if rows else []
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_rows(rows, columns)
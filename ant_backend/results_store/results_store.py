@@ -0,0 +1,289 @@
+"""
+Module: results_store.py
+
+Optional SQLite database of the results of all runs, next to the report and protocol files of
+every run. Questions across runs, like the testcases a submission failed in its last runs or
+the slowest probes of a semester, are answered by indexed queries instead of loading every
+report.
+
+Every run is a row of runs, with a row per testcase in testcases, per probe in probes and per
+firewall setup in setup_events. Rows are buffered while a run is logged and written in batched
+transactions, the database is in WAL mode so jobs graded at once write to it side by side.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from ant_backend.results import parse_duration
+
+# rows buffered before they are written in a single transaction
+BATCH = 500
+# seconds a writer waits for another one to finish its transaction
+BUSY_TIMEOUT = 30
+DEFAULT_STORE = os.path.join(os.environ.get('XDG_DATA_HOME', os.path.expanduser('~/.local/share')),
+                             'ant', 'results.sqlite')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    infra TEXT,
+    testcases TEXT,
+    started REAL,
+    finished REAL,
+    tests INTEGER,
+    successful REAL,
+    failed REAL,
+    points_reached REAL,
+    points_possible REAL,
+    errors TEXT,
+    report TEXT,
+    protocol TEXT
+);
+CREATE TABLE IF NOT EXISTS testcases (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    name TEXT,
+    machine TEXT,
+    protocol TEXT,
+    outcome TEXT,
+    points_reached REAL,
+    points_possible REAL,
+    probes INTEGER
+);
+CREATE TABLE IF NOT EXISTS probes (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    testcase TEXT,
+    machine TEXT,
+    protocol TEXT,
+    idx INTEGER,
+    outcome TEXT,
+    rc INTEGER,
+    cmd TEXT,
+    msg TEXT,
+    start TEXT,
+    duration REAL,
+    cached INTEGER,
+    shared TEXT
+);
+CREATE TABLE IF NOT EXISTS setup_events (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    machine TEXT,
+    outcome TEXT,
+    rc INTEGER,
+    msg TEXT,
+    upload REAL,
+    load_rules REAL,
+    shared TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_name ON runs(name);
+CREATE INDEX IF NOT EXISTS testcases_run ON testcases(run_id);
+CREATE INDEX IF NOT EXISTS testcases_machine ON testcases(machine);
+CREATE INDEX IF NOT EXISTS testcases_name ON testcases(name);
+CREATE INDEX IF NOT EXISTS testcases_protocol ON testcases(protocol);
+CREATE INDEX IF NOT EXISTS testcases_outcome ON testcases(outcome);
+CREATE INDEX IF NOT EXISTS probes_run ON probes(run_id);
+CREATE INDEX IF NOT EXISTS probes_machine ON probes(machine);
+CREATE INDEX IF NOT EXISTS probes_testcase ON probes(testcase);
+CREATE INDEX IF NOT EXISTS probes_protocol ON probes(protocol);
+CREATE INDEX IF NOT EXISTS probes_outcome ON probes(outcome);
+CREATE INDEX IF NOT EXISTS setup_events_run ON setup_events(run_id);
+CREATE INDEX IF NOT EXISTS setup_events_machine ON setup_events(machine);
+"""
+
+def probe_outcome(result):
+    """
+    Returns the outcome of a ProbeResult: ok, failed, timed_out or unreachable
+    """
+    if result.unreachable:
+        return 'unreachable'
+    if result.timed_out:
+        return 'timed_out'
+    return 'ok' if result.rc == 0 else 'failed'
+
+def testcase_outcome(points, possible):
+    """
+    Returns the outcome of a testcase: passed, partial or failed
+    """
+    if possible and points >= possible:
+        return 'passed'
+    return 'partial' if points > 0 else 'failed'
+
+def setup_outcome(result:dict):
+    """
+    Returns the outcome of setting up a firewall: loaded, unchanged, failed, timed_out or
+      unreachable
+    """
+    if result.get('unreachable'):
+        return 'unreachable'
+    if result.get('timed_out'):
+        return 'timed_out'
+    if result.get('rc') != 0:
+        return 'failed'
+    return 'unchanged' if result.get('unchanged') else 'loaded'
+
+class ResultsStore(object):
+    """
+    The SQLite database of the results of all runs at path, DEFAULT_STORE by default
+    """
+    def __init__(self, path=None):
+        path = path or DEFAULT_STORE
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        conn.close()
+
+    def connect(self):
+        """
+        Returns a new connection to the database
+        """
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def begin_run(self, name=None, infra=None, testcases=None):
+        """
+        Adds a run
+        Returns:
+            the StoredRun its results are added to
+        """
+        return StoredRun(self, name, infra, testcases)
+
+    def query(self, sql, params=()):
+        """
+        Returns the rows of a query as dictionaries
+        """
+        conn = self.connect()
+        try:
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def runs(self, name=None, last=None):
+        """
+        Returns the runs of name, a LIKE pattern, or of all names, the latest first
+        """
+        return self.query("SELECT * FROM runs WHERE (:name IS NULL OR name LIKE :name) "
+                          "ORDER BY started DESC, id DESC LIMIT :last",
+                          {'name': name, 'last': last or -1})
+
+    def failures(self, name=None, last=None):
+        """
+        Returns the testcases not passed in the last runs of name, a LIKE pattern, or of all
+          names, with the number of those runs they were not passed in
+        """
+        return self.query(
+            "WITH recent AS (SELECT id FROM runs WHERE (:name IS NULL OR name LIKE :name) "
+            "ORDER BY started DESC, id DESC LIMIT :last) "
+            "SELECT testcases.name AS testcase, machine, protocol, COUNT(*) AS runs, "
+            "SUM(outcome = 'failed') AS failed, SUM(outcome = 'partial') AS partial "
+            "FROM testcases JOIN recent ON testcases.run_id = recent.id "
+            "WHERE outcome != 'passed' GROUP BY testcases.name, machine, protocol "
+            "ORDER BY runs DESC, testcase",
+            {'name': name, 'last': last or -1})
+
+    def slowest(self, limit=10, protocol=None):
+        """
+        Returns the probes with the highest mean duration across all runs, cached and shared
+          probes left out
+        """
+        return self.query(
+            "SELECT machine, protocol, cmd, COUNT(*) AS runs, AVG(duration) AS mean, "
+            "MAX(duration) AS max FROM probes WHERE duration IS NOT NULL AND cached = 0 "
+            "AND shared IS NULL AND (:protocol IS NULL OR protocol = :protocol) "
+            "GROUP BY machine, protocol, cmd ORDER BY mean DESC LIMIT :limit",
+            {'protocol': protocol, 'limit': limit})
+
+
+class StoredRun(object):
+    """
+    A run in the ResultsStore, its rows are buffered and written BATCH rows at a time
+    """
+    def __init__(self, store:ResultsStore, name=None, infra=None, testcases=None):
+        self.conn = store.connect()
+        self.lock = threading.Lock()
+        self.pending = {'testcases': [], 'probes': [], 'setup_events': []}
+        with self.conn:
+            self.id = self.conn.execute(
+                "INSERT INTO runs (name, infra, testcases, started) VALUES (?, ?, ?, ?)",
+                (name, infra, testcases, time.time())).lastrowid
+
+    def add_testcase(self, testcase, points, results:list):
+        """
+        Adds a scored testcase and the ProbeResults of its probes
+        """
+        with self.lock:
+            self.pending['testcases'].append(
+                (self.id, testcase.name, testcase.source, testcase.proto,
+                 testcase_outcome(points, testcase.points), points, testcase.points,
+                 len(results)))
+            self.pending['probes'].extend(
+                (self.id, testcase.name, result.machine, testcase.proto, result.index,
+                 probe_outcome(result), result.rc, result.cmd, result.msg,
+                 str(result.start) if result.start is not None else None,
+                 result.duration, int(result.cached), result.shared)
+                for result in results)
+            self._flush_full()
+
+    def add_setup(self, machine, result:dict):
+        """
+        Adds the result of setting up the NFTable script of machine
+        """
+        with self.lock:
+            self.pending['setup_events'].append(
+                (self.id, machine, setup_outcome(result), result.get('rc'), result.get('msg'),
+                 parse_duration(None, result.get('upload_start'), result.get('upload_end')),
+                 parse_duration(None, result.get('load_rules_start'),
+                                result.get('load_rules_end')),
+                 result.get('shared')))
+            self._flush_full()
+
+    def finish(self, results:dict, report=None, protocol=None):
+        """
+        Writes the remaining rows and the General section of the report results of the run
+        """
+        general = results.get('General', {})
+        with self.lock:
+            self._flush()
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE runs SET finished = ?, tests = ?, successful = ?, failed = ?, "
+                    "points_reached = ?, points_possible = ?, errors = ?, report = ?, "
+                    "protocol = ? WHERE id = ?",
+                    (time.time(), general.get('Tests'), general.get('Successful'),
+                     general.get('Failed'), general.get('Points reached'),
+                     general.get('Points possible'),
+                     json.dumps(general.get('Errors', []), default=str), report, protocol,
+                     self.id))
+
+    def close(self):
+        self.conn.close()
+
+    def _flush_full(self):
+        if sum(len(rows) for rows in self.pending.values()) >= BATCH:
+            self._flush()
+
+    def _flush(self):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO testcases (run_id, name, machine, protocol, outcome, "
+                "points_reached, points_possible, probes) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                self.pending['testcases'])
+            self.conn.executemany(
+                "INSERT INTO probes (run_id, testcase, machine, protocol, idx, outcome, rc, cmd, "
+                "msg, start, duration, cached, shared) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self.pending['probes'])
+            self.conn.executemany(
+                "INSERT INTO setup_events (run_id, machine, outcome, rc, msg, upload, load_rules, "
+                "shared) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                self.pending['setup_events'])
+        for rows in self.pending.values():
+            rows.clear()
@@ -0,0 +1 @@
+from .setup_cache import SetupCache
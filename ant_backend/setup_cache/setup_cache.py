@@ -0,0 +1,40 @@
+"""
+Module: setup_cache.py
+
+Remembers the ruleset every lab machine is running. After a script is loaded, the setup
+playbook records a hash of the active ruleset. If a later run would load the same script on
+the same machine and the machine still runs that ruleset, uploading and loading it again is
+skipped.
+"""
+
+import hashlib
+from ant_backend.disk_cache import DiskCache
+
+class SetupCache(DiskCache):
+    """
+    On-disk store of the hash of the active ruleset keyed by management address and
+      the content of the script that was loaded
+    """
+    name = 'setup'
+
+    @staticmethod
+    def key(address, script_hash):
+        """
+        Returns the cache key of loading the script with script_hash on the machine at address
+        """
+        return hashlib.sha256(f"{address}\0{script_hash}".encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the hash of the ruleset that was active after the setup of key or None
+        """
+        try:
+            return self.load(key)['active']
+        except (KeyError, TypeError):
+            return None
+
+    def put(self, key, active):
+        """
+        Stores the hash of the active ruleset after the setup of key
+        """
+        self.store(key, {'active': active})
@@ -0,0 +1 @@
+from .simulator import Simulator, Ruleset, load_ruleset
@@ -0,0 +1,362 @@
+"""
+Module: simulator.py
+
+Predicts the outcome of testcases from the NFTable scripts alone, without touching any VM.
+Every script is loaded into a throwaway network namespace and exported as json through the
+nftables binding, its filter chains are then evaluated for the first packet of every probe.
+
+The path of a packet is derived from the network configuration, see NetworkConfiguration.path.
+
+Expressions that can not be decided offline (e.g. interface names) are assumed to match,
+the affected results are marked as approximate.
+"""
+
+import ctypes
+import ipaddress
+import json
+import multiprocessing
+import os
+import socket
+from ant_backend.probes import expand_probes, probe_command
+from ant_backend.results import ProbeResult, ResultTable
+
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWNET = 0x40000000
+
+PROTO_NUMBERS = {'icmp': 1, 'tcp': 6, 'udp': 17, 'ipv6-icmp': 58, 'icmpv6': 58}
+VERDICTS = ('accept', 'drop', 'reject', 'jump', 'goto', 'return')
+# marks values the simulator can not know
+UNKNOWN = object()
+# interface names are unknown, except that probes never use the loopback interface
+INTERFACE = object()
+
+def load_ruleset(file:str):
+    """
+    Loads the json representation of an NFTable script
+    Files ending in .json are expected to hold the output of `nft -j list ruleset`, other
+      scripts are loaded in a new user and network namespace and exported from there.
+    """
+    if file.endswith('.json'):
+        with open(file, 'r', encoding='utf-8') as ruleset_file:
+            return json.load(ruleset_file)
+
+    # unshare needs a single threaded process
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(_export_in_namespace, (os.path.abspath(file),))
+
+def _export_in_namespace(file):
+    # pylint: disable=import-outside-toplevel
+    from nftables import Nftables
+
+    uid, gid = os.getuid(), os.getgid()
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.unshare(CLONE_NEWUSER | CLONE_NEWNET) != 0:
+        raise OSError(ctypes.get_errno(), "Could not create a network namespace")
+    for map_file, content in (('setgroups', 'deny'), ('uid_map', f"0 {uid} 1"),
+                              ('gid_map', f"0 {gid} 1")):
+        with open(f"/proc/self/{map_file}", 'w', encoding='utf-8') as proc_file:
+            proc_file.write(content)
+
+    nft = Nftables()
+    nft.set_json_output(True)
+    rc, _, error = nft.cmd_from_file(file)
+    if rc != 0:
+        raise ValueError(f"Could not load {file}: {error}")
+    rc, output, error = nft.cmd("list ruleset")
+    if rc != 0:
+        raise ValueError(f"Could not export {file}: {error}")
+    return json.loads(output)
+
+
+class Packet(object):
+    """
+    The first packet of a probe
+    """
+    def __init__(self, saddr, daddr, proto:str, dport=None):
+        self.saddr = saddr
+        self.daddr = daddr
+        self.family = 'ip' if daddr.version == 4 else 'ip6'
+        if proto == 'icmp' and self.family == 'ip6':
+            proto = 'ipv6-icmp'
+        self.proto = proto
+        self.dport = dport
+        # set when an expression could not be decided
+        self.approximate = False
+
+
+class Ruleset(object):
+    """
+    The filter chains of an exported NFTable script
+    """
+    def __init__(self, data:dict):
+        self.chains = {}
+        self.sets = {}
+        self.base_chains = []
+
+        for entry in data.get('nftables', []):
+            # entries may be wrapped in the command that created them
+            for command in ('add', 'create', 'insert'):
+                entry = entry.get(command, entry)
+
+            if 'chain' in entry:
+                chain = entry['chain']
+                key = (chain['family'], chain['table'], chain['name'])
+                self.chains.setdefault(key, [])
+                if chain.get('hook') and chain.get('type', 'filter') == 'filter':
+                    self.base_chains.append((self._priority(chain.get('prio', 0)), key,
+                                             chain['hook'], chain.get('policy', 'accept')))
+            elif 'rule' in entry:
+                rule = entry['rule']
+                key = (rule['family'], rule['table'], rule['chain'])
+                self.chains.setdefault(key, []).append(rule)
+            elif 'set' in entry or 'map' in entry:
+                named = entry.get('set') or entry.get('map')
+                self.sets[(named['family'], named['table'], named['name'])] = \
+                    named.get('elem', [])
+
+        self.base_chains.sort(key=lambda chain: chain[0])
+
+    @staticmethod
+    def _priority(prio):
+        names = {'raw': -300, 'mangle': -150, 'dstnat': -100, 'filter': 0, 'security': 50,
+                 'srcnat': 100}
+        try:
+            return int(prio)
+        except (TypeError, ValueError):
+            return names.get(prio, 0)
+
+    def evaluate(self, hook:str, packet:Packet):
+        """
+        Runs packet through all base chains of a hook
+        Returns:
+            the verdict and a description of the rule or policy responsible for it
+        """
+        families = ('inet', packet.family)
+        accepted_by = f"no {hook} chain"
+        for _, key, chain_hook, policy in self.base_chains:
+            if chain_hook != hook or key[0] not in families:
+                continue
+            verdict, reason = self._run_chain(key, packet, 0)
+            if verdict == 'return':
+                verdict, reason = policy, f"policy {policy} of chain {key[2]}"
+            if verdict != 'accept':
+                return verdict, reason
+            accepted_by = reason
+        return 'accept', accepted_by
+
+    def _run_chain(self, key, packet:Packet, depth):
+        if depth > 16:
+            raise ValueError(f"Chain {key[2]} jumps too deep")
+        for rule in self.chains.get(key, []):
+            verdict, target = self._run_rule(rule, packet)
+            if verdict is None:
+                continue
+            if verdict == 'jump':
+                verdict, reason = self._run_chain((key[0], key[1], target), packet, depth + 1)
+                if verdict == 'return':
+                    continue
+                return verdict, reason
+            if verdict == 'goto':
+                return self._run_chain((key[0], key[1], target), packet, depth + 1)
+            return verdict, f"rule {rule.get('handle', '?')} in chain {key[2]}"
+        return 'return', None
+
+    def _run_rule(self, rule, packet:Packet):
+        for expr in rule.get('expr', []):
+            if 'match' in expr:
+                if not self._match(rule, expr['match'], packet):
+                    return None, None
+            elif 'vmap' in expr:
+                value = self._value(expr['vmap']['key'], packet)
+                if value is UNKNOWN:
+                    packet.approximate = True
+                if value is None or value is UNKNOWN:
+                    return None, None
+                for element in self._elements(rule, expr['vmap']['data']):
+                    if self._contains(value, element[0], rule):
+                        return self._verdict(element[1])
+                return None, None
+            elif any(verdict in expr for verdict in VERDICTS):
+                return self._verdict(expr)
+        return None, None
+
+    @staticmethod
+    def _verdict(expr):
+        for verdict in VERDICTS:
+            if verdict in expr:
+                target = expr[verdict]
+                return verdict, target.get('target') if isinstance(target, dict) else None
+        return None, None
+
+    def _match(self, rule, match, packet:Packet):
+        value = self._value(match['left'], packet)
+        if value is None:
+            # the header the expression refers to does not exist in this packet
+            return False
+        right = match['right']
+        if isinstance(right, list):
+            elements = right
+        elif isinstance(right, dict) and 'set' in right or \
+                isinstance(right, str) and right.startswith('@'):
+            elements = self._elements(rule, right)
+        else:
+            elements = [right]
+
+        if value is INTERFACE and all(element == 'lo' for element in elements):
+            # probes never pass the loopback interface
+            found = False
+        elif value is UNKNOWN or value is INTERFACE:
+            packet.approximate = True
+            return True
+        else:
+            found = any(self._contains(value, element, rule) for element in elements)
+
+        op = match.get('op', '==')
+        if op in ('==', 'in'):
+            return found
+        if op == '!=':
+            return not found
+        if isinstance(value, int) and isinstance(right, int):
+            return {'<': value < right, '>': value > right, '<=': value <= right,
+                    '>=': value >= right}.get(op, False)
+        packet.approximate = True
+        return True
+
+    def _elements(self, rule, right):
+        if isinstance(right, str) and right.startswith('@'):
+            elements = self.sets.get((rule['family'], rule['table'], right[1:]), [])
+        else:
+            elements = right['set']
+        return [element['elem']['val'] if isinstance(element, dict) and 'elem' in element
+                else element for element in elements]
+
+    @staticmethod
+    def _value(left, packet:Packet):
+        if 'payload' in left:
+            protocol = left['payload'].get('protocol')
+            field = left['payload'].get('field')
+            if protocol in ('ip', 'ip6'):
+                if protocol != packet.family:
+                    return None
+                return {'saddr': packet.saddr, 'daddr': packet.daddr,
+                        'protocol': packet.proto, 'nexthdr': packet.proto}.get(field, UNKNOWN)
+            if protocol in ('tcp', 'udp', 'th'):
+                if packet.proto not in ('tcp', 'udp') or protocol not in ('th', packet.proto):
+                    return None
+                return {'dport': packet.dport}.get(field, UNKNOWN)
+            if protocol in ('icmp', 'icmpv6'):
+                if packet.proto != {'icmp': 'icmp', 'icmpv6': 'ipv6-icmp'}[protocol]:
+                    return None
+                return {'type': 'echo-request'}.get(field, UNKNOWN)
+            return UNKNOWN
+        if 'meta' in left:
+            key = left['meta'].get('key')
+            if key == 'l4proto':
+                return packet.proto
+            if key == 'nfproto':
+                return 'ipv4' if packet.family == 'ip' else 'ipv6'
+            if key in ('iifname', 'oifname'):
+                return INTERFACE
+            return UNKNOWN
+        if 'ct' in left and left['ct'].get('key') == 'state':
+            # every probe is judged by the packet opening its connection
+            return 'new'
+        return UNKNOWN
+
+    def _contains(self, value, element, rule):
+        if isinstance(element, dict) and 'set' in element:
+            return any(self._contains(value, item, rule) for item in element['set'])
+        if isinstance(element, str) and element.startswith('@'):
+            return any(self._contains(value, item, rule)
+                       for item in self._elements(rule, element))
+        if isinstance(value, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+            try:
+                if isinstance(element, dict) and 'prefix' in element:
+                    return value in ipaddress.ip_network(
+                        (element['prefix']['addr'], element['prefix']['len']), strict=False)
+                if isinstance(element, dict) and 'range' in element:
+                    low, high = (ipaddress.ip_address(item) for item in element['range'])
+                    return low.version == value.version and low <= value <= high
+                return value in ipaddress.ip_network(element, strict=False)
+            except (TypeError, ValueError):
+                return False
+        if isinstance(value, int):
+            if isinstance(element, dict) and 'range' in element:
+                low, high = (_port(item) for item in element['range'])
+                return low <= value <= high
+            return value == _port(element)
+        if value in PROTO_NUMBERS:
+            return PROTO_NUMBERS[value] == PROTO_NUMBERS.get(element, element)
+        return value == element
+
+
+def _port(value):
+    if isinstance(value, int):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        return socket.getservbyname(value)
+
+
+class Simulator(object):
+    """
+    Predicts the verdict of every probe of a testcase configuration
+    """
+    def __init__(self, netconfig, loader=load_ruleset):
+        self.netconfig = netconfig
+        self.loader = loader
+        self.rulesets = {}
+
+    def ruleset(self, machine):
+        """
+        Returns the compiled ruleset of a machine or None if it has no NFTable script
+        """
+        if machine is None or machine.nftable == '':
+            return None
+        if machine.nftable not in self.rulesets:
+            self.rulesets[machine.nftable] = Ruleset(self.loader(machine.nftable))
+        return self.rulesets[machine.nftable]
+
+    def verdict(self, source, destination:str, proto:str, port=None):
+        """
+        Predicts whether a probe from the source machine reaches destination
+        Returns:
+            accepted, a list describing the decision of every hop and whether it is exact
+        """
+        daddr = ipaddress.ip_address(destination)
+        saddrs = [ip for ip in source.ip_addresses if ip.version == daddr.version]
+        if not saddrs:
+            return False, [f"{source.name} has no IPv{daddr.version} address"], True
+
+        packet = Packet(saddrs[0], daddr, proto, port)
+        trace = []
+        for machine, hook in self.netconfig.path(source, daddr):
+            ruleset = self.ruleset(machine)
+            if ruleset is None:
+                continue
+            verdict, reason = ruleset.evaluate(hook, packet)
+            trace.append(f"{machine.name} {hook}: {verdict} ({reason})")
+            if verdict != 'accept':
+                return False, trace, not packet.approximate
+        return True, trace, not packet.approximate
+
+    def run(self, testconfig, resolve):
+        """
+        Simulates all testcases, resolve maps a testcase destination to a list of addresses
+        Returns:
+            a ResultTable in the same format as AnsibleManager.run
+        """
+        table = ResultTable()
+        for testcase in testconfig.testcases:
+            machine = self.netconfig.machines[testcase.source]
+            destinations = resolve(testcase.destination)
+            for n, (destination, port) in enumerate(expand_probes(testcase.proto, destinations,
+                                                                  testcase.d_port)):
+                accepted, trace, exact = self.verdict(machine, destination, testcase.proto, port)
+                if not exact:
+                    trace.append("approximate: some expressions could not be decided offline")
+                table.add(ProbeResult(machine.name, testcase.name, n, rc=0 if accepted else 1,
+                                      stdout_lines=trace, msg='simulated',
+                                      cmd=probe_command(testcase.proto, destination, port)))
+        return table
@@ -1,5 +1,9 @@
+import json
+import os
+import tempfile
 import unittest
-from ant_backend import AnsibleManager, TestcaseConfiguration, NetworkConfiguration
+from unittest import mock
+from ant_backend import AnsibleManager, TestcaseConfiguration, NetworkConfiguration, ResultTable
 
 class AnsibleManagerTest(unittest.TestCase):
 
@@ -29,13 +33,81 @@ class AnsibleManagerTest(unittest.TestCase):
         self.testconfig.load_from_yaml('ant_backend/tests/ansible_manager/valid_tests.yml')
 
         referenceFile = 'ant_backend/tests/ansible_manager/ref_inventory.yml'
-        testFile = 'ant_backend/tests/ansible_manager/check_inventory.yml'
 
-        self.manager.create_inventory(testFile, self.netconfig, self.testconfig)
+        with tempfile.TemporaryDirectory() as tmp:
+            testFile = os.path.join(tmp, 'check_inventory.yml')
+            self.manager.create_inventory(testFile, self.netconfig, self.testconfig)
 
-        with open(referenceFile, 'r', encoding='utf-8') as ref, open(testFile,
-                                                                     'r', encoding='utf-8') as cmp:
-            self.assertListEqual(list(ref), list(cmp))
+            with open(referenceFile, 'r', encoding='utf-8') as ref, \
+                    open(testFile, 'r', encoding='utf-8') as cmp:
+                self.assertListEqual(list(ref), list(cmp))
+
+    def test_streaming(self):
+        def item(event, host, rc):
+            return {'event': event, 'event_data': {'host': host, 'res': {'rc': rc,
+                                                                        'cmd': ['nc', '-zv']}}}
+
+        events = [item('runner_item_on_ok', 'a-tc', 0), item('runner_item_on_failed', 'b-tc', 1),
+                  item('runner_item_on_ok', 'a-tc', 0), {'event': 'runner_on_ok',
+                                                         'event_data': {'host': 'a-tc'}},
+                  item('runner_item_on_ok', 'b-tc', 0)]
+
+        def fake_run(**kwargs):
+            for event in events:
+                self.assertFalse(kwargs['event_handler'](event))
+            return mock.Mock(status='successful')
+
+        finished = []
+        self.manager.hosts = {'a-tc': ('a', 'tc'), 'b-tc': ('b', 'tc')}
+        with mock.patch('ansible_runner.run', side_effect=fake_run), \
+                mock.patch('shutil.rmtree'):
+            results = self.manager.execute_playbook(
+                'tcp_playbook.yml', stream=True,
+                on_test=lambda m, t, r: finished.append(((m, t), r)))
+
+        self.assertEqual(len(results), 0)
+        self.assertListEqual([key for key, _ in finished], [('a', 'tc'), ('b', 'tc')])
+        self.assertListEqual([r.rc for r in finished[0][1]], [0, 0])
+        self.assertListEqual([r.index for r in finished[0][1]], [0, 1])
+        self.assertListEqual([r.rc for r in finished[1][1]], [1, 0])
+        self.assertEqual(finished[0][1][0].cmd, 'nc -zv')
+
+    def test_combined_playbook(self):
+        manager = AnsibleManager('mapping.yml')
+        play, = manager.combined_playbook(['tcp', 'icmp'])
+
+        self.assertEqual(play['hosts'], 'tcp:icmp')
+        self.assertEqual(play['strategy'], 'free')
+        self.assertListEqual([task['when'] for task in play['tasks']],
+                             [["'tcp' in group_names"]] * 2 + [["'icmp' in group_names"]] * 2)
+        self.assertEqual(play['tasks'][0]['ansible.builtin.command']['cmd'],
+                         "nc -zv -w5 {{ item[0] }} {{ item[1] }}")
+
+    def test_agent(self):
+        manager = AnsibleManager('mapping.yml', agent=True)
+        self.netconfig.load_from_yaml('ant_backend/tests/simulator/infra.yml')
+        self.testconfig.load_from_yaml('ant_backend/tests/simulator/tests.yml')
+
+        with mock.patch('builtins.open', mock.mock_open()):
+            manager.create_inventory('inventory.yml', self.netconfig, self.testconfig)
+
+        hosts = manager.inventory['agent']['hosts']
+        self.assertListEqual(list(hosts), ['hqclient', 'hqsrv'])
+        self.assertListEqual([(probe['host'], probe['n'], probe['port'])
+                              for probe in hosts['hqclient']['probes']],
+                             [('hqclient-web', 0, 80), ('hqclient-web', 1, 22),
+                              ('hqclient-ping_fw', 0, None), ('hqclient-ping_fw', 1, None)])
+
+        output = {'results': [{'host': 'hqclient-web', 'n': 1, 'rc': 1, 'cmd': 'b'},
+                              {'host': 'hqclient-web', 'n': 0, 'rc': 0, 'cmd': 'a'},
+                              {'host': 'hqclient-ping_fw', 'n': 0, 'rc': 0, 'cmd': 'c'}]}
+        event = {'event': 'runner_on_ok', 'event_data': {
+            'host': 'hqclient', 'task_action': 'ansible.builtin.script',
+            'res': {'stdout': json.dumps(output)}}}
+        results = ResultTable()
+        manager._parse_event('agent_playbook.yml', event, {}, results)
+        self.assertListEqual(list(results.rows), [('hqclient', 'web'), ('hqclient', 'ping_fw')])
+        self.assertListEqual([result.cmd for result in results], ['a', 'b', 'c'])
 
 
 if __name__ == '__main__':
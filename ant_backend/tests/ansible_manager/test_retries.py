@@ -0,0 +1,108 @@
+import unittest
+from unittest import mock
+from ant_backend import AnsibleManager, ProbeResult, Testcase
+from ant_backend.benchmarks import FakeRunner
+from ant_backend.tests.lab import SimulatorLab
+
+class FlakyRunner(FakeRunner):
+    """
+    Every probe succeeds, but those of port 80 fail until the first run limited to some hosts
+      or, if recover is not set, always
+    """
+    def __init__(self, recover=True):
+        super().__init__(success=1.0)
+        self.recover = recover
+        self.flaky = True
+        self.calls = []
+        self.inventories = []
+
+    def run(self, private_data_dir, playbook, event_handler=None, inventory=None, limit=None,
+            **kwargs):
+        self.calls.append((playbook, limit))
+        if limit is not None and self.recover:
+            self.flaky = False
+        # the manager puts its own groups back after the run
+        self.inventories.append(dict(inventory))
+        return super().run(private_data_dir, playbook, event_handler, inventory, limit, **kwargs)
+
+    def outcome(self, proto, destination, port):
+        if self.flaky and port == 80:
+            return 1, [], [f"nc: connect to {destination} port {port} (tcp) timed out"]
+        return super().outcome(proto, destination, port)
+
+
+class RetryTest(SimulatorLab):
+
+    def setUp(self):
+        super().setUp()
+        # shares the probe of port 80 with web, but expects it to be blocked
+        self.testconfig.testcases.append(Testcase('no_web', 'hqclient', 'hqsrv', 'tcp',
+                                                  d_port=[80], allow=False))
+
+    def run_manager(self, runner, stream=False, **options):
+        manager = AnsibleManager('mapping.yml', self.runner_dir(), retries=2, backoff=0.5,
+                                 **options)
+        manager.create_inventory(None, self.netconfig, self.testconfig)
+        finished = {}
+        on_test = (lambda m, t, r: finished.setdefault(t, r)) if stream else None
+        with self.fake_runner(runner), mock.patch('time.sleep') as sleep:
+            results = manager.run(0, stream, on_test)
+        if not stream:
+            finished = {key[1]: row for key, row in results.rows.items()}
+        return manager, finished, [call.args[0] for call in sleep.call_args_list]
+
+    def test_retry(self):
+        runner = FlakyRunner()
+        _, results, delays = self.run_manager(runner)
+        self.assertListEqual(runner.calls[-1:], [('tcp_playbook.yml', 'hqclient-web')])
+        self.assertListEqual(delays, [0.5])
+        web = results['web'][0]
+        self.assertEqual(web.rc, 0)
+        self.assertListEqual([attempt.rc for attempt in web.attempts], [1])
+        self.assertEqual(web.record()['attempts'][0]['rc'], 1)
+        self.assertNotIn('attempts', results['web'][1].record())
+        # the retried probe is shared with no_web
+        self.assertEqual(results['no_web'][0].rc, 0)
+        self.assertEqual(results['no_web'][0].shared, 'web')
+
+    def test_give_up(self):
+        runner = FlakyRunner(recover=False)
+        _, results, delays = self.run_manager(runner, dedup=False)
+        self.assertListEqual(delays, [0.5, 1.0])
+        self.assertEqual(results['web'][0].rc, 1)
+        self.assertEqual(len(results['web'][0].record()['attempts']), 2)
+        # no_web expects the probe to fail, it is not retried
+        self.assertListEqual([limit for _, limit in runner.calls if limit is not None],
+                             ['hqclient-web', 'hqclient-web'])
+        self.assertEqual(results['no_web'][0].attempts, ())
+
+    def test_agent(self):
+        runner = FlakyRunner()
+        manager, results, _ = self.run_manager(runner, stream=True, agent=True)
+        self.assertListEqual(runner.calls[-1:], [('agent_playbook.yml', 'hqclient')])
+        # only the failed probe is run again
+        self.assertListEqual([probe['port'] for probe in
+                              runner.inventories[-1]['agent']['hosts']['hqclient']['probes']],
+                             [80])
+        self.assertGreater(len(manager.inventory['agent']['hosts']['hqclient']['probes']), 1)
+        self.assertEqual(results['web'][0].rc, 0)
+        self.assertEqual(len(results['web'][0].attempts), 1)
+        self.assertEqual(results['web'][1].rc, 0)
+        # no_web passed and was handed on before the retry
+        self.assertEqual(results['no_web'][0].rc, 1)
+        self.assertEqual(results['no_web'][0].attempts, ())
+
+    def test_needs_retry(self):
+        manager = AnsibleManager('mapping.yml', self.runner_dir())
+        manager.create_inventory(None, self.netconfig, self.testconfig)
+        self.assertTrue(manager.needs_retry(ProbeResult('hqclient', 'web', 0, rc=1)))
+        self.assertFalse(manager.needs_retry(ProbeResult('hqclient', 'web', 0, rc=0)))
+        self.assertFalse(manager.needs_retry(ProbeResult('hqclient', 'no_web', 0, rc=1)))
+        self.assertTrue(manager.needs_retry(ProbeResult('hqclient', 'no_web', 0,
+                                                        unreachable=True)))
+        self.assertTrue(manager.needs_retry(ProbeResult('hqclient', 'no_web', 0,
+                                                        timed_out=True)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from ant_backend.main import ant_batch, load_submissions
+
+class BatchTest(unittest.TestCase):
+
+    def test_manifest(self):
+        submissions = load_submissions('ant_backend/tests/batch/manifest.yml')
+        self.assertDictEqual(submissions, {
+            'student_1': {'hqfw': 'ant_backend/tests/batch/student_1/hqfw.nft'},
+            'student_2': {'hqfw': 'ant_backend/tests/batch/student_2/hqfw.nft',
+                          'brfw': '/srv/student_2/brfw.nft'}
+        })
+
+    def test_directory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, scripts in (('a', ('HQFW.nft', 'brfw')), ('b', ('hqfw.nft',))):
+                os.mkdir(os.path.join(tmp, name))
+                for script in scripts:
+                    with open(os.path.join(tmp, name, script), 'w', encoding='utf-8'):
+                        pass
+            with open(os.path.join(tmp, 'notes.txt'), 'w', encoding='utf-8'):
+                pass
+
+            submissions = load_submissions(tmp)
+
+        self.assertListEqual(list(submissions), ['a', 'b'])
+        self.assertDictEqual(submissions['a'], {'brfw': os.path.join(tmp, 'a', 'brfw'),
+                                                'hqfw': os.path.join(tmp, 'a', 'HQFW.nft')})
+        self.assertDictEqual(submissions['b'], {'hqfw': os.path.join(tmp, 'b', 'hqfw.nft')})
+
+    def test_broken_submission(self):
+        def begin_run(name, *_):
+            if name == 'a':
+                raise OSError('database is locked')
+            return mock.Mock()
+
+        store = mock.Mock()
+        store.begin_run.side_effect = begin_run
+        with tempfile.TemporaryDirectory() as tmp:
+            # submissions without scripts of their own are graded with those of the infra file
+            for name in ('a', 'b'):
+                os.makedirs(os.path.join(tmp, 'submissions', name))
+            with mock.patch('builtins.print') as printed, self.assertRaises(SystemExit) as ctx:
+                ant_batch('mapping.yml', 'ant_backend/tests/simulator/infra.yml',
+                          'ant_backend/tests/simulator/tests.yml',
+                          os.path.join(tmp, 'submissions'), 2, False, tmp, simulate=True,
+                          fmt='json', store=store)
+            with open(os.path.join(tmp, 'ant-results-a.json'), 'r', encoding='utf-8') as report:
+                errors = json.load(report)['General']['Errors']
+
+        # the other submission is still graded and the batch summarized
+        self.assertEqual(ctx.exception.code, 1)
+        lines = [call.args[0] for call in printed.call_args_list if call.args]
+        self.assertIn("a: failed, 0/0 points", lines)
+        self.assertIn("b: done, 1.5/3 points", lines)
+        self.assertIn("Graded 2 submissions, 1 failed.", lines)
+        self.assertTrue(any('database is locked' in error for error in errors))
+
+
+if __name__ == '__main__':
+    unittest.main()
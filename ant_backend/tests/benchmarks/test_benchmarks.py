@@ -0,0 +1,39 @@
+import tempfile
+import unittest
+from ant_backend import NetworkConfiguration, TestcaseConfiguration
+from ant_backend.benchmarks import Benchmark, compare, generate
+
+class BenchmarkTest(unittest.TestCase):
+
+    def test_generate(self):
+        with tempfile.TemporaryDirectory() as directory:
+            infra, tests = generate(directory, 300, 50)
+            net_config = NetworkConfiguration()
+            net_config.load_from_yaml(infra)
+            testcase_config = TestcaseConfiguration()
+            testcase_config.load_from_yaml(tests)
+
+        self.assertEqual(len(net_config.machines), 300)
+        self.assertListEqual(sorted(net_config.networks), ['core', 'net0', 'net1'])
+        self.assertEqual(net_config.machines['fw1'].ip_addresses[1].exploded, '10.128.0.2')
+        self.assertEqual(len(testcase_config.testcases), 50)
+        for testcase in testcase_config.testcases:
+            self.assertIn(testcase.source, net_config.machines)
+            self.assertTrue(net_config.resolve(testcase.destination))
+
+    def test_stages(self):
+        with tempfile.TemporaryDirectory() as directory:
+            benchmark = Benchmark(directory, 5, 20, repeat=1)
+            stages = benchmark.run()
+
+        self.assertIn('execute_playbook', stages)
+        self.assertIn('logger_write_jsonl', stages)
+        self.assertTrue(all(timing['seconds'] >= 0 for timing in stages.values()))
+
+        old = {'stages': {'scoring': {'seconds': 1.0}, 'removed': {'seconds': 1.0}}}
+        new = {'stages': {'scoring': {'seconds': 1.5}, 'added': {'seconds': 1.0}}}
+        self.assertListEqual(compare(old, new), [('scoring', 1.0, 1.5, 1.5, True)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import subprocess
+import sys
+import unittest
+from unittest import mock
+from ant_backend import Logger
+from ant_backend.grading import check
+from ant_backend.main import ant_check
+
+INFRA = 'ant_backend/tests/simulator/infra.yml'
+TESTS = 'ant_backend/tests/simulator/tests.yml'
+
+class CheckTest(unittest.TestCase):
+
+    def test_lazy_imports(self):
+        code = ("import sys, ant_backend.main; "
+                "print(sorted(m for m in ('ansible_runner', 'nftables') if m in sys.modules))")
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                check=True).stdout
+        self.assertEqual(output.strip(), '[]')
+
+    def test_check(self):
+        logger = Logger()
+        net_config, testcase_config = check(INFRA, TESTS, logger, verb=0)
+        self.assertIn('hqfw', net_config.machines)
+        self.assertEqual(len(testcase_config.testcases), 3)
+
+        self.assertIsNone(check('missing.yml', TESTS, logger, verb=0))
+        self.assertListEqual(logger.results['General']['Errors'],
+                             ["File missing.yml does not exist"])
+
+    def test_ant_check(self):
+        with mock.patch('builtins.print'):
+            with self.assertRaises(SystemExit) as exit_code:
+                ant_check(INFRA, TESTS, False)
+            self.assertEqual(exit_code.exception.code, 0)
+
+            with self.assertRaises(SystemExit) as exit_code:
+                ant_check(INFRA, 'ant_backend/tests/ansible_manager/invalid_machine.yml', False)
+            self.assertEqual(exit_code.exception.code, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from ant_backend import ConfigCache, NetworkConfiguration, TestcaseConfiguration
+
+INFRA = 'ant_backend/tests/simulator/infra.yml'
+TESTS = 'ant_backend/tests/simulator/tests.yml'
+
+class ConfigCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = ConfigCache(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_snapshot(self):
+        netconfig = NetworkConfiguration()
+        netconfig.load_from_yaml(INFRA, self.cache)
+        testconfig = TestcaseConfiguration()
+        testconfig.load_from_yaml(TESTS, self.cache)
+        self.assertEqual(len(os.listdir(self.tmp.name)), 2)
+
+        cached_netconfig = NetworkConfiguration()
+        cached_testconfig = TestcaseConfiguration()
+        with mock.patch('yaml.load', side_effect=AssertionError("file parsed again")):
+            cached_netconfig.load_from_yaml(INFRA, self.cache)
+            cached_testconfig.load_from_yaml(TESTS, self.cache)
+
+        self.assertEqual(cached_netconfig, netconfig)
+        self.assertListEqual(cached_netconfig.resolve('hqlan'), netconfig.resolve('hqlan'))
+        self.assertListEqual([repr(testcase) for testcase in cached_testconfig.testcases],
+                             [repr(testcase) for testcase in testconfig.testcases])
+
+    def test_changed_file(self):
+        with open(INFRA, 'r', encoding='utf-8') as infra_file:
+            infra = infra_file.read()
+        changed = os.path.join(self.tmp.name, 'infra.yml')
+        with open(changed, 'w', encoding='utf-8') as infra_file:
+            infra_file.write(infra)
+
+        NetworkConfiguration().load_from_yaml(changed, self.cache)
+        with open(changed, 'a', encoding='utf-8') as infra_file:
+            infra_file.write("\n# changed\n")
+        self.assertIsNone(self.cache.get(changed, NetworkConfiguration()))
+        self.assertIsNone(self.cache.get(INFRA, TestcaseConfiguration()))
+
+
+if __name__ == '__main__':
+    unittest.main()
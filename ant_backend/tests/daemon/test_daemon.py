@@ -0,0 +1,110 @@
+import http.client
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from ant_backend import GradingDaemon
+from ant_backend.daemon import make_server
+
+INFRA = 'ant_backend/tests/simulator/infra.yml'
+TESTS = 'ant_backend/tests/simulator/tests.yml'
+
+class UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__('localhost')
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+class DaemonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.daemon = GradingDaemon('mapping.yml', workers=2, output_dir=self.tmp.name,
+                                    simulate=True)
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.tmp.cleanup()
+
+    def serve(self, address):
+        server = make_server(self.daemon, address)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def request(self, connection, method, path, body=None):
+        connection.request(method, path, body=json.dumps(body) if body is not None else None)
+        response = connection.getresponse()
+        return response.status, response.read()
+
+    def test_job(self):
+        job = self.daemon.submit(INFRA, TESTS, name='student_1')
+        state, version = self.daemon.wait(job, 0, timeout=60)
+        while state['status'] not in ('done', 'failed'):
+            state, version = self.daemon.wait(job, version, timeout=60)
+
+        self.assertEqual(state['status'], 'done')
+        self.assertEqual(state['name'], 'student_1')
+        self.assertEqual(state['results']['General']['Tests'], 5)
+        self.assertIn('Timing', state['results'])
+        self.assertTrue(os.path.isfile(state['results']['Report']))
+
+        with self.assertRaises(ValueError):
+            self.daemon.submit(INFRA, 'missing.yml')
+
+    def test_broken_store(self):
+        store = mock.Mock()
+        store.begin_run.side_effect = OSError('disk full')
+        daemon = GradingDaemon('mapping.yml', output_dir=self.tmp.name, simulate=True,
+                               store=store)
+        self.addCleanup(daemon.shutdown)
+        job = daemon.submit(INFRA, TESTS)
+        state, version = daemon.wait(job, 0, timeout=60)
+        while state['status'] not in ('done', 'failed'):
+            state, version = daemon.wait(job, version, timeout=60)
+        self.assertEqual(state['status'], 'failed')
+        self.assertEqual(state['rc'], 1)
+        self.assertIsNotNone(state['finished'])
+
+    def test_http(self):
+        server = self.serve('127.0.0.1:0')
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=60)
+
+        status, body = self.request(connection, 'POST', '/jobs', {'infra': INFRA})
+        self.assertEqual(status, 400)
+        status, body = self.request(connection, 'POST', '/jobs',
+                                    {'infra': INFRA, 'testcases': TESTS})
+        self.assertEqual(status, 202)
+        job_id = json.loads(body)['id']
+
+        stream = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=60)
+        status, body = self.request(stream, 'GET', f"/jobs/{job_id}/stream")
+        states = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(status, 200)
+        self.assertEqual(states[-1]['status'], 'done')
+
+        status, body = self.request(connection, 'GET', f"/jobs/{job_id}")
+        self.assertEqual(json.loads(body)['results']['General']['Tests'], 5)
+        status, body = self.request(connection, 'GET', '/jobs')
+        self.assertListEqual([job['id'] for job in json.loads(body)], [job_id])
+        status, _ = self.request(connection, 'GET', '/jobs/unknown')
+        self.assertEqual(status, 404)
+
+    def test_unix_socket(self):
+        path = os.path.join(self.tmp.name, 'ant.sock')
+        self.serve(path)
+        status, body = self.request(UnixConnection(path), 'GET', '/jobs')
+        self.assertEqual(status, 200)
+        self.assertListEqual(json.loads(body), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
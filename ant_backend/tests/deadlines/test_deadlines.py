@@ -0,0 +1,69 @@
+import unittest
+from unittest import mock
+from ant_backend import AnsibleManager
+from ant_backend.deadlines import CONNECT_TIMEOUT, host_budget, playbook_budget, probe_deadline
+from ant_backend.tests.lab import SimulatorLab
+
+class DeadlinesTest(SimulatorLab):
+
+    def item(self, host, rc):
+        return {'event': 'runner_item_on_ok', 'event_data': {'host': host, 'res': {'rc': rc}}}
+
+    def test_budgets(self):
+        self.assertEqual(host_budget([8, 8]), CONNECT_TIMEOUT + 16)
+        self.assertEqual(host_budget([8, 7], concurrent=True), CONNECT_TIMEOUT + 8 + 3)
+        self.assertEqual(playbook_budget([30, 10, 20], forks=2), 40)
+        self.assertEqual(playbook_budget([30, 10, 20]), 30)
+        self.assertEqual(playbook_budget([]), 30)
+
+        manager = AnsibleManager('mapping.yml')
+        with mock.patch('builtins.open', mock.mock_open()):
+            manager.create_inventory('inventory.yml', self.netconfig, self.testconfig)
+        self.assertDictEqual(manager.budgets['tcp'],
+                             {'hqclient-web': host_budget([probe_deadline('tcp')] * 2)})
+        self.assertDictEqual(manager.expected['icmp'], {'hqclient-ping_fw': 2})
+        self.assertEqual(manager.inventory['tcp']['hosts']['hqclient-web']['probe_deadline'],
+                         probe_deadline('tcp'))
+
+    def test_partial_results(self):
+        manager = AnsibleManager('mapping.yml')
+        with mock.patch('builtins.open', mock.mock_open()):
+            manager.create_inventory('inventory.yml', self.netconfig, self.testconfig)
+
+        runner = mock.Mock(status='timeout', events=[self.item('hqclient-web', 0)])
+        with mock.patch('ansible_runner.run', return_value=runner) as run, \
+                mock.patch('shutil.rmtree'):
+            results = manager.execute_playbook('tcp_playbook.yml')
+        self.assertEqual(run.call_args.kwargs['timeout'], manager.budgets['tcp']['hqclient-web'])
+        web = results.get('hqclient', 'web')
+        self.assertListEqual([(result.rc, result.timed_out) for result in web],
+                             [(0, False), (None, True)])
+        self.assertTrue(web[1].record()['timed_out'])
+
+        def fake_run(**kwargs):
+            kwargs['event_handler'](self.item('hqclient-ping_fw', 0))
+            return mock.Mock(status='timeout')
+
+        finished = []
+        with mock.patch('ansible_runner.run', side_effect=fake_run), \
+                mock.patch('shutil.rmtree'):
+            manager.execute_playbook('icmp_playbook.yml', stream=True,
+                                     on_test=lambda m, t, r: finished.append((t, r)))
+        self.assertListEqual([(name, [result.timed_out for result in probe_results])
+                              for name, probe_results in finished],
+                             [('ping_fw', [False, True])])
+
+    def test_setup(self):
+        manager = AnsibleManager('mapping.yml')
+        with mock.patch('builtins.open', mock.mock_open(read_data=b'')):
+            manager.create_nft_inventory('setup.yml', self.netconfig)
+        with mock.patch('ansible_runner.run', return_value=mock.Mock(status='timeout',
+                                                                     events=[])), \
+                mock.patch('shutil.rmtree'):
+            results = manager.execute_playbook('setup.yml')
+        self.assertTrue(results.setup['hqfw']['timed_out'])
+        self.assertIsNone(results.setup['hqfw']['rc'])
+
+
+if __name__ == '__main__':
+    unittest.main()
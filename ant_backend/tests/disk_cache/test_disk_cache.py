@@ -0,0 +1,53 @@
+import os
+import stat
+import tempfile
+import unittest
+from unittest import mock
+from ant_backend import ConfigCache, DiskCache, ResultCache, SetupCache, ValidationCache
+from ant_backend.disk_cache import atomic_write, cache_dir
+
+class DiskCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_cache_dir(self):
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': self.tmp.name}):
+            self.assertEqual(cache_dir('results'), os.path.join(self.tmp.name, 'ant', 'results'))
+            self.assertEqual(ResultCache().path, cache_dir('results'))
+            self.assertEqual(SetupCache().path, cache_dir('setup'))
+            self.assertEqual(ConfigCache().path, cache_dir('config'))
+            with mock.patch('ant_backend.valdiate_nft.validate_nft.nft_version',
+                            return_value='1.0'):
+                self.assertEqual(ValidationCache().path, cache_dir('nft'))
+
+    def test_load_store(self):
+        cache = DiskCache(os.path.join(self.tmp.name, 'entries'))
+        self.assertIsNone(cache.load('abc'))
+        cache.store('abc', {'rc': 0})
+        self.assertDictEqual(cache.load('abc'), {'rc': 0})
+        self.assertListEqual(os.listdir(cache.path), ['abc.json'])
+
+        with open(cache.entry_path('broken'), 'w', encoding='utf-8') as entry:
+            entry.write('{"rc"')
+        self.assertIsNone(cache.load('broken'))
+
+    def test_atomic_write(self):
+        path = os.path.join(self.tmp.name, 'metrics.prom')
+        atomic_write(path, 'old\n')
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+        atomic_write(path, b'new\n', mode=0o644)
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o644)
+
+        # a failed write leaves the file as it was and no temporary file behind
+        with mock.patch('os.replace', side_effect=OSError('read-only')):
+            with self.assertRaises(OSError):
+                atomic_write(path, 'lost\n')
+        with open(path, 'r', encoding='utf-8') as written:
+            self.assertEqual(written.read(), 'new\n')
+        self.assertListEqual(os.listdir(self.tmp.name), ['metrics.prom'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from ant_backend import AnsibleManager
+from ant_backend.executors import Executor, LocalExecutor
+from ant_backend.tests.lab import SimulatorLab
+
+class ScriptedExecutor(Executor):
+    """
+    Answers every probe without running it, port 22 is open, nothing else is
+    """
+    name = 'scripted'
+
+    def __init__(self, unreachable=()):
+        super().__init__(concurrency=2, channels=1)
+        self.unreachable = unreachable
+        self.connections = []
+
+    async def connect(self, hostvars):
+        if hostvars['ansible_host'] in self.unreachable:
+            raise ConnectionError("Connection refused")
+        self.connections.append(hostvars['ansible_host'])
+        return hostvars['ansible_host']
+
+    async def run_command(self, conn, cmd, timeout):
+        return (0, cmd, '') if not cmd.startswith('nc') or cmd.endswith(' 22') else (1, '', cmd)
+
+    async def upload(self, conn, local, remote):
+        pass
+
+
+class ScriptedSetup(LocalExecutor):
+    active_ruleset = "echo 1234  -"
+    load_ruleset = "cat {path}"
+
+
+class ExecutorTest(SimulatorLab):
+
+    def manager(self, executor):
+        runner_dir = self.runner_dir()
+        manager = AnsibleManager('mapping.yml', runner_dir, executor=executor)
+        manager.create_inventory(os.path.join(runner_dir, 'inventory', 'inventory.yml'),
+                                 self.netconfig, self.testconfig)
+        manager.create_nft_inventory(os.path.join(runner_dir, 'inventory', 'setup.yml'),
+                                     self.netconfig)
+        return manager
+
+    def probe(self, n, cmd, proto='tcp'):
+        return {'host': 'a-test', 'n': n, 'proto': proto, 'destination': '127.0.0.1',
+                'port': 1, 'timeout': 1, 'cmd': cmd}
+
+    def test_local(self):
+        results = []
+        hosts = {'a': {'ansible_host': '127.0.0.1', 'probes': [
+            self.probe(0, 'echo ok'), self.probe(1, 'echo no >&2; exit 3'),
+            self.probe(2, 'sleep 5')]}}
+        with mock.patch('ant_backend.executors.executors.probe_deadline', return_value=0.5):
+            LocalExecutor().run_probes(hosts, results.append)
+        results = {result['n']: result for result in results}
+        self.assertEqual(results[0]['rc'], 0)
+        self.assertListEqual(results[0]['stdout_lines'], ['ok'])
+        self.assertEqual(results[1]['rc'], 3)
+        self.assertListEqual(results[1]['stderr_lines'], ['no'])
+        self.assertEqual(results[1]['msg'], 'non-zero return code')
+        self.assertTrue(results[2]['timed_out'])
+        self.assertIsNone(results[2]['rc'])
+
+    def test_setup(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        manager = self.manager(ScriptedSetup(root=root))
+        results = manager.setup().setup
+        self.assertEqual(results['hqfw']['rc'], 0)
+        self.assertEqual(results['hqfw']['active_checksum'], '1234')
+        self.assertTrue(os.path.isfile(results['hqfw']['path']))
+        self.assertTrue(results['hqfw']['path'].startswith(root))
+
+        manager.inventory['setup']['hosts']['hqfw']['active_checksum'] = '1234'
+        self.assertTrue(manager.setup().setup['hqfw']['unchanged'])
+
+        manager.executor.load_ruleset = "echo broken >&2; false"
+        manager.inventory['setup']['hosts']['hqfw']['active_checksum'] = '5678'
+        results = manager.setup().setup
+        self.assertEqual(results['hqfw']['rc'], 1)
+        self.assertEqual(results['hqfw']['stderr'], 'broken')
+        self.assertNotIn('active_checksum', results['hqfw'])
+
+    def test_upload_dir(self):
+        manager = self.manager(ScriptedSetup())
+        results = manager.setup().setup
+        self.assertEqual(results['hqfw']['rc'], 0)
+        # the scripts are removed once they are loaded
+        root = os.path.dirname(os.path.dirname(results['hqfw']['path']))
+        self.assertTrue(os.path.basename(root).startswith('ant-local-'))
+        self.assertFalse(os.path.exists(root))
+        self.assertIsNone(manager.executor.root)
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            Executor()
+
+    def test_manager(self):
+        executor = ScriptedExecutor()
+        manager = self.manager(executor)
+        results = manager.run(verb=0)
+        self.assertListEqual(sorted(executor.connections), ['10.0.0.2', '10.0.0.3'])
+        self.assertListEqual([(result.rc, result.cmd) for result in results.get('hqclient', 'web')],
+                             [(1, 'nc -zv -w5 172.16.1.10 80'), (0, 'nc -zv -w5 172.16.1.10 22')])
+        self.assertListEqual([result.rc for result in results.get('hqsrv', 'dns')], [0])
+
+        streamed = {}
+        manager.run(verb=0, on_test=lambda m, t, r: streamed.setdefault(t, r))
+        self.assertListEqual(sorted(streamed), ['dns', 'ping_fw', 'web'])
+        self.assertListEqual([result.index for result in streamed['web']], [0, 1])
+
+    def test_unreachable(self):
+        manager = self.manager(ScriptedExecutor(unreachable=('10.0.0.2', '10.0.0.1')))
+        results = manager.run(verb=0)
+        self.assertTrue(all(result.unreachable for result in results.get('hqclient', 'web')))
+        self.assertFalse(results.get('hqsrv', 'dns')[0].unreachable)
+        setup = manager.setup().setup
+        self.assertTrue(setup['hqfw']['unreachable'])
+        self.assertEqual(setup['hqfw']['msg'], "Connection refused")
+
+
+if __name__ == '__main__':
+    unittest.main()
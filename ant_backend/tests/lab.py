@@ -0,0 +1,42 @@
+"""
+The lab of the simulator tests, shared by the tests running the AnsibleManager against it
+with FakeRunner in place of ansible_runner.run
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from ant_backend import NetworkConfiguration, TestcaseConfiguration
+from ant_backend.benchmarks import FakeRunner
+
+INFRA = 'ant_backend/tests/simulator/infra.yml'
+TESTS = 'ant_backend/tests/simulator/tests.yml'
+
+class SimulatorLab(unittest.TestCase):
+    """
+    Loads the infra and testcase files of the simulator tests as netconfig and testconfig
+      before every test
+    """
+
+    def setUp(self):
+        self.netconfig = NetworkConfiguration()
+        self.netconfig.load_from_yaml(INFRA)
+        self.testconfig = TestcaseConfiguration()
+        self.testconfig.load_from_yaml(TESTS)
+
+    def runner_dir(self):
+        """
+        Returns a new runner directory with an inventory directory, removed after the test
+        """
+        runner_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, runner_dir)
+        os.mkdir(os.path.join(runner_dir, 'inventory'))
+        return runner_dir
+
+    def fake_runner(self, runner=None):
+        """
+        Returns a patch running playbooks with runner, a FakeRunner by default
+        """
+        return mock.patch('ansible_runner.run', side_effect=(runner or FakeRunner()).run)
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import threading
+import unittest
+import yaml
+from ant_backend import AnsibleManager, LabPool, NetworkConfiguration
+
+class LabPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = LabPool.load_from_yaml('ant_backend/tests/lab_pool/pool.yml')
+        self.netconfig = NetworkConfiguration()
+        self.netconfig.load_from_yaml('ant_backend/tests/simulator/infra.yml')
+
+    def test_address(self):
+        lab1, lab2 = self.pool.labs
+        machines = self.netconfig.machines
+        self.assertEqual(lab1.address(machines['hqclient']).exploded, '10.1.0.3')
+        self.assertEqual(lab2.address(machines['hqfw']).exploded, '10.2.0.2')
+        self.assertEqual(lab2.address(machines['hqclient']), machines['hqclient'].management_ip)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'pool.yml')
+            with open(path, 'w', encoding='utf-8') as pool_file:
+                yaml.dump({'lab1': {'hqfw': '10.1.0.300'}}, pool_file)
+            with self.assertRaises(ValueError):
+                LabPool.load_from_yaml(path)
+
+    def test_lease(self):
+        with self.pool.lease() as first:
+            with self.pool.lease() as second:
+                self.assertNotEqual(first, second)
+                with self.assertRaises(TimeoutError):
+                    self.pool.acquire(timeout=0.01)
+
+            leased = []
+            thread = threading.Thread(target=lambda: leased.append(self.pool.acquire()))
+            thread.start()
+            thread.join(5)
+            self.assertListEqual(leased, [second])
+
+        # a failing job returns its lab
+        with self.assertRaises(RuntimeError):
+            with self.pool.lease():
+                raise RuntimeError()
+        self.assertEqual(len(self.pool.free), 1)
+
+    def test_inventory(self):
+        manager = AnsibleManager('mapping.yml', lab=self.pool.labs[0])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'setup.yml')
+            manager.create_nft_inventory(path, self.netconfig)
+            with open(path, 'r', encoding='utf-8') as inventory_file:
+                inventory = yaml.safe_load(inventory_file)
+        self.assertIn('hqfw', inventory['setup']['hosts'])
+        self.assertEqual(inventory['machine_hqfw']['vars']['ansible_host'], '10.1.0.2')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+from ant_backend import LatencyStats, NetworkConfiguration, ProbeResult, TestcaseConfiguration
+from ant_backend.latency import distribution
+from ant_backend.results import parse_duration
+
+class LatencyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.netconfig = NetworkConfiguration()
+        self.netconfig.load_from_yaml('ant_backend/tests/simulator/infra.yml')
+        self.testconfig = TestcaseConfiguration()
+        self.testconfig.load_from_yaml('ant_backend/tests/simulator/tests.yml')
+        self.testcases = {testcase.name: testcase for testcase in self.testconfig.testcases}
+
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration('0:00:03.041547'), 3.041547)
+        self.assertEqual(parse_duration('1 day, 1:02:03'), 90123.0)
+        self.assertEqual(parse_duration(None, '2024-05-02 10:00:00.000000',
+                                        '2024-05-02 10:00:01.500000'), 1.5)
+        self.assertIsNone(parse_duration('', '', ''))
+
+    def test_distribution(self):
+        self.assertDictEqual(distribution([4.0, 1.0, 3.0, 2.0]), {
+            'count': 4, 'min': 1.0, 'median': 2.5, 'p95': 4.0, 'max': 4.0, 'total': 10.0
+        })
+        self.assertDictEqual(distribution([]), {'count': 0})
+
+    def test_section(self):
+        latency = LatencyStats(self.netconfig, slowest=2)
+        latency.add(self.testcases['web'], [
+            ProbeResult('hqclient', 'web', 0, rc=0, delta='0:00:00.010000'),
+            ProbeResult('hqclient', 'web', 1, rc=1, delta='0:00:04.900000')
+        ])
+        latency.add(self.testcases['ping_fw'], [
+            ProbeResult('hqclient', 'ping_fw', 0, rc=0, delta='0:00:03.000000'),
+            ProbeResult('hqclient', 'ping_fw', 1, rc=0, delta='0:00:09.000000', cached=True)
+        ])
+        latency.add(self.testcases['dns'], [ProbeResult('hqsrv', 'dns', 0, rc=0)])
+        latency.add_setup('hqfw', {'upload_start': '2024-05-02 10:00:00',
+                                   'upload_end': '2024-05-02 10:00:02',
+                                   'load_rules_start': '', 'load_rules_end': ''})
+        section = latency.section()
+
+        self.assertEqual(section['Probes']['count'], 3)
+        self.assertListEqual(sorted(section['By protocol']), ['icmp', 'tcp'])
+        self.assertEqual(section['By source']['hqclient']['max'], 4.9)
+        self.assertEqual(section['By destination']['172.16.1.10']['count'], 2)
+        self.assertListEqual([(probe['testcase'], probe['port'])
+                              for probe in section['Near timeout']], [('web', 22)])
+        self.assertListEqual([probe['seconds'] for probe in section['Slowest']], [4.9, 3.0])
+        self.assertDictEqual(section['Setup'], {'hqfw': {'upload': 2.0, 'load_rules': None}})
@@ -0,0 +1,47 @@
+import json
+import os
+import tempfile
+import unittest
+import yaml
+from ant_backend import Logger, ProbeResult, Testcase
+
+class LoggerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.testcase = Testcase('web', 'hqclient', 'hqsrv', 'tcp', d_port=[80], points=1)
+        self.results = [ProbeResult('hqclient', 'web', 0, rc=0, cmd='nc -zv -w5 10.0.0.1 80')]
+
+    def test_json_lines(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = Logger(f"{tmp}/protocol.jsonl")
+            logger.add_event([{'rc': 0}], 'setup-hqfw')
+            logger.add_test_event(self.results, 1, self.testcase)
+
+            # the events are in the file before the protocol is written
+            with open(f"{tmp}/protocol.jsonl", 'r', encoding='utf-8') as protocol_file:
+                lines = [json.loads(line) for line in protocol_file]
+            self.assertListEqual([line['name'] for line in lines], ['setup-hqfw', 'web'])
+            self.assertEqual(lines[1]['event']['cmd'], 'nc -zv -w5 10.0.0.1 80')
+            self.assertDictEqual(logger.protocol, {})
+
+            logger.write(tmp, f"{tmp}/report.json", f"{tmp}/ignored.jsonl")
+            with open(f"{tmp}/report.json", 'r', encoding='utf-8') as report_file:
+                self.assertEqual(json.load(report_file)['General']['Tests'], 1)
+            self.assertFalse(os.path.exists(f"{tmp}/ignored.jsonl"))
+
+    def test_formats(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = Logger()
+            logger.add_test_event(self.results, 1, self.testcase)
+            logger.write(tmp, fmt='json')
+            logger.write(tmp, f"{tmp}/report.yml", f"{tmp}/protocol.yaml")
+
+            names = sorted(os.listdir(tmp))
+            self.assertListEqual([os.path.splitext(name)[1] for name in names],
+                                 ['.json', '.json', '.yaml', '.yml'])
+            with open(f"{tmp}/protocol.yaml", 'r', encoding='utf-8') as protocol_file:
+                self.assertEqual(yaml.safe_load(protocol_file)['web'][0]['TestNr'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import unittest
+from ant_backend import AnsibleManager, ProbeResult, ResultTable, Testcase
+from ant_backend.benchmarks import FakeRunner
+from ant_backend.planner import ProbePlan
+from ant_backend.tests.lab import SimulatorLab
+
+class PlannerTest(SimulatorLab):
+
+    def setUp(self):
+        super().setUp()
+        # the same probes as web and ping_fw, partly and in full
+        self.testconfig.testcases.append(Testcase('web_2', 'hqclient', 'hqsrv', 'tcp',
+                                                  d_port=[22, 443]))
+        self.testconfig.testcases.append(Testcase('ping_fw_2', 'hqclient', 'hqfw', 'icmp'))
+
+    def test_plan(self):
+        plan = ProbePlan()
+        self.assertListEqual(plan.add(('a', 'one'), 'tcp', [('x', 1), ('x', 2)]),
+                             [('x', 1), ('x', 2)])
+        self.assertListEqual(plan.add(('a', 'two'), 'tcp', [('x', 2), ('y', 1)]), [('y', 1)])
+        self.assertListEqual(plan.add(('b', 'three'), 'tcp', [('x', 1)]), [('x', 1)])
+        self.assertEqual(plan.saved(), 1)
+
+        table = ResultTable()
+        table.extend([ProbeResult('a', 'one', 0, rc=0), ProbeResult('a', 'one', 1, rc=1),
+                      ProbeResult('a', 'two', 0, rc=0)])
+        fanned = plan.fan_out(table)
+        self.assertListEqual([(result.rc, result.shared) for result in fanned.get('a', 'two')],
+                             [(1, 'one'), (0, None)])
+        self.assertEqual(fanned.get('a', 'two')[0].record()['shared'], 'one')
+
+        # two is only done once one is
+        self.assertListEqual(plan.collect(('a', 'two'), [ProbeResult('a', 'two', 0, rc=0)]), [])
+        ready = plan.collect(('a', 'one'), [ProbeResult('a', 'one', 0, rc=0),
+                                            ProbeResult('a', 'one', 1, rc=1)])
+        self.assertListEqual([(key, [result.index for result in results])
+                              for key, results in ready],
+                             [(('a', 'one'), [0, 1]), (('a', 'two'), [0, 1])])
+        self.assertListEqual([key for key, _ in plan.flush()], [])
+
+    def run_manager(self, stream):
+        runner_dir = self.runner_dir()
+        manager = AnsibleManager('mapping.yml', runner_dir)
+        manager.create_inventory(os.path.join(runner_dir, 'inventory', 'inventory.yml'),
+                                 self.netconfig, self.testconfig)
+        finished = {}
+        on_test = (lambda m, t, r: finished.setdefault(t, r)) if stream else None
+        with self.fake_runner(FakeRunner(success=0.5)):
+            results = manager.run(0, stream, on_test)
+        return manager, finished if stream else {key[1]: row for key, row in results.rows.items()}
+
+    def test_manager(self):
+        manager, results = self.run_manager(stream=False)
+        self.assertNotIn('hqclient-ping_fw_2', manager.inventory['icmp']['hosts'])
+        self.assertListEqual(manager.inventory['tcp']['hosts']['hqclient-web_2']['probes'],
+                             [['172.16.1.10', 443]])
+        self.assertEqual(manager.plan.saved(), 3)
+
+        _, streamed = self.run_manager(stream=True)
+        for name, row in (('web', results['web']), ('web_2', results['web_2']),
+                          ('ping_fw_2', results['ping_fw_2'])):
+            self.assertListEqual([result.record() for result in streamed[name]],
+                                 [result.record() for result in row])
+        self.assertListEqual([result.cmd for result in results['web_2']],
+                             ['nc -zv -w5 172.16.1.10 22', 'nc -zv -w5 172.16.1.10 443'])
+        self.assertEqual(results['web_2'][0].rc, results['web'][1].rc)
+        self.assertListEqual([result.shared for result in results['ping_fw_2']],
+                             ['ping_fw', 'ping_fw'])
+
+
+if __name__ == '__main__':
+    unittest.main()
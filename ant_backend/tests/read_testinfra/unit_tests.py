@@ -34,6 +34,27 @@ class UnitTest(unittest.TestCase):
         with self.assertRaises(KeyError):
             testconfig.load_from_yaml("ant_backend/tests/read_testinfra/infra_missing_network_value.yml")
             testconfig.load_from_yaml("ant_backend/tests/read_testinfra/infra_missing_machine_value.yml")
+    def test_resolve(self):
+        config = NetworkConfiguration()
+        config.add_networks("lan", 24, "192.168.0.0")
+        config.add_networks("lan6", 64, "2001:db8::")
+        config.add_machine("fw", ["192.168.0.254", "192.168.0.1"], "10.0.0.1", "toor", "toor123")
+        config.add_machine("client", ["192.168.0.10"], "10.0.0.2", "toor", "toor123")
+        config.add_machine("client6", ["2001:db8::10"], "10.0.0.3", "toor", "toor123")
+
+        self.assertListEqual(config.resolve("192.168.0.0/24"),
+                             ["192.168.0.254", "192.168.0.1", "192.168.0.10"])
+        self.assertListEqual(config.resolve("lan6"), ["2001:0db8:0000:0000:0000:0000:0000:0010"])
+        self.assertListEqual(config.resolve("fw"), ["192.168.0.254", "192.168.0.1"])
+        self.assertListEqual(config.resolve("10.1.1.1"), ["10.1.1.1"])
+        self.assertIs(config.resolve("lan"), config.resolve("lan"))
+        with self.assertRaises(ValueError):
+            config.resolve("10.0.0.0/8")
+        with self.assertRaises(ValueError):
+            config.resolve("unknown")
+
+        config.add_machine("srv", ["192.168.0.20"], "10.0.0.4", "toor", "toor123")
+        self.assertIn("192.168.0.20", config.resolve("lan"))
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,71 @@
+import tempfile
+import unittest
+from unittest import mock
+from ant_backend import AnsibleManager, NetworkConfiguration, ResultCache, Testcase, \
+    TestcaseConfiguration
+from ant_backend.grading import lookup_cached
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = AnsibleManager('mapping.yml')
+        self.netconfig = NetworkConfiguration()
+        self.netconfig.load_from_yaml('ant_backend/tests/simulator/infra.yml')
+        self.testconfig = TestcaseConfiguration()
+        self.testconfig.load_from_yaml('ant_backend/tests/simulator/tests.yml')
+
+    def test_store(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ResultCache(cache_dir)
+            self.assertIsNone(cache.get('abc'))
+            cache.put('abc', [{'rc': 0, 'unreachable': False}])
+            self.assertListEqual(cache.get('abc'), [{'rc': 0, 'unreachable': False}])
+            cache.put('def', [{'rc': None, 'unreachable': True}])
+            self.assertIsNone(cache.get('def'))
+
+    def test_fingerprint(self):
+        web, ping_fw, dns = self.testconfig.testcases
+        before = [self.manager.fingerprint(testcase, self.netconfig)
+                  for testcase in (web, ping_fw, dns)]
+        self.assertEqual(len(set(before)), 3)
+        self.assertEqual(before[0], self.manager.fingerprint(web, self.netconfig))
+
+        # ping_fw from hqclient to hqfw does not pass hqsrv
+        self.netconfig.machines['hqsrv'].nftable = 'ant_backend/tests/validate_nft/valid.nft'
+        after = [self.manager.fingerprint(testcase, self.netconfig)
+                 for testcase in (web, ping_fw, dns)]
+        self.assertNotEqual(before[0], after[0])
+        self.assertEqual(before[1], after[1])
+        self.assertNotEqual(before[2], after[2])
+
+        web.d_port = [443]
+        self.assertNotEqual(after[0], self.manager.fingerprint(web, self.netconfig))
+
+    def test_external_destination(self):
+        external = Testcase('external_dns', 'hqclient', '203.0.113.1', 'tcp', d_port=[53])
+        self.assertEqual(len(self.manager.fingerprint(external, self.netconfig)), 64)
+
+    def test_lookup(self):
+        web, ping_fw, dns = self.testconfig.testcases
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ResultCache(cache_dir)
+            cache.put(self.manager.fingerprint(web, self.netconfig),
+                      [{'rc': 0, 'unreachable': False}])
+            # a testcase that can not be fingerprinted is run
+            with mock.patch.object(self.manager, 'fingerprint', side_effect=[
+                    self.manager.fingerprint(web, self.netconfig), OSError('unreadable'),
+                    'unknown']):
+                to_run, cached, fingerprints = lookup_cached(self.manager, self.netconfig,
+                                                             self.testconfig, cache)
+        self.assertListEqual(to_run.testcases, [ping_fw, dns])
+        self.assertListEqual([result.rc for result in cached[('hqclient', 'web')]], [0])
+        self.assertIsNone(fingerprints[('hqclient', 'ping_fw')])
+
+        # anything else is a bug and not hidden
+        with mock.patch.object(self.manager, 'fingerprint', side_effect=AttributeError('bug')):
+            with self.assertRaises(AttributeError):
+                lookup_cached(self.manager, self.netconfig, self.testconfig, cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
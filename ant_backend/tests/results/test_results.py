@@ -0,0 +1,43 @@
+import unittest
+from ant_backend import Logger, ProbeResult, ResultTable, Testcase
+from ant_backend.grading import score_testcase
+
+class ResultTableTest(unittest.TestCase):
+
+    def test_table(self):
+        table = ResultTable()
+        table.add(ProbeResult('br-fw', 'web-1', 1, rc=1))
+        table.add(ProbeResult('br-fw', 'web-1', 0, rc=0, cmd='nc -zv -w5 10.0.0.1 80'))
+        table.add(ProbeResult('br-fw', 'web', 0, rc=0))
+
+        self.assertEqual(len(table), 3)
+        self.assertListEqual([result.index for result in table.get('br-fw', 'web-1')], [0, 1])
+        self.assertListEqual(table.get('br', 'fw-web-1'), [])
+        self.assertEqual(len(table.get('br-fw', 'web')), 1)
+
+    def test_record(self):
+        result = ProbeResult.from_res('hqfw', 'ping', 0, {'rc': 0, 'cmd': ['ping', '-c', '4'],
+                                                          'stdout_lines': ['pong']}, cached=True)
+        with self.assertRaises(AttributeError):
+            result.extra = 1
+        self.assertDictEqual(result.record(), {
+            'stdout_lines': ['pong'], 'stderr_lines': [], 'rc': 0, 'start': None, 'end': None,
+            'delta': None, 'msg': None, 'cmd': 'ping -c 4', 'unreachable': False, 'duration': None,
+            'cached': True
+        })
+
+    def test_scoring(self):
+        logger = Logger()
+        testcase = Testcase('web', 'hqclient', 'hqsrv', 'tcp', d_port=[80, 22], points=2)
+        results = [ProbeResult('hqclient', 'web', 0, rc=0), ProbeResult('hqclient', 'web', 1, rc=1)]
+
+        points = score_testcase(testcase, results)
+        self.assertEqual(points, 1)
+        logger.add_test_event(results, points, testcase)
+        self.assertListEqual([event['TestNr'] for event in logger.protocol['web']], [0, 1])
+        self.assertEqual(logger.protocol['web'][1]['Executing Machine'], 'hqclient')
+        self.assertEqual(logger.results['General']['Tests'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from ant_backend import Logger, ProbeResult, ResultsStore, Testcase
+from ant_backend.results_store import results_store
+
+class ResultsStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.store = ResultsStore(os.path.join(self.dir, 'results.sqlite'))
+        self.testcase = Testcase('web', 'hqclient', 'webserver', 'tcp', d_port=[80, 443],
+                                 points=2)
+
+    def results(self, rcs, name='web'):
+        return [ProbeResult('hqclient', name, n, rc=rc, cmd=f"nc -z 10.0.0.1 {port}",
+                            delta='0:00:01.500000', timed_out=rc is None)
+                for n, (rc, port) in enumerate(zip(rcs, [80, 443]))]
+
+    def grade(self, name, rcs):
+        logger = Logger(run=self.store.begin_run(name, 'infra.yml', 'tests.yml'))
+        logger.store_setup('hqfw', {'rc': 0, 'unreachable': False, 'unchanged': True})
+        logger.add_test_event(self.results(rcs), rcs.count(0), self.testcase)
+        logger.write(self.dir, os.path.join(self.dir, f"{name}.json"))
+
+    def test_run(self):
+        self.grade('alice', [0, 1])
+        run, = self.store.runs()
+        self.assertEqual(run['name'], 'alice')
+        self.assertEqual(run['infra'], 'infra.yml')
+        self.assertEqual(run['tests'], 2)
+        self.assertEqual(run['points_reached'], 1)
+        self.assertEqual(run['points_possible'], 2)
+        self.assertEqual(run['report'], os.path.join(self.dir, 'alice.json'))
+        self.assertIsNotNone(run['finished'])
+
+        probes = self.store.query("SELECT * FROM probes ORDER BY idx")
+        self.assertEqual([probe['outcome'] for probe in probes], ['ok', 'failed'])
+        self.assertEqual([probe['duration'] for probe in probes], [1.5, 1.5])
+        self.assertEqual(probes[0]['protocol'], 'tcp')
+        testcase, = self.store.query("SELECT * FROM testcases")
+        self.assertEqual((testcase['machine'], testcase['outcome']), ('hqclient', 'partial'))
+        setup, = self.store.query("SELECT * FROM setup_events")
+        self.assertEqual((setup['machine'], setup['outcome']), ('hqfw', 'unchanged'))
+
+    def test_failures(self):
+        self.grade('alice', [1, 1])
+        self.grade('alice', [0, 0])
+        self.grade('alice', [None, 0])
+        self.grade('bob', [1, 1])
+        failures, = self.store.failures('alice', 2)
+        self.assertEqual((failures['testcase'], failures['runs'], failures['partial']),
+                         ('web', 1, 1))
+        failures, = self.store.failures('alice')
+        self.assertEqual((failures['runs'], failures['failed']), (2, 1))
+        self.assertEqual(len(self.store.runs('%')), 4)
+        self.assertEqual(self.store.query("SELECT COUNT(*) AS n FROM probes "
+                                          "WHERE outcome = 'timed_out'"), [{'n': 1}])
+
+    def test_slowest(self):
+        self.grade('alice', [0, 0])
+        self.grade('bob', [0, 0])
+        slowest = self.store.slowest(1)
+        self.assertEqual(len(slowest), 1)
+        self.assertEqual((slowest[0]['runs'], slowest[0]['mean']), (2, 1.5))
+        self.assertEqual(self.store.slowest(protocol='udp'), [])
+
+    def test_batches(self):
+        run = self.store.begin_run('alice')
+        with mock.patch.object(results_store, 'BATCH', 4):
+            run.add_testcase(self.testcase, 2, self.results([0, 0]))
+            self.assertEqual(self.store.query("SELECT * FROM probes"), [])
+            run.add_testcase(self.testcase, 2, self.results([0, 0]))
+            # a full batch is written at once
+            self.assertEqual(len(self.store.query("SELECT * FROM probes")), 4)
+            run.add_setup('hqfw', {'rc': 1, 'unreachable': False})
+            self.assertEqual(self.store.query("SELECT * FROM setup_events"), [])
+        run.finish({'General': {'Tests': 4}})
+        run.close()
+        setup, = self.store.query("SELECT * FROM setup_events")
+        self.assertEqual(setup['outcome'], 'failed')
@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+import yaml
+from ant_backend import AnsibleManager, SetupCache
+from ant_backend.result_cache import file_hash
+from ant_backend.tests.lab import SimulatorLab
+
+class SetupCacheTest(SimulatorLab):
+
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.cache = SetupCache(self.cache_dir)
+        # hqclient runs on the same host as hqfw and loads the same script
+        self.netconfig.machines['hqclient'].management_ip = \
+            self.netconfig.machines['hqfw'].management_ip
+        self.netconfig.machines['hqclient'].nftable = self.netconfig.machines['hqfw'].nftable
+
+    def test_get_put(self):
+        key = SetupCache.key('10.0.0.1', 'abc')
+        self.assertNotEqual(key, SetupCache.key('10.0.0.2', 'abc'))
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, 'f00')
+        self.assertEqual(self.cache.get(key), 'f00')
+        self.assertEqual(SetupCache(self.cache_dir).get(key), 'f00')
+
+    def run_setup(self):
+        runner_dir = self.runner_dir()
+        manager = AnsibleManager('mapping.yml', runner_dir, setup_cache=self.cache)
+        path = os.path.join(runner_dir, 'inventory', 'setup.yml')
+        manager.create_nft_inventory(path, self.netconfig)
+        with open(path, 'r', encoding='utf-8') as inventory_file:
+            hosts = yaml.safe_load(inventory_file)['setup']['hosts']
+        with self.fake_runner():
+            results = manager.execute_playbook('setup.yml')
+        return hosts, results
+
+    def test_shared_host(self):
+        hosts, results = self.run_setup()
+        self.assertListEqual(list(hosts), ['hqfw'])
+        self.assertNotIn('active_checksum', hosts['hqfw'])
+        self.assertSetEqual(set(results.setup), {'hqfw', 'hqclient'})
+        self.assertEqual(results.setup['hqclient']['shared'], 'hqfw')
+        self.assertEqual(results.setup['hqclient']['rc'], 0)
+        self.assertNotIn('unchanged', results.setup['hqfw'])
+
+    def test_unchanged(self):
+        _, first = self.run_setup()
+        hosts, second = self.run_setup()
+        self.assertEqual(hosts['hqfw']['active_checksum'], first.setup['hqfw']['active_checksum'])
+        self.assertTrue(second.setup['hqfw']['unchanged'])
+        self.assertEqual(second.setup['hqfw']['rc'], 0)
+        self.assertFalse(second.setup['hqfw']['unreachable'])
+        self.assertTrue(second.setup['hqclient']['unchanged'])
+
+    def test_changed_ruleset(self):
+        _, first = self.run_setup()
+        # the ruleset was changed on the machine since it was loaded
+        script = file_hash(self.netconfig.machines['hqfw'].nftable)
+        self.cache.put(SetupCache.key('10.0.0.1', script), '0' * 64)
+        _, second = self.run_setup()
+        self.assertNotIn('unchanged', second.setup['hqfw'])
+        self.assertEqual(second.setup['hqfw']['active_checksum'],
+                         first.setup['hqfw']['active_checksum'])
+
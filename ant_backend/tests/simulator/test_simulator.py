@@ -0,0 +1,65 @@
+import ipaddress
+import unittest
+from ant_backend import NetworkConfiguration, Simulator, Testcase, TestcaseConfiguration
+
+class SimulatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.netconfig = NetworkConfiguration()
+        self.netconfig.load_from_yaml('ant_backend/tests/simulator/infra.yml')
+        self.testconfig = TestcaseConfiguration()
+        self.testconfig.load_from_yaml('ant_backend/tests/simulator/tests.yml')
+        self.simulator = Simulator(self.netconfig)
+
+    def test_path(self):
+        machines = self.netconfig.machines
+        hops = self.netconfig.path(machines['hqclient'], machines['hqsrv'].ip_addresses[0])
+        self.assertListEqual([(machine.name, hook) for machine, hook in hops],
+                             [('hqclient', 'output'), ('hqfw', 'forward'), ('hqsrv', 'input')])
+
+    def test_verdict(self):
+        client = self.netconfig.machines['hqclient']
+        accepted, trace, exact = self.simulator.verdict(client, '172.16.1.10', 'tcp', 80)
+        self.assertTrue(accepted)
+        self.assertTrue(exact)
+        self.assertListEqual(trace, ['hqfw forward: accept (rule 11 in chain from_lan)'])
+
+        accepted, trace, _ = self.simulator.verdict(client, '172.16.1.10', 'udp', 1500)
+        self.assertTrue(accepted)
+
+        accepted, trace, _ = self.simulator.verdict(client, '172.16.1.10', 'tcp', 22)
+        self.assertFalse(accepted)
+        self.assertListEqual(trace, ['hqfw forward: reject (rule 10 in chain forward)'])
+
+        accepted, _, _ = self.simulator.verdict(client, '2001:db8::1', 'icmp')
+        self.assertFalse(accepted)
+
+    def test_run(self):
+        results = self.simulator.run(self.testconfig, self.netconfig.resolve)
+
+        self.assertListEqual(list(results.rows), [('hqclient', 'web'), ('hqclient', 'ping_fw'),
+                                                  ('hqsrv', 'dns')])
+        self.assertListEqual([result.rc for result in results], [0, 1, 0, 0, 1])
+        self.assertEqual(results.get('hqclient', 'web')[1].cmd, 'nc -zv -w5 172.16.1.10 22')
+        self.assertEqual(results.get('hqsrv', 'dns')[0].cmd, 'dig @172.16.0.10 port=53')
+
+
+    def test_external_destination(self):
+        # no machine owns the address, the packet only leaves through the firewall
+        client = self.netconfig.machines['hqclient']
+        hops = self.netconfig.path(client, ipaddress.ip_address('203.0.113.1'))
+        self.assertListEqual([(machine.name, hook) for machine, hook in hops],
+                             [('hqclient', 'output'), ('hqfw', 'forward')])
+
+        testconfig = TestcaseConfiguration()
+        testconfig.testcases.append(Testcase('external_dns', 'hqclient', '203.0.113.1', 'tcp',
+                                             d_port=[53], points=1))
+        results = self.simulator.run(testconfig, self.netconfig.resolve)
+        result, = results.get('hqclient', 'external_dns')
+        self.assertEqual(result.cmd, 'nc -zv -w5 203.0.113.1 53')
+        self.assertEqual(result.rc, 1)
+        self.assertListEqual(list(result.stdout_lines),
+                             ['hqfw forward: reject (rule 10 in chain forward)'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,26 @@ from ant_backend.tests.validate_nft.test_validate_nft import NftScriptTest
 from ant_backend.tests.read_testinfra.unit_tests import UnitTest
 from ant_backend.tests.read_testcases.unittests_read_testcases import TestTestcaseConfiguration
 from ant_backend.tests.ansible_manager.test_ansible_manager import AnsibleManagerTest
+from ant_backend.tests.batch.test_batch import BatchTest
+from ant_backend.tests.simulator.test_simulator import SimulatorTest
+from ant_backend.tests.result_cache.test_result_cache import ResultCacheTest
+from ant_backend.tests.results.test_results import ResultTableTest
+from ant_backend.tests.logger.test_logger import LoggerTest
+from ant_backend.tests.config_cache.test_config_cache import ConfigCacheTest
+from ant_backend.tests.check.test_check import CheckTest
+from ant_backend.tests.benchmarks.test_benchmarks import BenchmarkTest
+from ant_backend.tests.timing.test_timing import TimingTest
+from ant_backend.tests.latency.test_latency import LatencyTest
+from ant_backend.tests.daemon.test_daemon import DaemonTest
+from ant_backend.tests.lab_pool.test_lab_pool import LabPoolTest
+from ant_backend.tests.deadlines.test_deadlines import DeadlinesTest
+from ant_backend.tests.planner.test_planner import PlannerTest
+from ant_backend.tests.setup_cache.test_setup_cache import SetupCacheTest
+from ant_backend.tests.executors.test_executors import ExecutorTest
+from ant_backend.tests.results_store.test_results_store import ResultsStoreTest
+from ant_backend.tests.ansible_manager.test_retries import RetryTest
+from ant_backend.tests.watch.test_watch import WatchTest
+from ant_backend.tests.disk_cache.test_disk_cache import DiskCacheTest
 
 if __name__ == '__main__':
     main(verbosity=2)
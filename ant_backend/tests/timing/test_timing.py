@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+import yaml
+from unittest import mock
+from ant_backend import Logger, Timer
+from ant_backend.timing import write_prometheus
+
+class TimingTest(unittest.TestCase):
+
+    def test_timer(self):
+        timer = Timer()
+        with mock.patch('time.monotonic', side_effect=[10.0, 12.5, 20.0, 21.0, 30.0, 39.0]):
+            with timer.phase('setup'):
+                pass
+            with timer.playbook('tcp_playbook.yml'):
+                pass
+            with self.assertRaises(TimeoutError):
+                with timer.playbook('tcp_playbook.yml'):
+                    raise TimeoutError()
+
+        self.assertDictEqual(timer.phases, {'setup': 2.5})
+        self.assertDictEqual(timer.playbooks, {'tcp_playbook.yml': 10.0})
+
+    def test_report(self):
+        timer = Timer()
+        with timer.phase('scoring'):
+            pass
+        logger = Logger(timer=timer)
+        with tempfile.TemporaryDirectory() as tmp:
+            logger.write(tmp, f"{tmp}/report.yml", f"{tmp}/protocol.yml")
+            with open(f"{tmp}/report.yml", 'r', encoding='utf-8') as report_file:
+                timing = yaml.safe_load(report_file)['Timing']
+
+            write_prometheus(f"{tmp}/ant.prom", [({'submission': 'a"b'}, timer)])
+            with open(f"{tmp}/ant.prom", 'r', encoding='utf-8') as metrics_file:
+                metrics = metrics_file.read().splitlines()
+            self.assertListEqual(sorted(os.listdir(tmp)),
+                                 ['ant.prom', 'protocol.yml', 'report.yml'])
+
+        self.assertListEqual(sorted(timing['Phases']), ['scoring', 'write_protocol'])
+        self.assertDictEqual(timing['Playbooks'], {})
+        self.assertGreaterEqual(timing['Total'], timing['Phases']['scoring'])
+        self.assertIn('# TYPE ant_phase_duration_seconds gauge', metrics)
+        self.assertTrue(any(line.startswith(
+            'ant_phase_duration_seconds{submission="a\'b",phase="scoring"} ') for line in metrics))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
 """a quick test for the script validator"""
+import tempfile
 import unittest
-from ant_backend import validate_script
+from unittest import mock
+from ant_backend import validate_script, validate_scripts, ValidationCache
 
 class NftScriptTest(unittest.TestCase):
     def setUp(self):
@@ -18,6 +20,31 @@ class NftScriptTest(unittest.TestCase):
         self.assertTupleEqual((['Error: syntax error, unexpected string\n'],error),
                               validate_script(self.invalid_file))
 
+    def test_validate_scripts(self):
+        error = ('ant_backend/tests/validate_nft/invalid.nft:24:6-11: Error: syntax error,'
+        ' unexpected string\n\t\tct states established counter accept #error here\n\t\t   ^^^^^^\n')
+        results = validate_scripts([self.invalid_file, self.valid_file, self.invalid_file])
+        # every distinct script once, in the order it is first given
+        self.assertListEqual(list(results), [self.invalid_file, self.valid_file])
+        self.assertTupleEqual(results[self.valid_file], (None, None))
+        self.assertTupleEqual(results[self.invalid_file],
+                              (['Error: syntax error, unexpected string\n'], error))
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ValidationCache(cache_dir)
+            key = cache.key(self.invalid_file)
+            self.assertIsNone(cache.key(""))
+            self.assertIsNone(cache.get(key, self.invalid_file))
+
+            cache.put(key, self.invalid_file, (['Error: x\n'], f"{self.invalid_file}:1: Error: x\n"))
+            self.assertTupleEqual(cache.get(key, 'copy.nft'), (['Error: x\n'], "copy.nft:1: Error: x\n"))
+
+            with mock.patch('ant_backend.valdiate_nft.validate_nft.NFT') as nft:
+                self.assertTupleEqual(validate_script(self.invalid_file, cache),
+                                      (['Error: x\n'], f"{self.invalid_file}:1: Error: x\n"))
+                nft.cmd_from_file.assert_not_called()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from ant_backend import ProbeResult, Testcase, Watcher
+from ant_backend.watch import WatchLogger
+
+class WatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.script = os.path.join(self.dir, 'fw.nft')
+        self.tests = os.path.join(self.dir, 'tests.yml')
+        for path in (self.script, self.tests):
+            self.write(path, 'table inet filter {}\n')
+
+    def write(self, path, content):
+        with open(path, 'w', encoding='utf-8') as watched_file:
+            watched_file.write(content)
+
+    def replace(self, path, content):
+        # like an editor saving to a new file and renaming it
+        self.write(f"{path}.swp", content)
+        os.replace(f"{path}.swp", path)
+
+    def check(self, watcher):
+        self.addCleanup(watcher.close)
+        self.assertListEqual(watcher.wait(timeout=0.05), [])
+        # the same content again is no change
+        self.write(self.script, 'table inet filter {}\n')
+        self.assertListEqual(watcher.wait(timeout=0.05), [])
+
+        threading.Timer(0.05, self.write, (self.script, 'table inet nat {}\n')).start()
+        self.assertListEqual(watcher.wait(timeout=5), [self.script])
+        threading.Timer(0.05, self.replace, (self.tests, '- Name: web\n')).start()
+        self.assertListEqual(watcher.wait(timeout=5), [self.tests])
+
+        # files no longer watched are not reported
+        watcher.watch([self.tests])
+        self.write(self.script, 'table ip filter {}\n')
+        self.assertListEqual(watcher.wait(timeout=0.05), [])
+
+    def test_polling(self):
+        # settling lets a write truncating the file finish before it is hashed
+        watcher = Watcher([self.script, self.tests], interval=0.01, settle=0.05, inotify=False)
+        self.assertEqual(watcher.mode, 'polling')
+        self.check(watcher)
+
+    def test_inotify(self):
+        watcher = Watcher([self.script, self.tests], settle=0.05)
+        if watcher.mode != 'inotify':
+            watcher.close()
+            self.skipTest("inotify is not available")
+        self.check(watcher)
+
+    def test_logger(self):
+        testcase = Testcase('web', 'hqclient', 'hqsrv', 'tcp', d_port=[80], points=2)
+        cached = Testcase('dns', 'hqsrv', 'hqfw', 'udp', points=1)
+        logger = WatchLogger(previous={'web': 2})
+        with mock.patch('builtins.print') as printed:
+            logger.add_test_event([ProbeResult('hqclient', 'web', 0, rc=1)], 0, testcase)
+            logger.add_test_event([ProbeResult('hqsrv', 'dns', 0, rc=0, cached=True)], 1,
+                                  cached)
+        printed.assert_called_once_with("web: 0/2 points (was 2)")
+        self.assertDictEqual(logger.points(), {'web': 0, 'dns': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
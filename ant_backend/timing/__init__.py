@@ -0,0 +1 @@
+from .timing import Timer, write_prometheus
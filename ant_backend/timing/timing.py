@@ -0,0 +1,97 @@
+"""
+Module: timing.py
+
+Wall clock timings of the phases of a run and of every playbook it executes, taken with
+a monotonic clock. The timings are added to the results as the Timing section and can be
+exported as a Prometheus textfile for the node exporter.
+"""
+
+import time
+from contextlib import contextmanager
+from ant_backend.disk_cache import atomic_write
+
+class Timer(object):
+    """
+    Collects the seconds spent in named phases and playbooks, repeated names add up
+    """
+    def __init__(self):
+        self.started = time.monotonic()
+        self.finished = None
+        self.phases = {}
+        self.playbooks = {}
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Times the phase name of the run
+        """
+        with self._measure(self.phases, name):
+            yield
+
+    @contextmanager
+    def playbook(self, name):
+        """
+        Times a single execution of the playbook name
+        """
+        with self._measure(self.playbooks, name):
+            yield
+
+    @contextmanager
+    def _measure(self, timings, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            timings[name] = timings.get(name, 0) + time.monotonic() - start
+
+    def finish(self):
+        """
+        Ends the run, elapsed does not grow any further
+        """
+        self.finished = time.monotonic()
+
+    def elapsed(self):
+        """
+        Returns the seconds from creating the Timer to finish or until now
+        """
+        return (self.finished or time.monotonic()) - self.started
+
+    def section(self):
+        """
+        Returns the timings as written to the Timing section of the results
+        """
+        return {'Total': round(self.elapsed(), 6),
+                'Phases': {name: round(seconds, 6) for name, seconds in self.phases.items()},
+                'Playbooks': {name: round(seconds, 6)
+                              for name, seconds in self.playbooks.items()}}
+
+def _labels(labels:dict):
+    if not labels:
+        return ''
+    return "{" + ",".join(f'{key}="{str(value).replace(chr(34), chr(39))}"'
+                          for key, value in labels.items()) + "}"
+
+def write_prometheus(path:str, timers:list):
+    """
+    Writes the timings of timers as a Prometheus textfile, timers is a list of
+      (labels, Timer) with labels a dictionary added to every sample of the Timer
+    The file is replaced atomically, so the node exporter never reads a partial file.
+    """
+    metrics = (
+        ('ant_phase_duration_seconds', 'Wall clock time of a phase of the last ant run',
+         'phase', 'phases'),
+        ('ant_playbook_duration_seconds', 'Wall clock time of a playbook in the last ant run',
+         'playbook', 'playbooks')
+    )
+    lines = ["# HELP ant_run_duration_seconds Wall clock time of the last ant run",
+             "# TYPE ant_run_duration_seconds gauge"]
+    for labels, timer in timers:
+        lines.append(f"ant_run_duration_seconds{_labels(labels)} {timer.elapsed():.6f}")
+    for metric, description, label, attribute in metrics:
+        lines += [f"# HELP {metric} {description}", f"# TYPE {metric} gauge"]
+        for labels, timer in timers:
+            for name, seconds in getattr(timer, attribute).items():
+                lines.append(f"{metric}{_labels(dict(labels, **{label: name}))} {seconds:.6f}")
+
+    # the exporter may run as another user
+    atomic_write(path, "\n".join(lines) + "\n", mode=0o644)
@@ -1 +1 @@
-from .validate_nft import validate_script
\ No newline at end of file
+from .validate_nft import validate_script, validate_scripts, ValidationCache
@@ -1,20 +1,153 @@
 """Uses the nftables library to validate a given nftables script"""
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from importlib import metadata
 from re import findall
-from nftables import Nftables
+from threading import Lock
+from ant_backend.disk_cache import DiskCache
 
 REGEX =  r"(?!Error: Could not process rule: Operation not permitted\n)(Error:.*\n)"
-NFT = Nftables()
+# created on first use, importing the binding and initializing libnftables takes a while
+NFT = None
+# the libnftables context is not thread safe, batch grading validates from several threads
+NFT_LOCK = Lock()
+# stands in for the path of a script in cached error messages
+PATH_MARKER = "\0script\0"
 
-def validate_script(file:str):
+def validate_script(file:str, cache=None):
     """Validates a given nftables script
     Returns:
         None if the script is a valid nftables-script
         errors, error otherwise [errors]: List of nft-syntax errors,[error]: Full string Error message as returned by nftables
     """
-    NFT.set_dry_run(onoff='on')
-    _, _, error = NFT.cmd_from_file(file)
+    key = cache.key(file) if cache is not None else None
+    if key is not None:
+        cached = cache.get(key, file)
+        if cached is not None:
+            return cached
+
+    with NFT_LOCK:
+        nft = _nft()
+        nft.set_dry_run(onoff='on')
+        _, _, error = nft.cmd_from_file(file)
+    result = _parse_errors(error)
+
+    if key is not None:
+        cache.put(key, file, result)
+    return result
+
+def validate_scripts(files, cache=None, workers=None):
+    """Validates several nftables scripts at once
+    Every distinct script is checked only once, scripts missing from the cache are checked
+      in parallel by a pool of processes, each with its own Nftables instance.
+    Returns:
+        a dictionary {file: (errors, error)} as returned by validate_script
+    """
+    results = {}
+    todo = {}
+    for file in dict.fromkeys(files):
+        key = cache.key(file) if cache is not None else None
+        cached = cache.get(key, file) if key is not None else None
+        if cached is not None:
+            results[file] = cached
+        else:
+            # scripts with the same content are only validated once
+            todo.setdefault(key or file, []).append(file)
+
+    if len(todo) > 1:
+        # spawn instead of fork, ant may already run several threads in batch mode
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            checked = list(pool.map(_validate_in_worker, [paths[0] for paths in todo.values()]))
+    else:
+        checked = [validate_script(paths[0]) for paths in todo.values()]
+
+    for (key, paths), (errors, error) in zip(todo.items(), checked):
+        for file in paths:
+            if error is not None:
+                results[file] = errors, error.replace(paths[0], file)
+            else:
+                results[file] = errors, error
+        if cache is not None and key != paths[0]:
+            cache.put(key, paths[0], results[paths[0]])
+
+    return {file: results[file] for file in files}
+
+def _nft():
+    global NFT
+    if NFT is None:
+        from nftables import Nftables
+        NFT = Nftables()
+    return NFT
+
+def _parse_errors(error):
     errors = findall(REGEX, error)
 
     if not errors:
         return None, None
     return errors, error
+
+_WORKER_NFT = None
+
+def _init_worker():
+    global _WORKER_NFT
+    from nftables import Nftables
+    _WORKER_NFT = Nftables()
+    _WORKER_NFT.set_dry_run(onoff='on')
+
+def _validate_in_worker(file):
+    _, _, error = _WORKER_NFT.cmd_from_file(file)
+    return _parse_errors(error)
+
+def nft_version():
+    """Returns the version of the nftables library in use"""
+    import nftables
+    try:
+        return metadata.version('nftables')
+    except metadata.PackageNotFoundError:
+        return str(getattr(nftables, 'NFTABLES_VERSION', 'unknown'))
+
+class ValidationCache(DiskCache):
+    """
+    On-disk cache of validation results keyed by the content hash of a script
+      and the version of the nftables library
+    """
+    name = 'nft'
+
+    def __init__(self, path=None):
+        super().__init__(path)
+        self.version = nft_version()
+
+    def key(self, file):
+        """
+        Returns the cache key for a script or None if the script can not be read
+        """
+        try:
+            with open(file, 'rb') as script:
+                digest = hashlib.sha256(script.read())
+        except OSError:
+            return None
+        digest.update(self.version.encode())
+        return digest.hexdigest()
+
+    def get(self, key, file):
+        """
+        Returns the cached result for key with error messages pointing to file or None
+        """
+        try:
+            errors, error = self.load(key)
+        except (TypeError, ValueError):
+            return None
+        if error is not None:
+            error = error.replace(PATH_MARKER, file)
+        return errors, error
+
+    def put(self, key, file, result):
+        """
+        Stores the result of validating file under key
+        """
+        errors, error = result
+        if error is not None:
+            error = error.replace(file, PATH_MARKER)
+        self.store(key, [errors, error])
@@ -0,0 +1 @@
+from .watch import POLL_INTERVAL, Watcher, WatchLogger
@@ -0,0 +1,215 @@
+"""
+Module: watch.py
+
+Watch mode: the infra file, the testcase file and the NFTable scripts are watched while a
+student edits them and every change is graded right away. Only what a change affects is done
+again: the scripts are validated through the ValidationCache, so only changed scripts are
+validated, only the machines whose script changed are set up and only the testcases whose
+fingerprint changed, those whose probes pass a changed machine, are run again.
+
+Changes are noticed with inotify on Linux and by polling the files everywhere else.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import time
+from ant_backend import Logger
+from ant_backend.result_cache import file_hash
+
+# seconds between two checks of the files when polling
+POLL_INTERVAL = 1
+# seconds to wait after a change for the editor to finish writing before grading
+SETTLE = 0.2
+
+# the inotify events of a directory that may change the content of a file in it
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | \
+    IN_DELETE
+
+class Inotify(object):
+    """
+    An inotify instance watching directories through libc, its events are only used to wake
+      up, not parsed
+    Raises:
+        OSError if inotify is not available
+    """
+    def __init__(self):
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            init = self.libc.inotify_init1
+        except (OSError, AttributeError) as err:
+            raise OSError("inotify is not available") from err
+        self.fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories = set()
+
+    def watch(self, directory):
+        """
+        Watches the files in directory
+        """
+        if directory in self.directories:
+            return
+        if self.libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_MASK) < 0:
+            raise OSError(ctypes.get_errno(), f"can not watch {directory}")
+        self.directories.add(directory)
+
+    def wait(self, timeout=None):
+        """
+        Waits up to timeout seconds, forever if None, for an event
+        Returns:
+            whether there were any events, they are discarded
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        self.drain()
+        return True
+
+    def drain(self):
+        """
+        Discards all pending events
+        """
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Watcher(object):
+    """
+    Waits for the content of any of a set of files to change, woken by inotify if it is
+      available and inotify is set, by polling their modification times every interval
+      seconds otherwise
+    """
+    def __init__(self, paths=(), interval=POLL_INTERVAL, settle=SETTLE, inotify=True):
+        self.interval = interval
+        self.settle = settle
+        self.inotify = None
+        if inotify:
+            try:
+                self.inotify = Inotify()
+            except OSError:
+                pass
+        self.hashes = {}
+        self.stats = {}
+        self.watch(paths)
+
+    @property
+    def mode(self):
+        return 'inotify' if self.inotify is not None else 'polling'
+
+    def watch(self, paths):
+        """
+        Watches paths instead of the files watched so far, the content a file has now is
+          the content later changes are compared with
+        """
+        paths = {os.path.abspath(path) for path in paths}
+        self.hashes = {path: self.hashes.get(path, file_hash(path)) for path in paths}
+        self.stats = {path: self.stat(path) for path in paths}
+        if self.inotify is not None:
+            for directory in sorted({os.path.dirname(path) for path in paths}):
+                try:
+                    self.inotify.watch(directory)
+                except OSError:
+                    # e.g. a directory that does not exist yet, polled from now on
+                    self.inotify.close()
+                    self.inotify = None
+                    break
+
+    def wait(self, timeout=None):
+        """
+        Waits up to timeout seconds, forever if None, for watched files to change
+        Returns:
+            the absolute paths of the files whose content changed, sorted, empty on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if self.inotify is not None:
+                woken = self.inotify.wait(remaining)
+            else:
+                time.sleep(self.interval if remaining is None else min(self.interval, remaining))
+                woken = any(self.stat(path) != stat for path, stat in self.stats.items())
+            if woken:
+                # an editor may write a file in several steps
+                time.sleep(self.settle)
+                if self.inotify is not None:
+                    self.inotify.drain()
+                changed = self.changed()
+                if changed:
+                    return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return []
+
+    def changed(self):
+        """
+        Returns the watched files whose content changed since the last call, sorted
+        """
+        changed = []
+        for path, old in self.hashes.items():
+            self.stats[path] = self.stat(path)
+            new = file_hash(path)
+            if new != old:
+                self.hashes[path] = new
+                changed.append(path)
+        return sorted(changed)
+
+    @staticmethod
+    def stat(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class WatchLogger(Logger):
+    """
+    A Logger printing the score of every testcase that was run as soon as it is scored,
+      with the points it had in the previous run if they changed
+    Testcases whose results are all taken from the ResultCache are only logged.
+    """
+    def __init__(self, path_proto=None, fmt=None, timer=None, run=None, previous=None):
+        super().__init__(path_proto, fmt, timer, run)
+        self.previous = previous or {}
+
+    def add_test_event(self, results:list, points, testcase):
+        super().add_test_event(results, points, testcase)
+        if results and all(result.cached for result in results):
+            return
+        line = f"{testcase.name}: {points:g}/{testcase.points:g} points"
+        before = self.previous.get(testcase.name)
+        if before is not None and before != points:
+            line += f" (was {before:g})"
+        print(line)
+
+    def points(self):
+        """
+        Returns the points reached by every testcase logged so far
+        """
+        return {name: criteria['Points reached'] for entry in self.results['Criteria']
+                for name, criteria in entry.items()}